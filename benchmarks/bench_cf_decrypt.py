@@ -0,0 +1,112 @@
+"""Benchmark: CF mode decrypt throughput, per-message cipher vs CryptoSession, and end to end.
+
+Part one decrypts the same frames three ways: decrypt_message (new AESGCM and
+re-parsed frame per message, the old path), CryptoSession.decrypt_frame, and
+CryptoSession.decrypt_batch. Part two sends the frames back to back through the local
+stand-in relay (src/cf_relay.py) and measures how fast CFChatClient receives, decrypts
+and hands them off. Nothing is pasted.
+
+    python benchmarks/bench_cf_decrypt.py [--messages 5000] [--chars 40]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.cf_client import CF_AVAILABLE, CFChatClient, CryptoSession, decrypt_message
+from src.cf_relay import LocalRelay
+
+_PASSWORD = 'bench-password'
+_ALPHABET = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动'
+
+
+def _make_frames(count, chars):
+    rng = random.Random(42)
+    session = CryptoSession(_PASSWORD)
+    frames = []
+    for _ in range(count):
+        iv, data = session.encrypt(''.join(rng.choice(_ALPHABET) for _ in range(chars)))
+        frames.append(json.dumps({'type': 'text', 'iv': iv, 'data': data}))
+    return frames
+
+
+def _per_message(frames):
+    key = CryptoSession(_PASSWORD).key
+    for raw in frames:
+        payload = json.loads(raw)
+        decrypt_message(key, payload['iv'], payload['data'])
+
+
+def _session(frames):
+    session = CryptoSession(_PASSWORD)
+    for raw in frames:
+        session.decrypt_frame(raw)
+
+
+def _batch(frames):
+    CryptoSession(_PASSWORD).decrypt_batch(frames)
+
+
+def _report(name, seconds, count):
+    print(f"{name:<24} {count / seconds:>12,.0f} msg/s {seconds / count * 1e6:>10.2f} us/msg")
+
+
+def _best_of(fn, frames, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(frames)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _end_to_end(frames):
+    done = threading.Event()
+    received = []
+
+    def on_message(text, seq):
+        received.append(seq)
+        if len(received) == len(frames):
+            done.set()
+
+    with LocalRelay() as relay:
+        client = CFChatClient(relay.url, _PASSWORD, on_message=on_message)
+        client.start()
+        while relay.members(client.room_id) < 1:
+            time.sleep(0.01)
+        phone = relay.phone(_PASSWORD)
+        t0 = time.perf_counter()
+        phone.send_all(frames)
+        finished = done.wait(60)
+        elapsed = time.perf_counter() - t0
+        phone.close()
+        client.stop()
+    assert finished, f'only {len(received)} of {len(frames)} frames arrived'
+    assert received == list(range(1, len(frames) + 1))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--chars', type=int, default=40)
+    args = parser.parse_args()
+    if not CF_AVAILABLE:
+        sys.exit('websockets and cryptography are required: pip install ".[cf]"')
+
+    frames = _make_frames(args.messages, args.chars)
+    _report('decrypt_message', _best_of(_per_message, frames), len(frames))
+    _report('session.decrypt_frame', _best_of(_session, frames), len(frames))
+    _report('session.decrypt_batch', _best_of(_batch, frames), len(frames))
+    _report('relay -> on_message', _end_to_end(frames), len(frames))
+
+
+if __name__ == '__main__':
+    main()
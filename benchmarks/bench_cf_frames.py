@@ -0,0 +1,80 @@
+"""Benchmark: CF frame formats, JSON/base64 envelope vs binary vs binary with compression.
+
+For several message lengths (dictation-like Chinese text), reports bytes on the wire
+per message and receive-side decode time (parse, reassemble, decrypt, decompress) for:
+the JSON envelope older phone pages send, binary frames without compression, and
+binary frames as negotiated (compressed from 512 bytes, fragmented above 32 KiB).
+
+    python benchmarks/bench_cf_frames.py [--messages 200] [--lengths 40,400,4000,40000]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.cf_client import CF_AVAILABLE, CryptoSession
+
+_PASSWORD = 'bench-password'
+# Frequent characters plus punctuation: repetitive like real dictation, not a fixed pattern
+_ALPHABET = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动，。'
+
+
+def _texts(count, chars):
+    rng = random.Random(chars)
+    return [''.join(rng.choice(_ALPHABET) for _ in range(chars)) for _ in range(count)]
+
+
+def _json_frames(session, text):
+    iv, data = session.encrypt(text)
+    return [json.dumps({'type': 'text', 'iv': iv, 'data': data})]
+
+
+_FORMATS = (
+    ('json + base64', _json_frames),
+    ('binary', lambda session, text: session.encrypt_binary(text, compress_min=None)),
+    ('binary + deflate', lambda session, text: session.encrypt_binary(text)),
+)
+
+
+def _decode_seconds(messages, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        session = CryptoSession(_PASSWORD)
+        t0 = time.perf_counter()
+        for frames in messages:
+            for frame in frames:
+                session.decrypt_frame(frame)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--lengths', default='40,400,4000,40000', help='characters per message')
+    args = parser.parse_args()
+    if not CF_AVAILABLE:
+        sys.exit('websockets and cryptography are required: pip install ".[cf]"')
+
+    phone = CryptoSession(_PASSWORD)
+    print(f"{'chars':>6} {'utf-8 B':>8}  {'format':<18} {'wire B/msg':>11} {'frames':>7} {'decode us/msg':>14}")
+    for chars in (int(n) for n in args.lengths.split(',')):
+        texts = _texts(args.messages, chars)
+        plain = sum(len(t.encode('utf-8')) for t in texts) / len(texts)
+        for name, encode in _FORMATS:
+            messages = [encode(phone, text) for text in texts]
+            wire = sum(len(f.encode('utf-8') if isinstance(f, str) else f) for m in messages for f in m)
+            frames = sum(map(len, messages))
+            decode = _decode_seconds(messages)
+            print(f"{chars:>6} {plain:>8.0f}  {name:<18} {wire / len(messages):>11.0f} "
+                  f"{frames / len(messages):>7.1f} {decode / len(messages) * 1e6:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
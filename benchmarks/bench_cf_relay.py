@@ -0,0 +1,151 @@
+"""Benchmark: CF mode end to end through the local stand-in relay, with injected faults.
+
+N simulated phones send numbered messages at a fixed rate through src/cf_relay.py into
+one CFChatClient. Reports end-to-end latency percentiles (phone send -> on_message,
+nothing is pasted), messages lost to the drop rate, how long the client takes to be
+connected again after the relay drops every connection, and how long it takes to notice
+a half-open connection (relay stalled: no close, pings unanswered) and replace it.
+
+    python benchmarks/bench_cf_relay.py [--phones 4] [--messages 50] [--rate 20]
+        [--latency-ms 30] [--jitter-ms 20] [--drop 0.0] [--disconnects 3] [--refuse-ms 200]
+        [--stalls 2] [--heartbeat-ms 1000] [--dead-ms 3000]
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.cf_client import CF_AVAILABLE, CFChatClient
+from src.cf_relay import LocalRelay
+
+_PASSWORD = 'bench-password'
+
+
+def _percentile(values, p):
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def _wait(predicate, timeout):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class _Receiver:
+    """CFChatClient callbacks: receive times per message, connect times."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.received = {}
+        self.connected_at = []
+
+    def on_message(self, text, seq):
+        now = time.perf_counter()
+        with self.lock:
+            self.received[text] = now
+
+    def on_status(self, state, text):
+        if state == 'connected':
+            with self.lock:
+                self.connected_at.append(time.perf_counter())
+
+
+def _latency(relay, receiver, args):
+    sent = {}
+    lock = threading.Lock()
+
+    def phone_loop(index):
+        phone = relay.phone(_PASSWORD)
+        interval = 1.0 / args.rate
+        next_at = time.perf_counter()
+        for n in range(args.messages):
+            text = f'{index}:{n}'
+            with lock:
+                sent[text] = time.perf_counter()
+            phone.send(text)
+            next_at += interval
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+        phone.close()
+
+    threads = [threading.Thread(target=phone_loop, args=(i,)) for i in range(args.phones)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    expected = len(sent) * (1 - args.drop)
+    _wait(lambda: len(receiver.received) >= expected, args.latency_ms / 1000 + args.jitter_ms / 1000 + 5)
+    time.sleep((args.latency_ms + args.jitter_ms) / 1000 + 0.1)
+    with receiver.lock:
+        latencies = sorted((receiver.received[text] - t0) * 1000 for text, t0 in sent.items()
+                           if text in receiver.received)
+    print(f"messages sent {len(sent)}  received {len(latencies)}  lost {len(sent) - len(latencies)}")
+    if latencies:
+        print("latency ms   " + "  ".join(f"p{p} {_percentile(latencies, p):7.2f}" for p in (50, 90, 99))
+              + f"  max {latencies[-1]:7.2f}")
+
+
+def _reconnects(relay, receiver, client, count, fault, label):
+    """Time from fault() to the client's next 'connected', count times."""
+    times = []
+    for _ in range(count):
+        with receiver.lock:
+            before = len(receiver.connected_at)
+        t0 = time.perf_counter()
+        fault()
+        if not _wait(lambda: len(receiver.connected_at) > before and relay.members(client.room_id) > 0, 60):
+            print("client did not reconnect within 60 s")
+            return
+        times.append((receiver.connected_at[before] - t0) * 1000)
+        # Let a heartbeat succeed so the backoff starts over, as after a real recovery
+        _wait(lambda: client.backoff.attempts == 0, 60)
+    if times:
+        times.sort()
+        print(f"{label:<40} min {times[0]:8.1f}  p50 {_percentile(times, 50):8.1f}  max {times[-1]:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--phones', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=50, help='per phone')
+    parser.add_argument('--rate', type=float, default=20.0, help='messages per second per phone')
+    parser.add_argument('--latency-ms', type=float, default=30.0)
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--drop', type=float, default=0.0, help='fraction of frames the relay drops')
+    parser.add_argument('--disconnects', type=int, default=3)
+    parser.add_argument('--refuse-ms', type=float, default=200.0, help='new connections refused after a drop')
+    parser.add_argument('--stalls', type=int, default=2, help='half-open connections to detect')
+    parser.add_argument('--heartbeat-ms', type=float, default=1000.0)
+    parser.add_argument('--dead-ms', type=float, default=3000.0, help='unanswered ping deadline')
+    args = parser.parse_args()
+    if not CF_AVAILABLE:
+        sys.exit('websockets and cryptography are required: pip install ".[cf]"')
+
+    receiver = _Receiver()
+    with LocalRelay(latency_s=args.latency_ms / 1000, jitter_s=args.jitter_ms / 1000,
+                    drop_rate=args.drop, seed=42) as relay:
+        client = CFChatClient(relay.url, _PASSWORD, on_message=receiver.on_message, on_status=receiver.on_status,
+                              heartbeat_s=args.heartbeat_ms / 1000, dead_after_s=args.dead_ms / 1000)
+        client.start()
+        if not _wait(lambda: relay.members(client.room_id) > 0, 10):
+            sys.exit('client did not connect to the relay')
+        _latency(relay, receiver, args)
+        _reconnects(relay, receiver, client, args.disconnects, lambda: relay.disconnect_all(args.refuse_ms / 1000),
+                    f"reconnect ms (refused for {args.refuse_ms:g} ms)")
+        _reconnects(relay, receiver, client, args.stalls, relay.stall,
+                    f"half-open replaced ms (dead after {args.dead_ms:g})")
+        stats = client.stats()
+        print(f"client: rtt avg {stats['rtt_avg_ms']} ms  reconnects {stats['reconnects']}  "
+              f"dead peers {stats['dead_peers']}  disconnected {stats['disconnected_s']:.2f} s")
+        client.stop()
+
+
+if __name__ == '__main__':
+    main()
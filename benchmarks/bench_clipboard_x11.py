@@ -0,0 +1,118 @@
+"""Benchmark: in-process X11 selection owner vs per-call xclip/xsel spawn, under Xvfb.
+
+Starts a private Xvfb, then times set+get cycles with
+  - X11SelectionOwner (one connection, serves selection requests itself)
+  - pyperclip with xclip / xsel (one subprocess per call)
+  - clipman with init() before every call (the old clipboard.py behaviour)
+and checks that an external reader (xclip -o) sees what the owner serves.
+Skips (exit 0) when Xvfb is not installed.
+
+    python benchmarks/bench_clipboard_x11.py [--iterations 200]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+
+def _start_xvfb():
+    for n in range(90, 110):
+        if os.path.exists(f'/tmp/.X11-unix/X{n}') or os.path.exists(f'/tmp/.X{n}-lock'):
+            continue
+        proc = subprocess.Popen(['Xvfb', f':{n}', '-nolisten', 'tcp'],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(100):
+            if os.path.exists(f'/tmp/.X11-unix/X{n}'):
+                return proc, f':{n}'
+            if proc.poll() is not None:
+                break
+            time.sleep(0.05)
+        proc.kill()
+    raise RuntimeError("Could not start Xvfb")
+
+
+def _time_cycles(set_fn, get_fn, iterations):
+    timings = []
+    for i in range(iterations):
+        text = f'第{i}段口述文本 sample {i}'
+        t0 = time.perf_counter()
+        set_fn(text)
+        got = get_fn()
+        timings.append(time.perf_counter() - t0)
+        assert got == text, (got, text)
+    return timings
+
+
+def _report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(0.95 * (len(timings) - 1))]
+    print(f"{name:<28} mean {statistics.mean(timings) * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    if not shutil.which('Xvfb'):
+        print("Xvfb not found; skipping X11 clipboard benchmark")
+        return 0
+
+    xvfb, display_name = _start_xvfb()
+    os.environ['DISPLAY'] = display_name
+    try:
+        from src.x11_clipboard import X11SelectionOwner
+
+        owner = X11SelectionOwner(display_name)
+        _report('X11SelectionOwner', _time_cycles(owner.set, owner.get, args.iterations))
+
+        if shutil.which('xclip'):
+            owner.set('served by owner ✓')
+            out = subprocess.run(['xclip', '-selection', 'clipboard', '-o'],
+                                 capture_output=True, timeout=5).stdout.decode('utf-8')
+            print(f"external reader sees owner text: {out == 'served by owner ✓'}")
+
+        import pyperclip
+        spawn_iterations = max(1, args.iterations // 4)
+        for tool in ('xclip', 'xsel'):
+            if shutil.which(tool):
+                pyperclip.set_clipboard(tool)
+                _report(f'pyperclip/{tool} (spawn)',
+                        _time_cycles(pyperclip.copy, pyperclip.paste, spawn_iterations))
+
+        try:
+            import clipman
+        except ImportError:
+            clipman = None
+        if clipman is not None:
+            def _set(text):
+                clipman.init()
+                clipman.set(text)
+
+            def _get():
+                clipman.init()
+                return clipman.get()
+
+            try:
+                _report('clipman (init per call)', _time_cycles(_set, _get, spawn_iterations))
+            except Exception as e:
+                print(f"clipman unavailable under Xvfb: {e}")
+
+        print(f"owner stats: {owner.stats()}")
+        owner.close()
+    finally:
+        xvfb.terminate()
+        xvfb.wait(timeout=5)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Benchmark: per-key latency of the XTest backend vs pyautogui, under Xvfb.
+
+Starts a private Xvfb, then times single keys (enter, backspace) and chords
+(ctrl+z, ctrl+shift+v) with
+  - XTestBackend (one persistent connection, one sync per chord, no pauses)
+  - pyautogui with its default PAUSE (the old Linux path)
+  - PyAutoGuiBackend, the fallback (pyautogui calls with _pause=False)
+Skips (exit 0) when Xvfb is not installed.
+
+    python benchmarks/bench_linux_keys.py [--iterations 200]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import time
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from benchmarks.bench_clipboard_x11 import _start_xvfb
+
+CHORDS = [['enter'], ['backspace'], ['ctrl', 'z'], ['ctrl', 'shift', 'v']]
+
+
+def _time_chords(send_fn, iterations):
+    timings = []
+    for i in range(iterations):
+        keys = CHORDS[i % len(CHORDS)]
+        t0 = time.perf_counter()
+        send_fn(keys)
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def _report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(0.95 * (len(timings) - 1))]
+    print(f"{name:<28} mean {statistics.mean(timings) * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    if not shutil.which('Xvfb'):
+        print("Xvfb not found; skipping Linux key injection benchmark")
+        return 0
+
+    xvfb, display_name = _start_xvfb()
+    os.environ['DISPLAY'] = display_name
+    try:
+        from src.injection_backend import PyAutoGuiBackend, XTestBackend
+        from src.x11_input import XTestInput
+
+        xinput = XTestInput(display_name)
+        _report('XTestBackend', _time_chords(XTestBackend(xinput).chord, args.iterations))
+
+        try:
+            import pyautogui
+        except Exception as e:
+            print(f"pyautogui unavailable under Xvfb: {e}")
+            pyautogui = None
+        if pyautogui is not None:
+            def _pyautogui_send(keys):
+                if len(keys) == 1:
+                    pyautogui.press(keys[0])
+                else:
+                    pyautogui.hotkey(*keys)
+
+            default_pause = pyautogui.PAUSE
+            # The default pause makes every call >= 0.1 s; a few iterations are enough
+            _report(f'pyautogui (PAUSE={default_pause})',
+                    _time_chords(_pyautogui_send, max(len(CHORDS), args.iterations // 10)))
+            _report('PyAutoGuiBackend', _time_chords(PyAutoGuiBackend().chord, args.iterations))
+
+        xinput.close()
+    finally:
+        xvfb.terminate()
+        xvfb.wait(timeout=5)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Benchmark: "text, Shift+Enter, text, Enter" as four POST /type vs one POST /ops.
+
+Headless (recording backend). Delays are recorded but not slept unless --sleep is given,
+so the wall time is our own per-request overhead; "planned delay" is the deliberate
+waiting each variant would spend on a real desktop. The batch's planned delay includes
+the gaps between its ops, which separate requests get implicitly from the round trips.
+
+    python benchmarks/bench_ops_batch.py [--rounds 200] [--sleep]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from flask import Flask
+
+from src import keyword_pipeline
+from src.clock import VirtualClock, set_clock
+from src.injection_backend import RecordingBackend, set_backend
+from src.keyword_pipeline import RuleSetCache
+from src.web_routes import register_routes
+
+_CONFIG = {'keyword_actions': [{'keyword': '换行', 'action': 'shift_enter'}]}
+
+_TYPE_REQUESTS = (
+    {'text': '第一段口述内容。'},
+    {'shift_enter': True},
+    {'text': '第二段口述内容。'},
+    {'enter': True},
+)
+_OPS_REQUEST = {'ops': [
+    {'op': 'text', 'text': '第一段口述内容。'},
+    {'op': 'shift_enter'},
+    {'op': 'text', 'text': '第二段口述内容。'},
+    {'op': 'enter'},
+]}
+
+
+def _run(client, backend, requests, rounds):
+    timings = []
+    planned = []
+    for _ in range(rounds):
+        backend.clear()
+        t0 = time.perf_counter()
+        for path, payload in requests:
+            body = client.post(path, json=payload).get_json()
+            assert body.get('success'), body
+        timings.append(time.perf_counter() - t0)
+        planned.append(backend.total_delay())
+    return timings, planned
+
+
+def _report(name, timings, planned):
+    timings = sorted(timings)
+    p95 = timings[int(0.95 * (len(timings) - 1))]
+    print(f"{name:<12} wall ms p50 {statistics.median(timings) * 1000:8.3f}  p95 {p95 * 1000:8.3f}"
+          f"   planned delay ms {statistics.mean(planned) * 1000:8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--sleep', action='store_true', help='actually sleep recorded delays')
+    args = parser.parse_args()
+
+    backend = RecordingBackend(clipboard='orig')
+    set_backend(backend)
+    if not args.sleep:
+        set_clock(VirtualClock())
+    cache = RuleSetCache(loader=lambda: _CONFIG, version_fn=lambda: 0)
+    app = Flask(__name__)
+    register_routes(app, '<html></html>')
+    client = app.test_client()
+
+    with mock.patch.object(keyword_pipeline, '_rule_set_cache', cache):
+        _report('4 x /type', *_run(client, backend, [('/type', p) for p in _TYPE_REQUESTS], args.rounds))
+        _report('1 x /ops', *_run(client, backend, [('/ops', _OPS_REQUEST)], args.rounds))
+
+
+if __name__ == '__main__':
+    main()
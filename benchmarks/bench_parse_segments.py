@@ -0,0 +1,78 @@
+"""Benchmark: keyword segmentation, Aho-Corasick matcher vs linear scan.
+
+Sweeps rule count and text length. Run from the repo root:
+
+    python benchmarks/bench_parse_segments.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.keyword_pipeline import (
+    KeywordMatcher,
+    _parse_segments_linear,
+    validate_keyword_actions,
+)
+
+RULE_COUNTS = (10, 100, 500, 1000)
+TEXT_LENGTHS = (50, 500, 5000)
+_ALPHABET = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动'
+
+
+def _make_rules(rng, count):
+    raw = []
+    for i in range(count):
+        kw = ''.join(rng.choice(_ALPHABET) for _ in range(rng.randint(2, 5)))
+        raw.append({'keyword': kw + str(i % 10), 'action': 'enter'})
+    return validate_keyword_actions(raw)
+
+
+def _make_text(rng, rules, length):
+    parts = []
+    size = 0
+    while size < length:
+        if rules and rng.random() < 0.05:
+            piece = rng.choice(rules)['keyword']
+        else:
+            piece = rng.choice(_ALPHABET)
+        parts.append(piece)
+        size += len(piece)
+    return ''.join(parts)[:length]
+
+
+def _best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'rules':>6} {'chars':>6} {'linear ms':>10} {'automaton ms':>13} {'build ms':>9} {'speedup':>8}")
+    for count in RULE_COUNTS:
+        rules = _make_rules(rng, count)
+        t0 = time.perf_counter()
+        matcher = KeywordMatcher(rules)
+        build = time.perf_counter() - t0
+        for length in TEXT_LENGTHS:
+            text = _make_text(rng, rules, length)
+            assert matcher.parse(text) == _parse_segments_linear(text, rules)
+            repeat = 3 if count * length > 500000 else 10
+            linear = _best_of(lambda: _parse_segments_linear(text, rules), repeat)
+            auto = _best_of(lambda: matcher.parse(text), repeat)
+            print(
+                f"{count:>6} {length:>6} {linear * 1000:>10.3f} {auto * 1000:>13.3f} "
+                f"{build * 1000:>9.3f} {linear / auto if auto else 0:>7.1f}x"
+            )
+
+
+if __name__ == '__main__':
+    main()
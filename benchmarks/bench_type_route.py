@@ -0,0 +1,105 @@
+"""Benchmark: POST /type -> execute_typed_text end to end, headless.
+
+Uses the recording injection backend, so no display, keyboard or clipboard is touched.
+By default delays are recorded but not slept (measures our own overhead); pass --sleep to
+include the deliberate waits as well. --observe-paste makes the backend report clipboard
+writes/reads (as the X11 and Windows clipboards do), so settle waits end early; the
+per-stage lines show waited vs budgeted time.
+
+    python benchmarks/bench_type_route.py [--requests 200] [--sleep] [--observe-paste]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from flask import Flask
+
+from src import keyword_pipeline
+from src.clock import VirtualClock, set_clock
+from src.injection_backend import RecordingBackend, set_backend
+from src.keyword_pipeline import RuleSetCache
+from src.web_routes import register_routes
+
+_CONFIG = {
+    'keyword_actions': [
+        {'keyword': '换行', 'action': 'shift_enter'},
+        {'keyword': '发送', 'action': 'enter'},
+        {'keyword': '撤销', 'action': 'undo'},
+    ]
+    + [{'keyword': f'热词{i}', 'keys': ['ctrl', 'a']} for i in range(200)],
+}
+
+_PAYLOADS = (
+    {'text': '你好，今天的会议改到下午三点。'},
+    {'text': '第一行换行第二行换行第三行发送'},
+    {'enter': True},
+    {'text': '这是一段比较长的口述段落，' * 20},
+    {'backspace': True},
+)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--sleep', action='store_true', help='actually sleep recorded delays')
+    parser.add_argument('--observe-paste', action='store_true',
+                        help='backend reports clipboard writes/reads (paste-completion detection)')
+    args = parser.parse_args()
+
+    backend = RecordingBackend(clipboard='orig', observe_paste=args.observe_paste)
+    set_backend(backend)
+    if not args.sleep:
+        set_clock(VirtualClock())
+    cache = RuleSetCache(loader=lambda: _CONFIG, version_fn=lambda: 0)
+    app = Flask(__name__)
+    register_routes(app, '<html></html>')
+    client = app.test_client()
+
+    with mock.patch.object(keyword_pipeline, '_rule_set_cache', cache):
+        timings = []
+        planned = []
+        breakdown = {'sleep_ms': [], 'clipboard_ms': [], 'inject_ms': [], 'other_ms': []}
+        stages = {}
+        for i in range(args.requests):
+            payload = _PAYLOADS[i % len(_PAYLOADS)]
+            backend.clear()
+            t0 = time.perf_counter()
+            resp = client.post('/type', json=payload)
+            timings.append(time.perf_counter() - t0)
+            planned.append(backend.total_delay())
+            body = resp.get_json()
+            assert body.get('success'), body
+            for key, values in breakdown.items():
+                values.append(body['latency'][key])
+            for stage, entry in body['latency'].get('stages', {}).items():
+                total = stages.setdefault(stage, {'count': 0, 'observed': 0, 'waited_ms': 0.0, 'budget_ms': 0.0})
+                for key in total:
+                    total[key] += entry[key]
+
+    print(f"requests: {args.requests}  sleep: {args.sleep}")
+    print(f"wall ms   p50 {_percentile(timings, 50) * 1000:8.3f}  p95 {_percentile(timings, 95) * 1000:8.3f}"
+          f"  max {max(timings) * 1000:8.3f}")
+    print(f"planned delay ms  mean {statistics.mean(planned) * 1000:8.3f}  max {max(planned) * 1000:8.3f}")
+    print("per-request report ms (mean): " + "  ".join(
+        f"{key[:-3]} {statistics.mean(values):.3f}" for key, values in breakdown.items()))
+    for stage, total in stages.items():
+        print(f"stage {stage:<18} n {total['count']:5d}  observed {total['observed']:5d}"
+              f"  waited ms {total['waited_ms']:9.3f}  budget ms {total['budget_ms']:9.3f}")
+    print(f"rule cache: {cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
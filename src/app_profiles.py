@@ -0,0 +1,345 @@
+"""Per-application paste profiles keyed on the focused window.
+
+The foreground window is identified as a lowercase string (Windows: "exe|window class",
+X11: "instance.class" from WM_CLASS of _NET_ACTIVE_WINDOW) and cached briefly. The
+first profile whose match substrings appear in it decides the paste method, commit
+mode and settle times; unset fields keep the global settings. Built-in profiles only
+change settle times unless 'app_profiles_builtin_paste_keys' is set: a substring match
+is a guess, and a wrong paste key pastes nothing.
+
+Where the backend can observe the target reading the clipboard, the time from paste
+chord to read is learned per app (EWMA), and the settle bounds of apps that are fast
+to paste into shrink accordingly, but never below the matched profile's paste settle
+time. Only reads by the target window's client are learned from (see
+keyboard.paste_consumed_probe()). Learned timings live in memory only.
+"""
+import os
+import threading
+import time
+
+try:
+    from .injection_plan import SEGMENT_DELAY_S
+    from .keyboard import COMMIT_MODES, RESTORE_SETTLE_S
+    from .utils import IS_MAC, IS_WINDOWS
+except ImportError:
+    from injection_plan import SEGMENT_DELAY_S
+    from keyboard import COMMIT_MODES, RESTORE_SETTLE_S
+    from utils import IS_MAC, IS_WINDOWS
+
+# How long a foreground lookup is reused
+FOREGROUND_TTL_S = 0.5
+# Learning: EWMA weight of a new sample, samples needed before it is used, and
+# learned bound = max(LEARN_FLOOR_S or the profile's paste settle, ewma * LEARN_MARGIN + LEARN_PAD_S)
+EWMA_ALPHA = 0.3
+LEARN_MIN_SAMPLES = 3
+LEARN_MARGIN = 2.0
+LEARN_PAD_S = 0.01
+LEARN_FLOOR_S = 0.02
+
+# Used after the user's own profiles (config 'app_profiles'); 'app_profiles_builtin': false drops them.
+# Browsers match on the exe (Windows) or WM_CLASS (X11): every Electron app's window class
+# is Chrome_WidgetWin_1, so a bare 'chrome' would match them all
+BUILTIN_PROFILES = [
+    {
+        'name': 'terminal',
+        'match': ['consolewindowclass', 'cascadia_hosting_window_class', 'windowsterminal.exe',
+                  'mintty', 'putty', 'xterm', 'urxvt', 'gnome-terminal', 'konsole', 'alacritty',
+                  'kitty', 'terminator', 'tilix', 'wezterm', 'xfce4-terminal', 'lxterminal', 'qterminal'],
+        'use_ctrl_v': False,
+        'paste_settle_ms': 100,
+        'restore_settle_ms': 150,
+        'segment_delay_ms': 50,
+    },
+    {
+        'name': 'browser_editor',
+        'match': ['chrome.exe', 'google-chrome', 'chromium', 'msedge.exe', 'microsoft-edge', 'firefox',
+                  'brave.exe', 'brave-browser', 'opera', 'vivaldi', 'code.exe', 'code.code',
+                  'notepad', 'sublime', 'jetbrains', 'idea64.exe', 'pycharm', 'gedit', 'kate',
+                  'winword.exe', 'obsidian', 'typora'],
+        'use_ctrl_v': True,
+        'paste_settle_ms': 30,
+        'restore_settle_ms': 80,
+        'segment_delay_ms': 15,
+    },
+]
+
+_TIMING_FIELDS = (
+    ('paste_settle_ms', 'paste_settle_s'),
+    ('restore_settle_ms', 'restore_settle_s'),
+    ('segment_delay_ms', 'segment_delay_s'),
+)
+
+
+def validate_app_profiles(raw_list):
+    """
+    Return a clean list of profiles: {name, match (tuple of lowercase substrings),
+    use_ctrl_v, commit_mode, paste_settle_s, restore_settle_s, segment_delay_s};
+    unset fields are None. Invalid entries (no match strings) are skipped, bad fields ignored.
+    """
+    if not raw_list or not isinstance(raw_list, list):
+        return []
+    out = []
+    for i, item in enumerate(raw_list):
+        if not isinstance(item, dict):
+            continue
+        match = item.get('match')
+        if isinstance(match, str):
+            match = [match]
+        if not isinstance(match, list):
+            continue
+        match = tuple(str(m).strip().lower() for m in match if str(m).strip())
+        if not match:
+            continue
+        profile = {'name': str(item.get('name') or f'profile{i}'), 'match': match,
+                   'use_ctrl_v': None, 'commit_mode': None}
+        if isinstance(item.get('use_ctrl_v'), bool):
+            profile['use_ctrl_v'] = item['use_ctrl_v']
+        if item.get('commit_mode') in COMMIT_MODES:
+            profile['commit_mode'] = item['commit_mode']
+        for key, field in _TIMING_FIELDS:
+            value = None
+            try:
+                if item.get(key) is not None:
+                    value = max(0.0, float(item[key])) / 1000.0
+            except (TypeError, ValueError):
+                pass
+            profile[field] = value
+        out.append(profile)
+    return out
+
+
+def profiles_from_config(cfg):
+    """
+    The user's profiles followed by the built-in ones (unless disabled). Built-ins keep
+    the global paste key unless 'app_profiles_builtin_paste_keys' opts in to theirs.
+    """
+    profiles = validate_app_profiles(cfg.get('app_profiles'))
+    if cfg.get('app_profiles_builtin', True):
+        builtin = validate_app_profiles(BUILTIN_PROFILES)
+        if not cfg.get('app_profiles_builtin_paste_keys', False):
+            for profile in builtin:
+                profile['use_ctrl_v'] = None
+        profiles += builtin
+    return profiles
+
+
+def match_profile(profiles, app):
+    """First profile with a match substring in app, or None."""
+    if not app:
+        return None
+    for profile in profiles:
+        if any(m in app for m in profile['match']):
+            return profile
+    return None
+
+
+def _windows_foreground():
+    import ctypes
+    from ctypes import wintypes
+    user32 = ctypes.windll.user32
+    kernel32 = ctypes.windll.kernel32
+    user32.GetForegroundWindow.restype = wintypes.HWND
+    hwnd = user32.GetForegroundWindow()
+    if not hwnd:
+        return None
+    buf = ctypes.create_unicode_buffer(256)
+    user32.GetClassNameW(hwnd, buf, 256)
+    pid = wintypes.DWORD()
+    user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+    exe = ''
+    # PROCESS_QUERY_LIMITED_INFORMATION also works for elevated processes
+    handle = kernel32.OpenProcess(0x1000, False, pid.value)
+    if handle:
+        try:
+            path = ctypes.create_unicode_buffer(1024)
+            size = wintypes.DWORD(1024)
+            if kernel32.QueryFullProcessImageNameW(handle, 0, path, ctypes.byref(size)):
+                exe = os.path.basename(path.value)
+        finally:
+            kernel32.CloseHandle(handle)
+    return f'{exe}|{buf.value}'.lower()
+
+
+class X11ActiveWindow:
+    """_NET_ACTIVE_WINDOW -> WM_CLASS over one persistent connection."""
+
+    def __init__(self, display_name=None):
+        from Xlib import X, display
+        self._X = X
+        self._d = display.Display(display_name)
+        self._root = self._d.screen().root
+        self._atom = self._d.intern_atom('_NET_ACTIVE_WINDOW')
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            prop = self._root.get_full_property(self._atom, self._X.AnyPropertyType)
+            if prop is None or not prop.value or not prop.value[0]:
+                return None
+            window = self._d.create_resource_object('window', prop.value[0])
+            try:
+                wm_class = window.get_wm_class()
+            except Exception:
+                # The window went away between the two requests
+                return None
+        if not wm_class:
+            return None
+        return '.'.join(wm_class).lower()
+
+
+def default_probe():
+    """Foreground lookup for this platform, or None when it cannot be identified."""
+    if IS_WINDOWS:
+        return _windows_foreground
+    if IS_MAC or not os.environ.get('DISPLAY'):
+        return None
+    try:
+        return X11ActiveWindow()
+    except Exception as e:
+        print(f"Foreground window lookup unavailable: {e}")
+        return None
+
+
+class ForegroundTracker:
+    """Foreground app id, looked up at most once per ttl_s."""
+
+    def __init__(self, probe=None, ttl_s=FOREGROUND_TTL_S, now=time.monotonic):
+        self._probe = probe
+        self._probe_ready = probe is not None
+        self._ttl_s = ttl_s
+        self._now = now
+        self._lock = threading.Lock()
+        self._app = None
+        self._checked_at = None
+        self.lookups = 0
+
+    @property
+    def last_app(self):
+        """App id from the most recent lookup (no new lookup)."""
+        return self._app
+
+    def current(self):
+        with self._lock:
+            now = self._now()
+            if self._checked_at is not None and now - self._checked_at < self._ttl_s:
+                return self._app
+            if not self._probe_ready:
+                self._probe = default_probe()
+                self._probe_ready = True
+            app = None
+            if self._probe is not None:
+                try:
+                    app = self._probe()
+                except Exception as e:
+                    print(f"Foreground window lookup failed: {e}")
+                self.lookups += 1
+            self._app = app
+            self._checked_at = now
+            return app
+
+
+class PasteSettings:
+    """Resolved paste settings for one injection. None timings mean the module defaults."""
+
+    def __init__(self, app=None, profile=None, use_ctrl_v=False, commit_mode=None,
+                 paste_settle_s=None, restore_settle_s=None, segment_delay_s=None,
+                 learned=False, recorder=None):
+        self.app = app
+        self.profile = profile
+        self.use_ctrl_v = use_ctrl_v
+        self.commit_mode = commit_mode
+        self.paste_settle_s = paste_settle_s
+        self.restore_settle_s = restore_settle_s
+        self.segment_delay_s = segment_delay_s
+        self.learned = learned
+        self._recorder = recorder
+
+    def on_consumed(self, seconds):
+        """Feed one measured paste-chord -> clipboard-read time back to the learner."""
+        if self._recorder is not None and self.app:
+            self._recorder(self.app, seconds)
+
+    def to_dict(self):
+        d = {'app': self.app, 'profile': self.profile, 'use_ctrl_v': self.use_ctrl_v,
+             'commit_mode': self.commit_mode, 'learned': self.learned}
+        for _, field in _TIMING_FIELDS:
+            value = getattr(self, field)
+            d[field] = None if value is None else round(value, 4)
+        return d
+
+
+class AppProfiles:
+    """Foreground tracking plus per-app learned paste completion times."""
+
+    def __init__(self, tracker=None):
+        self.tracker = tracker or ForegroundTracker()
+        self._lock = threading.Lock()
+        self._ewma = {}  # app -> [ewma seconds, samples]
+
+    def record_consumed(self, app, seconds):
+        with self._lock:
+            entry = self._ewma.get(app)
+            if entry is None:
+                self._ewma[app] = [seconds, 1]
+            else:
+                entry[0] += EWMA_ALPHA * (seconds - entry[0])
+                entry[1] += 1
+
+    def learned_bound(self, app, floor=LEARN_FLOOR_S):
+        """Settle bound learned for app (seconds, at least floor), or None until enough samples exist."""
+        with self._lock:
+            entry = self._ewma.get(app)
+            if entry is None or entry[1] < LEARN_MIN_SAMPLES:
+                return None
+            return max(floor, entry[0] * LEARN_MARGIN + LEARN_PAD_S)
+
+    def resolve(self, profiles, use_ctrl_v, commit_mode, learning=True):
+        """
+        PasteSettings for the focused app; profile fields override the given globals.
+        With learning off, no samples are recorded and learned bounds are not applied.
+        """
+        app = self.tracker.current()
+        profile = match_profile(profiles, app)
+        settings = PasteSettings(app=app, use_ctrl_v=use_ctrl_v, commit_mode=commit_mode,
+                                 recorder=self.record_consumed if learning else None)
+        if profile is not None:
+            settings.profile = profile['name']
+            if profile['use_ctrl_v'] is not None:
+                settings.use_ctrl_v = profile['use_ctrl_v']
+            if profile['commit_mode'] is not None:
+                settings.commit_mode = profile['commit_mode']
+            for _, field in _TIMING_FIELDS:
+                setattr(settings, field, profile[field])
+        floor = LEARN_FLOOR_S
+        if profile is not None and profile['paste_settle_s'] is not None:
+            # The profile's settle time is what its apps were seen to need
+            floor = max(floor, profile['paste_settle_s'])
+        bound = self.learned_bound(app, floor) if learning and app else None
+        if bound is not None:
+            # Learning only ever shortens the bounds; a slow app keeps its profile's values
+            restore = settings.restore_settle_s if settings.restore_settle_s is not None else RESTORE_SETTLE_S
+            segment = settings.segment_delay_s if settings.segment_delay_s is not None else SEGMENT_DELAY_S
+            settings.restore_settle_s = min(restore, bound)
+            settings.segment_delay_s = min(segment, bound)
+            settings.learned = True
+        return settings
+
+    def stats(self):
+        with self._lock:
+            learned = {app: {'ewma_ms': round(e[0] * 1000, 3), 'samples': e[1]} for app, e in self._ewma.items()}
+        return {'app': self.tracker.last_app, 'lookups': self.tracker.lookups, 'learned': learned}
+
+
+_app_profiles = AppProfiles()
+
+
+def get_app_profiles():
+    return _app_profiles
+
+
+def set_app_profiles(app_profiles):
+    """Replace the process-wide AppProfiles; returns the previous one."""
+    global _app_profiles
+    previous = _app_profiles
+    _app_profiles = app_profiles
+    return previous
@@ -1,7 +1,11 @@
 """Audio control module"""
 import ctypes
 import time
-from .utils import IS_WINDOWS
+
+try:
+    from .utils import IS_WINDOWS
+except ImportError:
+    from utils import IS_WINDOWS
 
 # Audio control state (exported for web_routes)
 auto_mute_enabled = False
@@ -1,10 +1,20 @@
 """Cloudflare client module"""
 import asyncio
+import os
 import threading
 import time
 import json
 import hashlib
 import base64
+import random
+from collections import deque
+
+try:
+    from .cf_frames import (COMPRESS_MIN_BYTES, FLAG_DEFLATE, HELLO, MAX_FRAME_BYTES, FrameError, Reassembler,
+                            accepts_binary, associated_data, deflate, hello, inflate, pack)
+except ImportError:
+    from cf_frames import (COMPRESS_MIN_BYTES, FLAG_DEFLATE, HELLO, MAX_FRAME_BYTES, FrameError, Reassembler,
+                           accepts_binary, associated_data, deflate, hello, inflate, pack)
 
 try:
     import websockets
@@ -13,6 +23,19 @@ try:
 except ImportError:
     CF_AVAILABLE = False
 
+# IVs remembered per session for replay detection
+REPLAY_WINDOW = 4096
+IV_BYTES = 12
+# Ping interval, and how long a ping may go unanswered before the connection is given up
+HEARTBEAT_S = 10.0
+DEAD_AFTER_S = 20.0
+# Reconnect delays: the first retry, then exponential from base up to max (jittered)
+RECONNECT_FIRST_S = 0.1
+RECONNECT_BASE_S = 0.5
+RECONNECT_MAX_S = 30.0
+# Weight of the newest sample in the smoothed RTT
+RTT_SMOOTHING = 0.2
+
 
 def derive_key_and_room(password: str) -> tuple:
     """Derive AES key and room ID from password"""
@@ -24,7 +47,7 @@ def derive_key_and_room(password: str) -> tuple:
 
 
 def decrypt_message(key: bytes, iv_b64: str, data_b64: str) -> str:
-    """AES-GCM decrypt message"""
+    """AES-GCM decrypt one message (builds a cipher per call; CryptoSession reuses one)"""
     if not CF_AVAILABLE:
         raise ImportError("websockets and cryptography required for CF mode")
     
@@ -35,9 +58,178 @@ def decrypt_message(key: bytes, iv_b64: str, data_b64: str) -> str:
     return plaintext.decode('utf-8')
 
 
+class ReplayError(ValueError):
+    """A message whose IV this session already decrypted (a relay re-sending old frames)"""
+
+
+class CryptoSession:
+    """
+    Per-connection AES-GCM state: key and room derived once, one cipher object for all
+    messages, and the IVs of the last replay_window decrypted messages, so a frame seen
+    before is rejected instead of typed twice. Decrypts both the JSON envelope and binary
+    frames (see cf_frames). Not thread-safe: one receive loop owns it.
+    """
+
+    def __init__(self, password: str, replay_window: int = REPLAY_WINDOW):
+        if not CF_AVAILABLE:
+            raise ImportError("websockets and cryptography required for CF mode")
+        self.key, self.room_id = derive_key_and_room(password)
+        self._aesgcm = AESGCM(self.key)
+        self._seen = set()
+        self._order = deque()
+        self._reassembler = Reassembler()
+        self._message_id = int.from_bytes(os.urandom(4), 'big')
+        self.replay_window = replay_window
+        self._stats = {'decrypted': 0, 'binary': 0, 'replayed': 0, 'failed': 0, 'ignored': 0}
+
+    def stats(self) -> dict:
+        d = dict(self._stats)
+        d['remembered_ivs'] = len(self._order)
+        d['reassembly'] = self._reassembler.stats()
+        return d
+
+    def encrypt(self, text: str) -> tuple:
+        """(iv_b64, data_b64) for text with a fresh random IV (the phone side of the protocol)"""
+        iv = os.urandom(IV_BYTES)
+        data = self._aesgcm.encrypt(iv, text.encode('utf-8'), None)
+        return base64.b64encode(iv).decode('ascii'), base64.b64encode(data).decode('ascii')
+
+    def encrypt_binary(self, text: str, compress_min: int = COMPRESS_MIN_BYTES, max_frame: int = MAX_FRAME_BYTES) -> list:
+        """
+        Binary frames for text (the phone side, once negotiated): compressed first when at
+        least compress_min bytes and it helps, fragmented when over max_frame
+        """
+        plain = text.encode('utf-8')
+        flags = 0
+        if compress_min is not None and len(plain) >= compress_min:
+            packed = deflate(plain)
+            if len(packed) < len(plain):
+                plain, flags = packed, FLAG_DEFLATE
+        iv = os.urandom(IV_BYTES)
+        body = iv + self._aesgcm.encrypt(iv, plain, associated_data(flags))
+        self._message_id += 1
+        return pack(body, flags, max_frame, self._message_id)
+
+    def decrypt(self, iv_b64: str, data_b64: str) -> str:
+        """Decrypt one message; ReplayError for a repeated IV, InvalidTag / ValueError for bad input"""
+        return self._open(base64.b64decode(iv_b64), base64.b64decode(data_b64))
+
+    def decrypt_binary(self, frame: bytes):
+        """Text of one binary frame; None while fragments of its message are missing"""
+        try:
+            message = self._reassembler.feed(frame)
+        except FrameError:
+            self._stats['failed'] += 1
+            raise
+        if message is None:
+            return None
+        flags, body = message
+        text = self._open(body[:IV_BYTES], body[IV_BYTES:], associated_data(flags), flags & FLAG_DEFLATE)
+        self._stats['binary'] += 1
+        return text
+
+    def _open(self, iv: bytes, ciphertext: bytes, aad: bytes = None, deflated: bool = False) -> str:
+        if iv in self._seen:
+            self._stats['replayed'] += 1
+            raise ReplayError("Replayed message")
+        try:
+            plain = self._aesgcm.decrypt(iv, ciphertext, aad)
+            text = (inflate(plain) if deflated else plain).decode('utf-8')
+        except Exception:
+            self._stats['failed'] += 1
+            raise
+        # Remembered only once authenticated: garbage cannot evict real IVs
+        self._seen.add(iv)
+        self._order.append(iv)
+        if len(self._order) > self.replay_window:
+            self._seen.discard(self._order.popleft())
+        self._stats['decrypted'] += 1
+        return text
+
+    def decrypt_frame(self, raw):
+        """Text of one relay frame (binary, or JSON {type, iv, data}); None for non-text frames"""
+        if isinstance(raw, (bytes, bytearray, memoryview)):
+            return self.decrypt_binary(raw)
+        return self.decrypt_payload(json.loads(raw))
+
+    def decrypt_payload(self, payload: dict):
+        """Text of a parsed JSON frame; None for non-text frames"""
+        if payload.get('type', 'text').lower() != 'text':
+            self._stats['ignored'] += 1
+            return None
+        iv = payload.get('iv')
+        data = payload.get('data')
+        if not iv or not data:
+            self._stats['ignored'] += 1
+            return None
+        return self.decrypt(iv, data)
+
+    def decrypt_batch(self, raws) -> list:
+        """
+        Texts of several frames in one pass, in order. Frames that are not text, do not
+        decrypt or are replays are skipped (and counted in stats()); the rest still go through.
+        """
+        texts = []
+        for raw in raws:
+            try:
+                text = self.decrypt_frame(raw)
+            except Exception as e:
+                print(f"Message handling error: {e}")
+                continue
+            if text is not None:
+                texts.append(text)
+        return texts
+
+
+class Backoff:
+    """
+    Reconnect delays: first_s for the first retry (most drops are momentary), then
+    base_s * 2**n capped at max_s, each randomly shortened by up to half so clients cut
+    off together do not all retry in lockstep. reset() once a connection proved healthy.
+    """
+
+    def __init__(self, first_s=RECONNECT_FIRST_S, base_s=RECONNECT_BASE_S, max_s=RECONNECT_MAX_S, rng=None):
+        self.first_s = first_s
+        self.base_s = base_s
+        self.max_s = max_s
+        self.attempts = 0
+        self._rng = rng or random.Random()
+
+    def next_delay(self) -> float:
+        n = self.attempts
+        self.attempts += 1
+        if n == 0:
+            return self.first_s
+        delay = min(self.max_s, self.base_s * 2 ** (n - 1))
+        return self._rng.uniform(delay / 2, delay)
+
+    def reset(self):
+        self.attempts = 0
+
+
 class CFChatClient:
-    """CF mode WebSocket client"""
-    def __init__(self, worker_url: str, password: str, on_message=None, on_status=None):
+    """
+    CF mode WebSocket client.
+
+    on_message(text, seq) is called on the receive thread for every decrypted message,
+    seq counting 1, 2, ... in receive order; it must hand the text off and return (see
+    cf_delivery), or receiving stalls behind it. Frames are decrypted by one CryptoSession
+    that outlives reconnects, so frames a relay sends again after reconnecting are
+    rejected as replays. on_status(state, text) reports
+    'connecting' / 'connected' / 'disconnected' / 'error' (text: the error).
+
+    Frames: the client only answers a phone's hello, offering binary frames (cf_frames);
+    it never speaks first, so room members that predate hellos never see one. It accepts
+    binary and JSON frames either way.
+
+    Liveness: a WebSocket ping every heartbeat_s (answered by the relay itself, not the
+    phone); a ping unanswered for dead_after_s means a half-open connection, which is
+    dropped and reconnected. Reconnects follow backoff. on_stats(stats) gets stats()
+    (RTT, reconnect count, time disconnected) on every change of the connection and
+    after every answered ping.
+    """
+    def __init__(self, worker_url: str, password: str, on_message=None, on_status=None, on_stats=None,
+                 heartbeat_s: float = HEARTBEAT_S, dead_after_s: float = DEAD_AFTER_S, backoff=None):
         if not CF_AVAILABLE:
             raise ImportError("websockets and cryptography required for CF mode")
         
@@ -45,11 +237,38 @@ class CFChatClient:
         self.password = password
         self.on_message = on_message
         self.on_status = on_status
-        self.key, self.room_id = derive_key_and_room(password)
+        self.on_stats = on_stats
+        self.heartbeat_s = heartbeat_s
+        self.dead_after_s = dead_after_s
+        self.backoff = backoff or Backoff()
+        self.session = CryptoSession(password)
+        self.key, self.room_id = self.session.key, self.session.room_id
         self.ws = None
         self.running = False
         self._loop = None
         self._thread = None
+        self._wake = threading.Event()
+        self._seq = 0
+        self._connects = 0
+        self._down_since = time.monotonic()
+        self._down_total = 0.0
+        self._stats = {'rtt_ms': None, 'rtt_avg_ms': None, 'heartbeats': 0, 'dead_peers': 0, 'next_retry_s': None,
+                       'binary_peers': 0}
+
+    def stats(self) -> dict:
+        d = dict(self._stats)
+        d['connected'] = self.ws is not None
+        d['reconnects'] = max(0, self._connects - 1)
+        down = self._down_total
+        if self._down_since is not None:
+            down += time.monotonic() - self._down_since
+        d['disconnected_s'] = round(down, 3)
+        d['session'] = self.session.stats()
+        return d
+
+    def _report_stats(self):
+        if self.on_stats:
+            self.on_stats(self.stats())
 
     def _get_ws_url(self) -> str:
         """Build WebSocket URL"""
@@ -63,56 +282,98 @@ class CFChatClient:
         return f"{url}/ws/{self.room_id}"
 
     async def _connect(self):
-        """Connect and listen for messages"""
+        """Connect and listen for messages until the connection closes or goes silent"""
         ws_url = self._get_ws_url()
         if self.on_status:
             self.on_status('connecting', 'Connecting...')
 
         try:
-            async with websockets.connect(ws_url) as ws:
+            # Own heartbeat instead of the library's keepalive: it measures RTT and has its own deadline
+            async with websockets.connect(ws_url, ping_interval=None) as ws:
                 self.ws = ws
+                self._connects += 1
+                self._down_total += time.monotonic() - self._down_since
+                self._down_since = None
+                self._stats['next_retry_s'] = None
                 if self.on_status:
                     self.on_status('connected', 'Connected to CF')
+                self._report_stats()
 
-                while self.running:
-                    try:
-                        raw = await asyncio.wait_for(ws.recv(), timeout=30)
+                heartbeat = asyncio.ensure_future(self._heartbeat(ws))
+                try:
+                    async for raw in ws:
                         self._handle_message(raw)
-                    except asyncio.TimeoutError:
-                        continue
-                    except websockets.ConnectionClosed:
-                        break
+                except websockets.ConnectionClosed:
+                    pass
+                finally:
+                    heartbeat.cancel()
 
         except Exception as e:
             if self.on_status:
-                self.on_status('error', f'Connection failed: {e}')
+                self.on_status('error', str(e))
 
         finally:
-            self.ws = None
+            if self.ws is not None:
+                self.ws = None
+                self._down_since = time.monotonic()
             if self.on_status and self.running:
                 self.on_status('disconnected', 'Disconnected, reconnecting...')
 
-    def _handle_message(self, raw: str):
-        """Handle received message"""
+    async def _heartbeat(self, ws):
+        """Ping every heartbeat_s; abort the connection when a ping goes unanswered for dead_after_s"""
         try:
-            payload = json.loads(raw)
-            msg_type = payload.get('type', 'text').lower()
+            while True:
+                await asyncio.sleep(self.heartbeat_s)
+                sent = time.perf_counter()
+                pong = await ws.ping()
+                try:
+                    await asyncio.wait_for(pong, self.dead_after_s)
+                except asyncio.TimeoutError:
+                    self._stats['dead_peers'] += 1
+                    print(f"CF connection silent for {self.dead_after_s:g} s, reconnecting")
+                    # No closing handshake: the peer is not listening
+                    ws.transport.abort()
+                    return
+                self._record_rtt((time.perf_counter() - sent) * 1000)
+        except websockets.ConnectionClosed:
+            pass
 
-            if msg_type != 'text':
-                return
+    def _record_rtt(self, rtt_ms: float):
+        avg = self._stats['rtt_avg_ms']
+        self._stats['rtt_ms'] = round(rtt_ms, 1)
+        self._stats['rtt_avg_ms'] = round(rtt_ms if avg is None else avg + RTT_SMOOTHING * (rtt_ms - avg), 1)
+        self._stats['heartbeats'] += 1
+        # An answered ping: the connection is healthy, the next drop retries fast again
+        self.backoff.reset()
+        self._report_stats()
 
-            iv = payload.get('iv')
-            data = payload.get('data')
-            if not iv or not data:
+    def _handle_message(self, raw):
+        """Handle received message"""
+        try:
+            if isinstance(raw, str):
+                payload = json.loads(raw)
+                if payload.get('type') == HELLO:
+                    self._handle_hello(payload)
+                    return
+                text = self.session.decrypt_payload(payload)
+            else:
+                text = self.session.decrypt_binary(raw)
+            if text is None:
                 return
-
-            text = decrypt_message(self.key, iv, data)
+            self._seq += 1
             if self.on_message:
-                self.on_message(text)
+                self.on_message(text, self._seq)
 
         except Exception as e:
             print(f"Message handling error: {e}")
 
+    def _handle_hello(self, payload: dict):
+        """A phone announced its frame formats: answer once so it can switch to binary"""
+        if accepts_binary(payload):
+            self._stats['binary_peers'] += 1
+        if not payload.get('reply') and self.ws is not None:
+            asyncio.ensure_future(self.ws.send(hello(reply=True)))
+
     def _run_loop(self):
         """Run event loop in separate thread"""
         self._loop = asyncio.new_event_loop()
@@ -125,7 +386,11 @@ class CFChatClient:
                 print(f"Connection error: {e}")
 
             if self.running:
-                time.sleep(2)
+                delay = self.backoff.next_delay()
+                self._stats['next_retry_s'] = round(delay, 3)
+                self._report_stats()
+                # stop() wakes this up
+                self._wake.wait(delay)
 
         self._loop.close()
 
@@ -134,15 +399,16 @@ class CFChatClient:
         if self.running:
             return
         self.running = True
+        self._wake.clear()
         self._thread = threading.Thread(target=self._run_loop, daemon=True)
         self._thread.start()
 
     def stop(self):
         """Stop client"""
         self.running = False
+        self._wake.set()
         if self.ws and self._loop:
             try:
                 asyncio.run_coroutine_threadsafe(self.ws.close(), self._loop)
             except:
                 pass
-
@@ -0,0 +1,125 @@
+"""CF mode delivery: decrypted messages go to the injection worker without blocking the receive loop.
+
+The CF client numbers messages in receive order and hands each one over here on its
+receive thread. deliver() only queues the paste (through an OpSequencer, so messages
+are applied once each, in seq order) and returns; the result arrives later through
+on_delivered. Receiving and decrypting a burst therefore overlaps with pasting the
+earlier messages, and the GUI thread is not involved at all.
+
+When the injection queue is full, the message and everything received after it wait
+in a bounded backlog and are submitted again, in order, after retry_s. Past
+max_backlog a message's text is dropped but its seq stays, as a no-op, so the
+messages after it are not held up waiting for it.
+"""
+import threading
+from functools import partial
+
+try:
+    from .injection_worker import get_worker
+    from .op_sequencer import OpSequencer
+except ImportError:
+    from injection_worker import get_worker
+    from op_sequencer import OpSequencer
+
+# Messages waiting for queue space; beyond this, new messages are dropped
+MAX_BACKLOG = 256
+RETRY_S = 0.2
+# Sequencer client key of the CF connection
+CF_CLIENT = 'cf'
+
+
+def _nothing():
+    return None
+
+
+def _delivery_result(job):
+    return {'success': bool(job.result()), 'latency': job.latency()}
+
+
+class CFDelivery:
+    """
+    on_delivered(seq, text, result) is called when a message was pasted (result['success'])
+    or failed, usually on the worker thread; result has 'dropped' when the backlog was full.
+    """
+
+    def __init__(self, on_delivered=None, max_backlog=MAX_BACKLOG, retry_s=RETRY_S, worker_fn=get_worker):
+        self.on_delivered = on_delivered
+        self.max_backlog = max_backlog
+        self.retry_s = retry_s
+        self._worker_fn = worker_fn
+        self._sequencer = OpSequencer(_delivery_result)
+        self._lock = threading.Lock()
+        self._backlog = {}  # seq -> text, not yet accepted by the worker
+        self._timer = None
+        self._stats = {'received': 0, 'delivered': 0, 'failed': 0, 'retried': 0, 'dropped': 0}
+
+    def deliver(self, seq, text):
+        """Queue message seq for pasting; never blocks."""
+        with self._lock:
+            self._stats['received'] += 1
+            # Earlier messages waiting for queue space go first
+            held = self._hold(seq, text) if self._backlog else None
+        if held is None:
+            self._submit(seq, text)
+        elif not held:
+            self._dropped(seq, text)
+
+    def _hold(self, seq, text):
+        """Put seq in the backlog (lock held). False if it was dropped: the backlog is full."""
+        dropped = text is not None and seq not in self._backlog and len(self._backlog) >= self.max_backlog
+        if dropped:
+            self._stats['dropped'] += 1
+            text = None
+        self._backlog[seq] = text
+        if self._timer is None:
+            self._timer = threading.Timer(self.retry_s, self._retry)
+            self._timer.daemon = True
+            self._timer.start()
+        return not dropped
+
+    def _submit(self, seq, text):
+        start = partial(self._worker_fn().submit_text, text) if text is not None else _nothing
+        future = self._sequencer.submit(CF_CLIENT, seq, None, start, 'cf')
+        future.add_done_callback(partial(self._on_result, seq, text))
+
+    def _on_result(self, seq, text, future):
+        result = future.result()
+        if result.get('retry'):
+            with self._lock:
+                held = self._hold(seq, text)
+            if not held:
+                self._dropped(seq, text)
+            return
+        if text is None or result.get('duplicate'):
+            return
+        with self._lock:
+            self._stats['delivered' if result.get('success') else 'failed'] += 1
+        if self.on_delivered:
+            self.on_delivered(seq, text, result)
+
+    def _dropped(self, seq, text):
+        print(f"CF message #{seq} dropped: delivery backlog full")
+        if self.on_delivered:
+            self.on_delivered(seq, text, {'success': False, 'error': 'Backlog full', 'dropped': True})
+
+    def _retry(self):
+        with self._lock:
+            self._timer = None
+            pending = sorted(self._backlog.items())
+            self._backlog.clear()
+            self._stats['retried'] += len(pending)
+        for seq, text in pending:
+            self._submit(seq, text)
+
+    def stop(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['backlog'] = len(self._backlog)
+        stats['sequencer'] = self._sequencer.stats()
+        return stats
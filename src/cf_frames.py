@@ -0,0 +1,158 @@
+"""Binary frame format for CF messages (version 1) and its per-connection negotiation.
+
+The JSON envelope {type, iv, data} base64-encodes IV and ciphertext, a third more bytes
+than the ciphertext itself, and both ends parse JSON for every message. A binary
+WebSocket frame carries them raw:
+
+    byte 0      version (1)
+    byte 1      flags: FLAG_DEFLATE (plaintext deflate-raw compressed before encryption),
+                FLAG_FRAGMENT (one part of a larger message)
+    fragment    message id (u32), part index (u16), part count (u16), big-endian;
+                only with FLAG_FRAGMENT
+    rest        the body, nonce (12 bytes) + AES-GCM ciphertext; a fragment carries a
+                slice of it
+
+The version and the deflate flag are the ciphertext's associated data, so they cannot be
+changed in transit. A body too large for one frame (max_frame) is split into fragments,
+sent as separate WebSocket messages and put back together by Reassembler before it is
+decrypted.
+
+Negotiation: a phone sends a plain JSON hello ({"type": "hello", "versions": [1]}) when
+it connects; CFChatClient answers it (reply: true) and never sends a hello unasked, so
+phone pages that predate this never receive one. The phone uses binary frames only after
+a reply listed version 1; until then, and on pages without hellos, it sends JSON, which
+CFChatClient always accepts.
+"""
+import json
+import struct
+import zlib
+from collections import OrderedDict
+
+VERSION = 1
+HELLO = 'hello'
+FLAG_DEFLATE = 0x01
+FLAG_FRAGMENT = 0x02
+# Largest frame sent; bigger messages are fragmented
+MAX_FRAME_BYTES = 32 * 1024
+# Largest message accepted, reassembled or decompressed
+MAX_MESSAGE_BYTES = 1024 * 1024
+# Plaintexts shorter than this are not worth compressing
+COMPRESS_MIN_BYTES = 512
+# Incomplete fragmented messages kept at once; the oldest is discarded beyond this
+MAX_PENDING = 16
+
+_HEADER = struct.Struct('>BB')
+_FRAGMENT = struct.Struct('>IHH')
+
+
+class FrameError(ValueError):
+    """A binary frame that is malformed, of an unknown version, or too large"""
+
+
+def hello(reply=False) -> str:
+    """This side's hello frame (plain JSON: it only lists capabilities)"""
+    payload = {'type': HELLO, 'versions': [VERSION], 'compression': ['deflate-raw'], 'max_frame': MAX_FRAME_BYTES}
+    if reply:
+        payload['reply'] = True
+    return json.dumps(payload)
+
+
+def accepts_binary(payload: dict) -> bool:
+    """Whether a peer's hello payload lists this binary version"""
+    return VERSION in (payload.get('versions') or ())
+
+
+def associated_data(flags: int) -> bytes:
+    """GCM associated data of a message: version and the flags that change its meaning"""
+    return _HEADER.pack(VERSION, flags & FLAG_DEFLATE)
+
+
+def deflate(data: bytes) -> bytes:
+    """Raw deflate (no zlib header; CompressionStream('deflate-raw') in a browser)"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def inflate(data: bytes, limit: int = MAX_MESSAGE_BYTES) -> bytes:
+    decompressor = zlib.decompressobj(-15)
+    try:
+        out = decompressor.decompress(data, limit)
+    except zlib.error as e:
+        raise FrameError(f"Bad compressed message: {e}") from None
+    if decompressor.unconsumed_tail:
+        raise FrameError("Message too large")
+    if not decompressor.eof:
+        raise FrameError("Truncated compressed message")
+    return out
+
+
+def pack(body: bytes, flags: int = 0, max_frame: int = MAX_FRAME_BYTES, message_id: int = 0) -> list:
+    """Frames for one message body: a single frame, or fragments of at most max_frame bytes"""
+    if _HEADER.size + len(body) <= max_frame:
+        return [_HEADER.pack(VERSION, flags) + body]
+    step = max_frame - _HEADER.size - _FRAGMENT.size
+    count = -(-len(body) // step)
+    if step <= 0 or count > 0xFFFF:
+        raise FrameError("Message too large")
+    header = _HEADER.pack(VERSION, flags | FLAG_FRAGMENT)
+    return [header + _FRAGMENT.pack(message_id & 0xFFFFFFFF, index, count) + body[index * step:(index + 1) * step]
+            for index in range(count)]
+
+
+class Reassembler:
+    """
+    Turns binary frames back into (flags, body) messages. Fragments of one message may
+    arrive interleaved with other messages; incomplete messages are bounded by
+    max_pending and max_bytes. Not thread-safe: one receive loop owns it.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING, max_bytes=MAX_MESSAGE_BYTES):
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes
+        self._partial = OrderedDict()  # message id -> (flags, count, {index: chunk}, size)
+        self._stats = {'frames': 0, 'messages': 0, 'fragments': 0, 'evicted': 0}
+
+    def stats(self) -> dict:
+        d = dict(self._stats)
+        d['pending'] = len(self._partial)
+        return d
+
+    def feed(self, frame: bytes):
+        """(flags, body) once a message is complete; None while parts of it are missing"""
+        frame = bytes(frame)
+        if len(frame) < _HEADER.size:
+            raise FrameError("Short frame")
+        version, flags = _HEADER.unpack_from(frame)
+        if version != VERSION:
+            raise FrameError(f"Unsupported frame version {version}")
+        self._stats['frames'] += 1
+        if not flags & FLAG_FRAGMENT:
+            self._stats['messages'] += 1
+            return flags, frame[_HEADER.size:]
+
+        if len(frame) < _HEADER.size + _FRAGMENT.size:
+            raise FrameError("Short fragment")
+        message_id, index, count = _FRAGMENT.unpack_from(frame, _HEADER.size)
+        if index >= count:
+            raise FrameError("Bad fragment index")
+        chunk = frame[_HEADER.size + _FRAGMENT.size:]
+        self._stats['fragments'] += 1
+        entry = self._partial.get(message_id)
+        if entry is None or entry[:2] != (flags, count):
+            entry = (flags, count, {}, 0)
+        parts = entry[2]
+        size = entry[3] + len(chunk) - len(parts.get(index, b''))
+        if size > self.max_bytes:
+            self._partial.pop(message_id, None)
+            raise FrameError("Message too large")
+        parts[index] = chunk
+        if len(parts) == count:
+            self._partial.pop(message_id, None)
+            self._stats['messages'] += 1
+            return flags & ~FLAG_FRAGMENT, b''.join(parts[i] for i in range(count))
+        self._partial[message_id] = (flags, count, parts, size)
+        self._partial.move_to_end(message_id)
+        while len(self._partial) > self.max_pending:
+            self._partial.popitem(last=False)
+            self._stats['evicted'] += 1
+        return None
@@ -0,0 +1,291 @@
+"""Local stand-in for the Cloudflare chat worker, for tests and benchmarks.
+
+Speaks the same protocol as the worker CFChatClient talks to: WebSocket clients join a
+room by connecting to /ws/<room_id>, and every frame one member sends is forwarded
+unchanged to the other members of the room. The frames are the {type, iv, data} JSON
+envelopes; the relay never decrypts them.
+
+Network faults can be injected: a fixed latency plus random jitter per forwarded frame
+(order per receiver is kept, as over TCP), a drop rate, disconnect_all(), which
+closes every connection and optionally refuses new ones for a while (HTTP 503 at the
+handshake), and stall(), which makes every connection half-open: nothing is read or
+forwarded and pings go unanswered, while the client sees no close. SimulatedPhone
+plays the sending side (encrypts with a CryptoSession and sends through its own
+connection), either negotiating binary frames or, with binary=False, as a phone page
+that only knows the JSON envelope.
+
+The relay runs its own event loop on a daemon thread; its methods are called from any
+other thread.
+"""
+import asyncio
+import http
+import json
+import random
+import threading
+import time
+
+try:
+    from .cf_client import CF_AVAILABLE, CryptoSession
+    from .cf_frames import HELLO, accepts_binary, hello
+except ImportError:
+    from cf_client import CF_AVAILABLE, CryptoSession
+    from cf_frames import HELLO, accepts_binary, hello
+
+if CF_AVAILABLE:
+    import websockets
+
+# Close code sent by disconnect_all() (1012: service restart)
+RESTART_CLOSE_CODE = 1012
+
+
+def _request_path(ws):
+    request = getattr(ws, 'request', None)
+    if request is not None:
+        return request.path
+    return getattr(ws, 'path', '')
+
+
+class LocalRelay:
+    """latency_s + uniform(0, jitter_s) delay per forwarded frame; drop_rate in [0, 1]."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency_s=0.0, jitter_s=0.0, drop_rate=0.0, seed=None):
+        if not CF_AVAILABLE:
+            raise ImportError("websockets and cryptography required for CF mode")
+        self.host = host
+        self.port = port
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.drop_rate = drop_rate
+        self._rng = random.Random(seed)
+        self._rooms = {}  # room_id -> {ws: asyncio.Queue of (due, raw)}
+        self._stalled = set()
+        self._refuse_until = 0.0
+        self._loop = None
+        self._thread = None
+        self._server = None
+        self._stats = {'connections': 0, 'refused': 0, 'forwarded': 0, 'dropped': 0, 'disconnects': 0, 'stalls': 0,
+                       'forwarded_bytes': 0}
+
+    @property
+    def url(self):
+        """Worker URL to give CFChatClient (it appends /ws/<room_id>)"""
+        return f'http://{self.host}:{self.port}'
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='cf-relay', daemon=True)
+        self._thread.start()
+        self._server = self._call(self._serve())
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        self._call(self._shutdown())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(2.0)
+        self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _call(self, coro, timeout=10.0):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    async def _serve(self):
+        return await websockets.serve(self._handler, self.host, self.port, process_request=self._admit)
+
+    async def _shutdown(self):
+        for ws in self._stalled:
+            ws.transport.abort()
+        self._server.close()
+        await self._close_all(1001)
+        await self._server.wait_closed()
+
+    def _admit(self, connection, request):
+        """Refuse the handshake while a disconnect_all() refuse period lasts"""
+        if time.perf_counter() < self._refuse_until:
+            self._stats['refused'] += 1
+            return connection.respond(http.HTTPStatus.SERVICE_UNAVAILABLE, 'try again later\n')
+        return None
+
+    async def _handler(self, ws):
+        path = _request_path(ws)
+        if not path.startswith('/ws/') or len(path) <= 4:
+            await ws.close(1008, 'unknown path')
+            return
+        room = self._rooms.setdefault(path[4:], {})
+        outbox = asyncio.Queue()
+        room[ws] = outbox
+        self._stats['connections'] += 1
+        sender = asyncio.ensure_future(self._send_loop(ws, outbox))
+        try:
+            async for raw in ws:
+                self._forward(room, ws, raw)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            room.pop(ws, None)
+            sender.cancel()
+
+    def _forward(self, room, source, raw):
+        now = time.perf_counter()
+        for ws, outbox in list(room.items()):
+            if ws is source:
+                continue
+            if self.drop_rate and self._rng.random() < self.drop_rate:
+                self._stats['dropped'] += 1
+                continue
+            delay = self.latency_s + (self._rng.uniform(0, self.jitter_s) if self.jitter_s else 0.0)
+            outbox.put_nowait((now + delay, raw))
+
+    async def _send_loop(self, ws, outbox):
+        """Deliver one receiver's frames in order, none before it is due."""
+        due_at = 0.0
+        while True:
+            due, raw = await outbox.get()
+            # A later frame never overtakes an earlier, slower one
+            due_at = max(due, due_at)
+            wait = due_at - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                await ws.send(raw)
+            except websockets.ConnectionClosed:
+                return
+            self._stats['forwarded'] += 1
+            self._stats['forwarded_bytes'] += len(raw)
+
+    async def _close_all(self, code):
+        connections = [ws for room in self._rooms.values() for ws in room]
+        for ws in connections:
+            await ws.close(code)
+        return len(connections)
+
+    def disconnect_all(self, refuse_s=0.0):
+        """Close every connection; new connections are refused for refuse_s. Returns the number closed."""
+        self._refuse_until = time.perf_counter() + refuse_s
+        closed = self._call(self._close_all(RESTART_CLOSE_CODE))
+        self._stats['disconnects'] += closed
+        return closed
+
+    def stall(self):
+        """Make every current connection half-open: stop reading it and leave it open. Returns the count."""
+        return self._call(self._stall())
+
+    async def _stall(self):
+        connections = [ws for room in self._rooms.values() for ws in room]
+        for ws in connections:
+            ws.transport.pause_reading()
+            self._stalled.add(ws)
+        # Nothing more is forwarded to or from them either
+        for room in self._rooms.values():
+            for ws in connections:
+                room.pop(ws, None)
+        self._stats['stalls'] += len(connections)
+        return len(connections)
+
+    def members(self, room_id):
+        return len(self._rooms.get(room_id, ()))
+
+    def phone(self, password, binary=True):
+        """A connected SimulatedPhone in the room of password."""
+        return SimulatedPhone(self, password, binary=binary)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['rooms'] = {room_id: len(room) for room_id, room in self._rooms.items() if room}
+        return stats
+
+
+class SimulatedPhone:
+    """
+    The sending side: encrypts like the cfchat page and sends through its own connection,
+    reconnecting (every reconnect_s, for up to timeout_s) when the relay dropped it.
+    With binary, it says hello on connecting and sends binary frames once the PC's
+    reply offered them (peer_binary); until then, and without binary, JSON envelopes.
+    received counts the frames the relay forwarded to it.
+    """
+
+    def __init__(self, relay, password, binary=True, reconnect_s=0.05, timeout_s=10.0):
+        self.relay = relay
+        self.session = CryptoSession(password)
+        self.binary = binary
+        self.peer_binary = False
+        self.received = 0
+        self.reconnect_s = reconnect_s
+        self.timeout_s = timeout_s
+        self.reconnects = 0
+        self._url = f'ws://{relay.host}:{relay.port}/ws/{self.session.room_id}'
+        self._ws = None
+        relay._call(self._connect())
+
+    async def _connect(self):
+        self._ws = await websockets.connect(self._url)
+        if self.binary:
+            await self._ws.send(hello())
+        asyncio.ensure_future(self._read(self._ws))
+
+    async def _read(self, ws):
+        """Drain what the relay forwards; a binary phone notes the PC's reply to its hello"""
+        try:
+            async for raw in ws:
+                self.received += 1
+                if not self.binary or not isinstance(raw, str):
+                    continue
+                try:
+                    payload = json.loads(raw)
+                except ValueError:
+                    continue
+                # Only the PC replies; another phone's hello is not an offer
+                if payload.get('type') == HELLO and payload.get('reply'):
+                    self.peer_binary = accepts_binary(payload)
+        except websockets.ConnectionClosed:
+            pass
+
+    def frames(self, text):
+        """The frames send(text) would send now"""
+        if self.binary and self.peer_binary:
+            return self.session.encrypt_binary(text)
+        iv, data = self.session.encrypt(text)
+        return [json.dumps({'type': 'text', 'iv': iv, 'data': data})]
+
+    def send(self, text):
+        self.send_all(self.frames(text))
+
+    def send_raw(self, raw):
+        self.relay._call(self._send(raw), timeout=self.timeout_s + 1.0)
+
+    def send_all(self, raws):
+        """Send prepared frames back to back (one hop to the relay's loop for all of them)."""
+        self.relay._call(self._send_all(raws), timeout=self.timeout_s + 1.0 + len(raws) * 0.01)
+
+    async def _send_all(self, raws):
+        for raw in raws:
+            await self._send(raw)
+
+    async def _send(self, raw):
+        deadline = time.perf_counter() + self.timeout_s
+        while True:
+            try:
+                await self._ws.send(raw)
+                return
+            except websockets.ConnectionClosed:
+                if time.perf_counter() > deadline:
+                    raise
+            await asyncio.sleep(self.reconnect_s)
+            try:
+                await self._connect()
+                self.reconnects += 1
+            except (OSError, websockets.InvalidHandshake):
+                pass
+
+    def close(self):
+        try:
+            self.relay._call(self._ws.close())
+        except Exception:
+            pass
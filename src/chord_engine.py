@@ -0,0 +1,104 @@
+"""Win32 chord engine.
+
+Every hotkey token maps to a virtual key; the scan-code table is built once (via
+MapVirtualKeyW) when the engine is created. A chord's whole press/release sequence
+goes out in one SendInput batch using scan codes (terminal compatible), and if the
+batch is not fully injected every key of the chord is released again.
+"""
+import ctypes
+import threading
+
+try:
+    from .utils import IS_WINDOWS, KEYEVENTF_EXTENDEDKEY, KEYEVENTF_KEYUP, KEYEVENTF_SCANCODE, MAPVK_VK_TO_VSC
+    from .win_input import key_input, send_inputs
+except ImportError:
+    from utils import IS_WINDOWS, KEYEVENTF_EXTENDEDKEY, KEYEVENTF_KEYUP, KEYEVENTF_SCANCODE, MAPVK_VK_TO_VSC
+    from win_input import key_input, send_inputs
+
+
+def _build_virtual_keys():
+    keys = {
+        # Modifiers
+        'ctrl': (0x11, False), 'shift': (0x10, False), 'alt': (0x12, False), 'win': (0x5B, True),
+        # Editing / whitespace
+        'enter': (0x0D, False), 'tab': (0x09, False), 'backspace': (0x08, False),
+        'escape': (0x1B, False), 'space': (0x20, False),
+        # Navigation (extended keys)
+        'insert': (0x2D, True), 'delete': (0x2E, True), 'home': (0x24, True), 'end': (0x23, True),
+        'pageup': (0x21, True), 'pagedown': (0x22, True),
+        'left': (0x25, True), 'up': (0x26, True), 'right': (0x27, True), 'down': (0x28, True),
+        # System
+        'printscreen': (0x2C, True), 'pause': (0x13, False), 'capslock': (0x14, False),
+        'numlock': (0x90, True), 'scrolllock': (0x91, False), 'apps': (0x5D, True),
+        # Punctuation (US layout OEM keys; pyautogui names)
+        ';': (0xBA, False), '=': (0xBB, False), ',': (0xBC, False), '-': (0xBD, False),
+        '.': (0xBE, False), '/': (0xBF, False), '`': (0xC0, False), '[': (0xDB, False),
+        '\\': (0xDC, False), ']': (0xDD, False), "'": (0xDE, False),
+        # Numpad
+        'multiply': (0x6A, False), 'add': (0x6B, False), 'separator': (0x6C, False),
+        'subtract': (0x6D, False), 'decimal': (0x6E, False), 'divide': (0x6F, True),
+    }
+    for c in 'abcdefghijklmnopqrstuvwxyz':
+        keys[c] = (ord(c.upper()), False)
+    for d in range(10):
+        keys[str(d)] = (0x30 + d, False)
+        keys[f'num{d}'] = (0x60 + d, False)
+    for n in range(1, 25):
+        keys[f'f{n}'] = (0x70 + n - 1, False)
+    return keys
+
+
+# token -> (virtual key, extended-key flag)
+VIRTUAL_KEYS = _build_virtual_keys()
+
+
+def _map_virtual_key(vk):
+    return ctypes.windll.user32.MapVirtualKeyW(vk, MAPVK_VK_TO_VSC)
+
+
+class ChordEngine:
+    """Scan-code table for every token in VIRTUAL_KEYS plus batched chord submission."""
+
+    def __init__(self, scan_fn=_map_virtual_key, send_fn=send_inputs):
+        self._send = send_fn
+        self.table = {}
+        for token, (vk, extended) in VIRTUAL_KEYS.items():
+            flags = KEYEVENTF_SCANCODE | (KEYEVENTF_EXTENDEDKEY if extended else 0)
+            self.table[token] = (vk, scan_fn(vk), flags)
+
+    def supports(self, keys):
+        return bool(keys) and all(k in self.table for k in keys)
+
+    def _event(self, token, up):
+        vk, scan, flags = self.table[token]
+        return key_input(vk=vk, scan=scan, flags=flags | (KEYEVENTF_KEYUP if up else 0))
+
+    def chord_inputs(self, keys):
+        """Press keys in order, release in reverse."""
+        return [self._event(k, False) for k in keys] + self.release_inputs(keys)
+
+    def release_inputs(self, keys):
+        return [self._event(k, True) for k in reversed(keys)]
+
+    def send(self, keys):
+        """One SendInput batch for the chord. On a short injection, releases every key of the chord."""
+        keys = list(keys)
+        if self._send(self.chord_inputs(keys)):
+            return True
+        print(f"Chord {'+'.join(keys)} not fully injected, releasing keys")
+        self._send(self.release_inputs(keys))
+        return False
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_chord_engine():
+    """Process-wide engine (Windows only; None elsewhere)."""
+    global _engine
+    if _engine is None and IS_WINDOWS:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ChordEngine()
+    return _engine
@@ -1,4 +1,10 @@
 """Clipboard operations module"""
+import atexit
+import os
+import shutil
+import subprocess
+import threading
+
 try:
     import clipman
     CLIPMAN_AVAILABLE = True
@@ -7,12 +13,100 @@ except ImportError:
 
 import pyperclip
 
+try:
+    from .utils import IS_MAC, IS_WINDOWS
+    from .x11_clipboard import X11ClipboardError, X11SelectionOwner
+except ImportError:
+    from utils import IS_MAC, IS_WINDOWS
+    from x11_clipboard import X11ClipboardError, X11SelectionOwner
+
+# Long-lived providers, initialized once per process
+_x11 = None
+_x11_unavailable = False
+_clipman_ready = False
+_init_lock = threading.Lock()
+# write_seq of the X11 text last handed off at exit
+_handed_off_seq = None
+# Processes that keep serving the clipboard after we exit
+_DETACHED_COPY_COMMANDS = (['xclip', '-selection', 'clipboard', '-in'], ['xsel', '--clipboard', '--input'])
+
+
+def _x11_provider():
+    """In-process X11 selection owner on Linux/X11; None when unavailable (fall back)."""
+    global _x11, _x11_unavailable
+    if _x11 is not None or _x11_unavailable:
+        return _x11
+    with _init_lock:
+        if _x11 is None and not _x11_unavailable:
+            if IS_WINDOWS or IS_MAC or not os.environ.get('DISPLAY'):
+                _x11_unavailable = True
+            else:
+                try:
+                    _x11 = X11SelectionOwner()
+                    # The selection dies with the process; exits other than quit_app hand it off too
+                    atexit.register(clipboard_handoff)
+                except X11ClipboardError as e:
+                    print(f"X11 clipboard unavailable: {e}, falling back to clipman/pyperclip")
+                    _x11_unavailable = True
+    return _x11
+
+
+def _clipman_init():
+    global _clipman_ready
+    if not _clipman_ready:
+        clipman.init()
+        _clipman_ready = True
+
+
+def clipboard_write_seq():
+    """
+    Counter that changes on every clipboard write (Windows clipboard sequence number,
+    or our X11 selection owner's), or None when writes cannot be observed.
+    """
+    if IS_WINDOWS:
+        import ctypes
+        # 0 means no access to the clipboard's window station
+        return ctypes.windll.user32.GetClipboardSequenceNumber() or None
+    x11 = _x11_provider()
+    return x11.write_seq if x11 is not None else None
+
+
+def clipboard_read_seq(client=None):
+    """
+    Counter of clipboard reads by other clients (by one X client, see clipboard_focused_client()),
+    or None when reads cannot be observed (only while our X11 selection owner holds the
+    clipboard; Windows has no read notification).
+    """
+    x11 = _x11_provider()
+    if x11 is not None and x11.owned:
+        return x11.read_seq if client is None else x11.reads_by(client)
+    return None
+
+
+def clipboard_focused_client(window=None):
+    """
+    X client of the focused window, or of window (an id the caller looked up over its own
+    connection), to tell the paste target's reads from a clipboard manager's; None if unknown.
+    """
+    x11 = _x11_provider()
+    if x11 is None:
+        return None
+    if window is None:
+        return x11.focused_client()
+    return x11.client_of(window)
+
 
 def clipboard_get():
     """Get clipboard content (prefer clipman to avoid triggering Ditto)"""
+    x11 = _x11_provider()
+    if x11 is not None:
+        try:
+            return x11.get()
+        except X11ClipboardError as e:
+            print(f"X11 clipboard get failed: {e}, falling back")
     if CLIPMAN_AVAILABLE:
         try:
-            clipman.init()
+            _clipman_init()
             return clipman.get()
         except Exception as e:
             print(f"clipman.get() failed: {e}, falling back to pyperclip")
@@ -22,9 +116,16 @@ def clipboard_get():
 
 def clipboard_set(text):
     """Set clipboard content (prefer clipman to avoid triggering Ditto)"""
+    x11 = _x11_provider()
+    if x11 is not None:
+        try:
+            x11.set(text)
+            return
+        except X11ClipboardError as e:
+            print(f"X11 clipboard set failed: {e}, falling back")
     if CLIPMAN_AVAILABLE:
         try:
-            clipman.init()
+            _clipman_init()
             clipman.set(text)
             return
         except Exception as e:
@@ -32,3 +133,41 @@ def clipboard_set(text):
     # Fallback to pyperclip
     pyperclip.copy(text)
 
+
+def _detached_copy(text):
+    """Give text to an xclip/xsel process that keeps owning the clipboard after we exit."""
+    for cmd in _DETACHED_COPY_COMMANDS:
+        if not shutil.which(cmd[0]):
+            continue
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL, start_new_session=True)
+            proc.communicate(text.encode('utf-8'), timeout=2.0)
+            return True
+        except Exception as e:
+            print(f"{cmd[0]} clipboard hand-off failed: {e}")
+    return False
+
+
+def clipboard_handoff():
+    """
+    Before exit: keep the clipboard (e.g. the user's text restored after a paste) alive
+    once our X11 selection owner is gone. The clipboard manager saves it (SAVE_TARGETS),
+    or without one a detached xclip/xsel takes it over. True when nothing needed handing
+    off or it was taken over; safe to call more than once.
+    """
+    global _handed_off_seq
+    x11 = _x11
+    if x11 is None or not x11.owned or x11.write_seq == _handed_off_seq:
+        return True
+    text = x11.get()
+    try:
+        saved = x11.handoff()
+    except Exception as e:
+        print(f"Clipboard manager hand-off failed: {e}")
+        saved = False
+    if saved or _detached_copy(text):
+        _handed_off_seq = x11.write_seq
+        return True
+    print("Clipboard content is lost on exit: no clipboard manager and no xclip/xsel")
+    return False
@@ -0,0 +1,177 @@
+"""Deferred, coalesced clipboard restoration.
+
+The user's clipboard is captured once per burst (on the first paste) and put back by
+a background timer after the last paste of the burst has settled. Every paste re-arms
+the timer and bumps a generation counter, so only the latest timer restores. The
+restore itself runs as a job on the injection worker, which owns the clipboard; the
+request that pasted returns as soon as its paste chord is sent.
+
+When the backend can tell that the target has read the clipboard, the timer fires as
+soon as that happens and the settle time is only an upper bound.
+"""
+import threading
+import time
+
+try:
+    from .injection_backend import get_backend
+except ImportError:
+    from injection_backend import get_backend
+
+# Retry delay when the injection queue is full at the moment the timer fires
+_RETRY_S = 0.05
+# How often a ready-aware timer checks whether the paste has been read
+_READY_POLL_S = 0.002
+
+
+def _submit_to_worker(fn, *args):
+    # Imported lazily: injection_worker -> keyword_pipeline -> keyboard -> this module
+    try:
+        from .injection_worker import get_worker
+    except ImportError:
+        from injection_worker import get_worker
+    get_worker().submit('restore', fn, *args)
+
+
+class _ReadyTimer(threading.Thread):
+    """Like threading.Timer, but fires as soon as ready() is true; interval is the upper bound."""
+
+    def __init__(self, interval, ready, function, args=()):
+        super().__init__(name='clipboard-restore-timer', daemon=True)
+        self.interval = interval
+        self.ready = ready
+        self.function = function
+        self.args = args
+        self.finished = threading.Event()
+
+    def cancel(self):
+        self.finished.set()
+
+    def run(self):
+        started = time.monotonic()
+        deadline = started + self.interval
+        while not self.finished.is_set():
+            try:
+                ready = bool(self.ready())
+            except Exception:
+                ready = False
+            remaining = deadline - time.monotonic()
+            if ready or remaining <= 0:
+                self.function(*self.args, ready, time.monotonic() - started)
+                return
+            self.finished.wait(min(_READY_POLL_S, remaining))
+
+
+class DeferredRestore:
+    """
+    Per-process restore state. capture() / schedule() / flush() are called from the
+    injection thread; the timer thread only submits the restore job.
+    """
+
+    def __init__(self, submit=_submit_to_worker):
+        self._submit = submit
+        self._lock = threading.Lock()
+        self._pending = False
+        self._original = None
+        self._generation = 0
+        self._timer = None
+        self._stats = {'captures': 0, 'restores': 0, 'rescheduled': 0, 'early': 0, 'saved_ms': 0.0}
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def capture(self):
+        """The user's clipboard for this burst: read once, reused while a restore is pending."""
+        with self._lock:
+            if self._pending:
+                return self._original
+        original = get_backend().clipboard_get()
+        with self._lock:
+            self._original = original
+            self._pending = True
+            self._stats['captures'] += 1
+        return original
+
+    def schedule(self, settle_s, ready=None):
+        """
+        (Re)arm the restore to run settle_s after now; an earlier pending timer is superseded.
+        With ready (a predicate, e.g. keyboard.paste_consumed_probe()), it runs as soon as
+        ready() is true and settle_s is only the upper bound.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            self._generation += 1
+            generation = self._generation
+            if self._timer is not None:
+                self._timer.cancel()
+                self._stats['rescheduled'] += 1
+            settle_s = max(0.0, settle_s)
+            if ready is None:
+                self._timer = threading.Timer(settle_s, self._fire, args=(generation,))
+                self._timer.daemon = True
+            else:
+                self._timer = _ReadyTimer(settle_s, ready, self._fire_when_ready, args=(generation, settle_s))
+            self._timer.start()
+
+    def _fire_when_ready(self, generation, settle_s, ready, waited_s):
+        if ready:
+            with self._lock:
+                self._stats['early'] += 1
+                self._stats['saved_ms'] += max(0.0, settle_s - waited_s) * 1000
+        self._fire(generation)
+
+    def _fire(self, generation):
+        try:
+            self._submit(self.restore, generation)
+        except Exception as e:
+            print(f"[Clipboard] Restore deferred again: {e}")
+            with self._lock:
+                if generation != self._generation:
+                    return
+            self.schedule(_RETRY_S)
+
+    def restore(self, generation=None):
+        """Put the captured clipboard back now. With a generation, only if no newer paste happened."""
+        with self._lock:
+            if not self._pending or (generation is not None and generation != self._generation):
+                return False
+            original = self._original
+            self._pending = False
+            self._original = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._stats['restores'] += 1
+        try:
+            get_backend().clipboard_set('' if original is None else original)
+            print("[Clipboard] Restored original content")
+        except Exception as e:
+            print(f"[Clipboard] Failed to restore: {e}")
+        return True
+
+    def flush(self):
+        """Restore immediately if a restore is pending (error paths, shutdown, tests)."""
+        return self.restore()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['saved_ms'] = round(stats['saved_ms'], 3)
+        stats['pending'] = self._pending
+        return stats
+
+
+_restorer = DeferredRestore()
+
+
+def get_restorer():
+    return _restorer
+
+
+def set_restorer(restorer):
+    """Replace the process-wide restorer; returns the previous one."""
+    global _restorer
+    previous = _restorer
+    _restorer = restorer
+    return previous
@@ -0,0 +1,200 @@
+"""Clock for every deliberate delay on the paste path, plus per-request latency reports.
+
+All sleeps go through delay(); swap in VirtualClock to run instantly while still
+recording how much waiting would have happened. Waits that can end early once an
+event is observed (wait_until) are also recorded per stage, against their budget.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Report buckets: deliberate waiting, clipboard reads/writes, key/text injection
+CATEGORIES = ('sleep', 'clipboard', 'inject')
+# Poll interval of wait_until()
+WAIT_POLL_S = 0.001
+
+
+class RealClock:
+    """Wall clock; sleeps for real."""
+
+    def now(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class VirtualClock:
+    """Sleeps return immediately and advance virtual time; every sleep is recorded."""
+
+    def __init__(self, start=0.0):
+        self._now = start
+        self._lock = threading.Lock()
+        self.sleeps = []
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._now += seconds
+            self.sleeps.append(seconds)
+
+    @property
+    def total_slept(self):
+        return sum(self.sleeps)
+
+
+class LatencyReport:
+    """Where one request's time went: sleeping, clipboard I/O, injection, and the rest."""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.seconds = dict.fromkeys(CATEGORIES, 0.0)
+        self.counts = dict.fromkeys(CATEGORIES, 0)
+        self._sleep_wall = 0.0
+        self.stages = {}
+        self._started = time.perf_counter()
+        self.total = None
+
+    def add(self, category, seconds):
+        self.seconds[category] += seconds
+        self.counts[category] += 1
+
+    def add_stage(self, stage, waited, budget, observed):
+        """One bounded wait: time actually waited, its upper bound, and whether the event was seen."""
+        entry = self.stages.setdefault(stage, {'count': 0, 'observed': 0, 'waited': 0.0, 'budget': 0.0})
+        entry['count'] += 1
+        entry['observed'] += 1 if observed else 0
+        entry['waited'] += waited
+        entry['budget'] += budget
+
+    def finish(self):
+        self.total = time.perf_counter() - self._started
+        return self
+
+    def to_dict(self):
+        total = self.total if self.total is not None else time.perf_counter() - self._started
+        measured = self.seconds['clipboard'] + self.seconds['inject'] + self._sleep_wall
+        d = {'total_ms': round(total * 1000, 3)}
+        for cat in CATEGORIES:
+            d[cat + '_ms'] = round(self.seconds[cat] * 1000, 3)
+        d['other_ms'] = round(max(0.0, total - measured) * 1000, 3)
+        d['counts'] = dict(self.counts)
+        if self.stages:
+            d['stages'] = {
+                stage: {
+                    'count': e['count'],
+                    'observed': e['observed'],
+                    'waited_ms': round(e['waited'] * 1000, 3),
+                    'budget_ms': round(e['budget'] * 1000, 3),
+                    'saved_ms': round(max(0.0, e['budget'] - e['waited']) * 1000, 3),
+                }
+                for stage, e in self.stages.items()
+            }
+        if self.label:
+            d['label'] = self.label
+        return d
+
+
+_clock = RealClock()
+_local = threading.local()
+_last_report = None
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    """Replace the active clock; returns the previous one."""
+    global _clock
+    previous = _clock
+    _clock = clock
+    return previous
+
+
+def current_report():
+    return getattr(_local, 'report', None)
+
+
+def last_report():
+    """Most recently finished report on any thread."""
+    return _last_report
+
+
+def delay(seconds):
+    """Deliberate wait on the paste path. Recorded (planned seconds) in the current report."""
+    if seconds <= 0:
+        return
+    report = current_report()
+    t0 = time.perf_counter()
+    _clock.sleep(seconds)
+    if report is not None:
+        report.add('sleep', seconds)
+        report._sleep_wall += time.perf_counter() - t0
+
+
+def wait_until(predicate, timeout, stage, poll_s=WAIT_POLL_S):
+    """
+    Wait until predicate() is true, at most timeout seconds (clock time). The timeout is
+    an upper bound, not a fixed cost. Returns whether the event was observed; the wait
+    counts as 'sleep' and is recorded under stage in the current report.
+    """
+    report = current_report()
+    t0 = _clock.now()
+    wall0 = time.perf_counter()
+    observed = bool(predicate())
+    while not observed:
+        remaining = timeout - (_clock.now() - t0)
+        if remaining <= 0:
+            break
+        _clock.sleep(min(poll_s, remaining))
+        observed = bool(predicate())
+    waited = _clock.now() - t0
+    if report is not None:
+        if waited > 0:
+            report.add('sleep', waited)
+            report._sleep_wall += time.perf_counter() - wall0
+        report.add_stage(stage, waited, timeout, observed)
+    return observed
+
+
+def record_stage(stage, waited, budget, observed=False):
+    """Record a bounded wait that was taken some other way (e.g. a fixed delay())."""
+    report = current_report()
+    if report is not None:
+        report.add_stage(stage, waited, budget, observed)
+
+
+@contextmanager
+def measure(category):
+    """Attribute wall time of the block to category, excluding any delay() inside it."""
+    report = current_report()
+    if report is None:
+        yield
+        return
+    slept_before = report._sleep_wall
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0 - (report._sleep_wall - slept_before)
+        report.add(category, max(0.0, elapsed))
+
+
+@contextmanager
+def track_latency(label=None):
+    """Collect a LatencyReport for everything the current thread does inside the block."""
+    global _last_report
+    previous = current_report()
+    report = LatencyReport(label)
+    _local.report = report
+    try:
+        yield report
+    finally:
+        _local.report = previous
+        _last_report = report.finish()
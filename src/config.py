@@ -2,12 +2,21 @@
 import os
 import json
 import platform
+import threading
+import time
+
+# Bumped whenever config.json is known to have changed (save_config or on-disk edit).
+# Consumers compare versions instead of re-reading the file.
+_config_version = 0
+_config_lock = threading.Lock()
+_last_seen_mtime = None
+_watcher_thread = None
 
 
 def get_config_path():
     """Get configuration file path"""
     is_windows = platform.system() == 'Windows'
-    
+
     if is_windows:
         config_dir = os.path.join(os.environ.get('APPDATA', ''), 'QAA-AirType')
     else:
@@ -30,10 +39,66 @@ def load_config() -> dict:
 
 def save_config(config: dict):
     """Save configuration"""
+    global _last_seen_mtime
     try:
         config_path = get_config_path()
         with open(config_path, 'w', encoding='utf-8') as f:
             json.dump(config, f, ensure_ascii=False, indent=2)
+        with _config_lock:
+            _last_seen_mtime = _get_mtime(config_path)
     except Exception as e:
         print(f"Save config failed: {e}")
+    mark_config_changed()
+
+
+def get_config_version() -> int:
+    """Current config version; changes whenever config.json changes."""
+    return _config_version
+
+
+def mark_config_changed():
+    """Bump the config version so cached compiled state is rebuilt on next use."""
+    global _config_version
+    with _config_lock:
+        _config_version += 1
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def poll_config_file() -> bool:
+    """Check config.json mtime once; bump the version if it was edited on disk. Returns True on change."""
+    global _last_seen_mtime
+    mtime = _get_mtime(get_config_path())
+    with _config_lock:
+        if mtime == _last_seen_mtime:
+            return False
+        _last_seen_mtime = mtime
+    mark_config_changed()
+    return True
+
+
+def start_config_watcher(interval=1.0):
+    """Poll config.json in a daemon thread so external edits invalidate cached config."""
+    global _watcher_thread, _last_seen_mtime
+    if _watcher_thread is not None and _watcher_thread.is_alive():
+        return _watcher_thread
+
+    def _watch():
+        while True:
+            try:
+                poll_config_file()
+            except Exception as e:
+                print(f"Config watcher error: {e}")
+            time.sleep(interval)
 
+    with _config_lock:
+        if _last_seen_mtime is None:
+            _last_seen_mtime = _get_mtime(get_config_path())
+    _watcher_thread = threading.Thread(target=_watch, name='config-watcher', daemon=True)
+    _watcher_thread.start()
+    return _watcher_thread
@@ -0,0 +1,95 @@
+"""In-process publish/subscribe for status updates (text sent, paste failed, CF status and link, queue depth).
+
+Producers (web routes, the injection worker, the CF client) publish; the GUI, tray and
+the phone page's /events stream subscribe instead of polling. Callbacks run
+synchronously on the publishing thread, so a Tk subscriber must hand the work to its
+main loop (root.after). The bus remembers the last value per topic: a new subscriber can
+read it at once, and publishing a value equal to the last one is dropped unless
+force=True, so subscribers only see changes.
+"""
+import threading
+
+# Topics and their values
+TEXT_SENT = 'text_sent'          # str: text of the last /type, /ops or CF message
+DELIVERED = 'delivered'          # dict: {'kind', 'success', 'jobs', 'elapsed_ms'} per input job; forced
+PASTE_FAILED = 'paste_failed'    # dict: {'kind', 'error'}; forced
+CF_STATUS = 'cf_status'          # dict: {'state': connected / connecting / disconnected / error, 'text'}
+CF_LINK = 'cf_link'              # dict: CFChatClient.stats() (rtt_ms, reconnects, disconnected_s, ...)
+QUEUE_DEPTH = 'queue_depth'      # int: jobs waiting in the injection queue
+MUTE_STATE = 'mute'              # dict: {'auto_mute', 'muted'} (auto mute enabled, muted by the app)
+
+
+class EventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._latest = {}
+        self._stats = {'published': 0, 'dropped_unchanged': 0, 'delivered': 0, 'callback_errors': 0}
+
+    def subscribe(self, topic, callback):
+        """Call callback(value) on every change of topic; returns a function that unsubscribes."""
+        with self._lock:
+            self._subscribers.setdefault(topic, []).append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                callbacks = self._subscribers.get(topic, [])
+                if callback in callbacks:
+                    callbacks.remove(callback)
+
+        return unsubscribe
+
+    def publish(self, topic, value, force=False):
+        """Deliver value to the topic's subscribers. Returns False when it was dropped as unchanged."""
+        with self._lock:
+            if not force and topic in self._latest and self._latest[topic] == value:
+                self._stats['dropped_unchanged'] += 1
+                return False
+            self._latest[topic] = value
+            self._stats['published'] += 1
+            callbacks = list(self._subscribers.get(topic, ()))
+        for callback in callbacks:
+            try:
+                callback(value)
+            except Exception as e:
+                print(f"Event subscriber for '{topic}' failed: {e}")
+                with self._lock:
+                    self._stats['callback_errors'] += 1
+            else:
+                with self._lock:
+                    self._stats['delivered'] += 1
+        return True
+
+    def latest(self, topic, default=None):
+        """Last value published on topic."""
+        with self._lock:
+            return self._latest.get(topic, default)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = sum(len(callbacks) for callbacks in self._subscribers.values())
+        return stats
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    """Process-wide event bus."""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                _bus = EventBus()
+    return _bus
+
+
+def set_bus(bus):
+    """Replace the process-wide bus; returns the previous one."""
+    global _bus
+    with _bus_lock:
+        previous = _bus
+        _bus = bus
+    return previous
@@ -0,0 +1,111 @@
+"""Server-Sent Events for the phone page (GET /events).
+
+Each open stream subscribes to the event bus and forwards its events as SSE frames
+(`event: <topic>` / `data: <json>`). The first frame is a 'state' snapshot so the page
+starts from the server's view, not from what its own requests returned. A comment line
+is sent when nothing happened for heartbeat_s, which keeps proxies from closing the
+stream and makes the server notice a client that went away (the write fails and the
+stream unsubscribes). Every stream holds one server thread, so their number is capped.
+"""
+import json
+import queue
+import threading
+
+try:
+    from .event_bus import CF_STATUS, DELIVERED, MUTE_STATE, PASTE_FAILED, QUEUE_DEPTH, TEXT_SENT
+except ImportError:
+    from event_bus import CF_STATUS, DELIVERED, MUTE_STATE, PASTE_FAILED, QUEUE_DEPTH, TEXT_SENT
+
+STREAM_TOPICS = (TEXT_SENT, DELIVERED, PASTE_FAILED, QUEUE_DEPTH, MUTE_STATE, CF_STATUS)
+HEARTBEAT_S = 15.0
+# Client reconnect delay announced to EventSource (ms)
+RETRY_MS = 2000
+# Events buffered per stream for a slow client; the oldest are dropped beyond this
+MAX_BACKLOG = 100
+MAX_STREAMS = 8
+
+
+def format_event(event, data):
+    """One SSE frame; data is sent as a single line of JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+class EventStream:
+    """One client's subscription: bus events buffered until the response generator sends them."""
+
+    def __init__(self, bus, topics=STREAM_TOPICS, backlog=MAX_BACKLOG, on_close=None):
+        self._queue = queue.Queue(backlog)
+        self._on_close = on_close
+        self._closed = False
+        self.dropped = 0
+        self._unsubscribers = [
+            bus.subscribe(topic, lambda value, topic=topic: self._push(topic, value)) for topic in topics
+        ]
+
+    def _push(self, topic, value):
+        while True:
+            try:
+                self._queue.put_nowait((topic, value))
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def frames(self, snapshot, heartbeat_s=HEARTBEAT_S):
+        """Generator of SSE text: retry hint and snapshot, then events and heartbeats until closed."""
+        try:
+            yield f"retry: {RETRY_MS}\n\n" + format_event('state', snapshot)
+            while not self._closed:
+                try:
+                    topic, value = self._queue.get(timeout=heartbeat_s)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                yield format_event(topic, value)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for unsubscribe in self._unsubscribers:
+            unsubscribe()
+        if self._on_close is not None:
+            self._on_close(self)
+
+
+class EventStreams:
+    """Open streams of one app: at most max_streams at a time."""
+
+    def __init__(self, bus_fn, max_streams=MAX_STREAMS):
+        self._bus_fn = bus_fn
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._open = set()
+        self._stats = {'opened': 0, 'rejected': 0, 'dropped_events': 0}
+
+    def open(self):
+        """A new EventStream, or None when max_streams are already open."""
+        with self._lock:
+            if len(self._open) >= self.max_streams:
+                self._stats['rejected'] += 1
+                return None
+            stream = EventStream(self._bus_fn(), on_close=self._closed)
+            self._open.add(stream)
+            self._stats['opened'] += 1
+        return stream
+
+    def _closed(self, stream):
+        with self._lock:
+            self._open.discard(stream)
+            self._stats['dropped_events'] += stream.dropped
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open'] = len(self._open)
+        return stats
@@ -0,0 +1,357 @@
+"""Key-injection backends.
+
+Everything that reaches the OS on the paste path (chords, key presses, direct text
+commit, clipboard get/set, deliberate delays) goes through the active backend, so the
+whole /type -> execute_typed_text path can run headless against RecordingBackend.
+"""
+import threading
+import time
+
+try:
+    from .chord_engine import get_chord_engine
+    from .clipboard import (clipboard_focused_client, clipboard_get, clipboard_read_seq, clipboard_set,
+                            clipboard_write_seq)
+    from .clock import delay, measure, record_stage, wait_until
+    from .utils import IS_MAC, IS_WINDOWS
+except ImportError:
+    from chord_engine import get_chord_engine
+    from clipboard import (clipboard_focused_client, clipboard_get, clipboard_read_seq, clipboard_set,
+                           clipboard_write_seq)
+    from clock import delay, measure, record_stage, wait_until
+    from utils import IS_MAC, IS_WINDOWS
+
+
+def _keyboard_module():
+    # Imported lazily: keyboard.py itself dispatches through get_backend()
+    try:
+        from . import keyboard
+    except ImportError:
+        import keyboard
+    return keyboard
+
+
+def _win_input_module():
+    try:
+        from . import win_input
+    except ImportError:
+        import win_input
+    return win_input
+
+
+def _x11_input_module():
+    # python-xlib is only needed (and only imported) on Linux/X11
+    try:
+        from . import x11_input
+    except ImportError:
+        import x11_input
+    return x11_input
+
+
+def _pyautogui_key_names(keys):
+    """Map whitelist tokens to pyautogui key names."""
+    return ['winleft' if k == 'win' else k for k in keys]
+
+
+class InjectionBackend:
+    """
+    Interface. Public methods time themselves into the current latency report
+    ('inject' / 'clipboard'); subclasses implement the underscore hooks.
+    """
+
+    name = 'base'
+
+    def chord(self, keys):
+        """Press keys in order, release in reverse. Returns True on success."""
+        with measure('inject'):
+            return self._chord(keys)
+
+    def press(self, key):
+        return self.chord([key])
+
+    def commit_text(self, text):
+        """Type text into the focused window without the clipboard. False if unsupported."""
+        with measure('inject'):
+            return self._commit_text(text)
+
+    def clipboard_get(self):
+        with measure('clipboard'):
+            return self._clipboard_get()
+
+    def clipboard_set(self, text):
+        with measure('clipboard'):
+            self._clipboard_set(text)
+
+    def delay(self, seconds):
+        delay(seconds)
+
+    def clipboard_write_seq(self):
+        """Changes on every clipboard write; None when writes cannot be observed."""
+        return clipboard_write_seq()
+
+    def clipboard_read_seq(self, client=None):
+        """
+        Changes when another client (or the given clipboard_reader() client) reads the
+        clipboard; None when reads cannot be observed.
+        """
+        return clipboard_read_seq(client)
+
+    def clipboard_reader(self):
+        """The client a paste sent now would be read by (the focused window's), or None if unknown."""
+        return clipboard_focused_client()
+
+    def wait_for(self, stage, predicate, timeout):
+        """
+        Wait until predicate() holds, at most timeout. Without a predicate (the event
+        cannot be observed) this is a fixed delay of timeout. Returns whether it was observed.
+        """
+        if predicate is None:
+            self.delay(timeout)
+            record_stage(stage, timeout, timeout)
+            return False
+        return wait_until(predicate, timeout, stage)
+
+    def _chord(self, keys):
+        raise NotImplementedError
+
+    def _commit_text(self, text):
+        return False
+
+    def _clipboard_get(self):
+        return clipboard_get()
+
+    def _clipboard_set(self, text):
+        clipboard_set(text)
+
+
+class PyAutoGuiBackend(InjectionBackend):
+    """Cross-platform fallback using pyautogui (imported on first use; needs a display)."""
+
+    name = 'pyautogui'
+
+    def __init__(self):
+        self._pyautogui = None
+
+    def _pg(self):
+        if self._pyautogui is None:
+            import pyautogui
+            self._pyautogui = pyautogui
+        return self._pyautogui
+
+    # Settle time is scheduled explicitly through delay(), so every call skips
+    # pyautogui's own pause (_pause=False) instead of zeroing the process-wide PAUSE
+
+    def _chord(self, keys):
+        names = _pyautogui_key_names(keys)
+        if len(names) == 1:
+            self._pg().press(names[0], _pause=False)
+        else:
+            self._pg().hotkey(*names, _pause=False)
+        return True
+
+    def _commit_text(self, text):
+        # pyautogui.write silently drops characters it has no key for
+        if not text.isascii():
+            return False
+        self._pg().write(text, _pause=False)
+        return True
+
+
+class WindowsBackend(PyAutoGuiBackend):
+    """Win32 chord engine (scan codes, one SendInput batch), SendInput Unicode text, pyautogui for anything else."""
+
+    name = 'windows'
+
+    def __init__(self):
+        super().__init__()
+        # Build the scan-code table now rather than on the first keystroke
+        get_chord_engine()
+
+    def _chord(self, keys):
+        kb = _keyboard_module()
+        ok = kb.send_chord_windows(keys)
+        if ok is None:
+            ok = super()._chord(keys)
+        if 'insert' in keys:
+            kb.ensure_insert_mode_reset()
+        return bool(ok)
+
+    def _commit_text(self, text):
+        # KEYEVENTF_UNICODE: any text including surrogate pairs, one SendInput batch
+        return bool(text) and _win_input_module().send_unicode_text(text)
+
+
+class XTestBackend(InjectionBackend):
+    """Linux/X11: chords and Unicode text over one persistent XTest connection, no pauses."""
+
+    name = 'xtest'
+
+    def __init__(self, xinput=None):
+        if xinput is None:
+            x11_input = _x11_input_module()
+            xinput = x11_input.get_xtest_input()
+            if xinput is None:
+                raise x11_input.XTestUnavailable("XTest input could not be initialized")
+        self._xinput = xinput
+
+    def _chord(self, keys):
+        if not self._xinput.supports(keys):
+            print(f"XTest has no key for chord {'+'.join(keys)}")
+            return False
+        return self._xinput.chord(keys)
+
+    def _commit_text(self, text):
+        return bool(text) and self._xinput.type_text(text)
+
+    def clipboard_reader(self):
+        # Focus lookup over the XTest connection, not the clipboard owner's (busy serving events)
+        window = self._xinput.focused_window()
+        return None if window is None else clipboard_focused_client(window)
+
+
+class RecordingBackend(InjectionBackend):
+    """
+    In-memory fake: logs every event with a perf_counter timestamp and keeps its own clipboard.
+    Delays go through the active clock (use clock.VirtualClock to skip the waiting).
+    With observe_paste, clipboard writes and paste chords bump write/read sequence
+    numbers, as if every paste were read by the target ('target') straight away;
+    simulate_read() stands in for another client (a clipboard manager) reading it.
+    """
+
+    name = 'recording'
+    paste_keys = (('ctrl', 'v'), ('shift', 'insert'))
+
+    def __init__(self, clipboard='', observe_paste=False):
+        self.events = []
+        self._clipboard = clipboard
+        self._lock = threading.Lock()
+        self._seq = {'write': 0, 'read': 0, 'target': 0} if observe_paste else None
+
+    def _record(self, kind, **fields):
+        event = {'kind': kind, 't': time.perf_counter()}
+        event.update(fields)
+        with self._lock:
+            self.events.append(event)
+        return event
+
+    def _chord(self, keys):
+        self._record('chord', keys=list(keys))
+        if self._seq is not None and tuple(keys) in self.paste_keys:
+            self._seq['read'] += 1
+            self._seq['target'] += 1
+        return True
+
+    def _commit_text(self, text):
+        self._record('commit_text', text=text)
+        return True
+
+    def _clipboard_get(self):
+        self._record('clipboard_get')
+        return self._clipboard
+
+    def _clipboard_set(self, text):
+        self._record('clipboard_set', text=text)
+        self._clipboard = text
+        if self._seq is not None:
+            self._seq['write'] += 1
+
+    def clipboard_write_seq(self):
+        return None if self._seq is None else self._seq['write']
+
+    def clipboard_read_seq(self, client=None):
+        if self._seq is None:
+            return None
+        return self._seq['read'] if client is None else self._seq.get(client, 0)
+
+    def clipboard_reader(self):
+        return 'target' if self._seq is not None else None
+
+    def simulate_read(self, client='manager'):
+        """Another client (a clipboard manager by default) reads the clipboard."""
+        self._record('read', client=client)
+        self._seq['read'] += 1
+        self._seq[client] = self._seq.get(client, 0) + 1
+
+    def wait_for(self, stage, predicate, timeout):
+        if predicate is not None:
+            self._record('wait', stage=stage, timeout=timeout)
+        return super().wait_for(stage, predicate, timeout)
+
+    def delay(self, seconds):
+        self._record('delay', seconds=seconds)
+        super().delay(seconds)
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+
+    def kinds(self):
+        return [e['kind'] for e in self.events]
+
+    def total_delay(self):
+        return sum(e['seconds'] for e in self.events if e['kind'] == 'delay')
+
+    def typed_output(self, paste_keys=paste_keys):
+        """Replay events: what the focused window would have received, as a list of strings/chords."""
+        out = []
+        clip = None
+        for e in self.events:
+            if e['kind'] == 'clipboard_set':
+                clip = e['text']
+            elif e['kind'] == 'commit_text':
+                out.append(e['text'])
+            elif e['kind'] == 'chord':
+                if tuple(e['keys']) in paste_keys:
+                    out.append(clip)
+                else:
+                    out.append(tuple(e['keys']))
+        return out
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name=None):
+    """
+    Build a backend by name ('windows', 'xtest', 'pyautogui', 'recording'); None picks the
+    platform default (XTest on Linux, falling back to pyautogui when there is no X display).
+    """
+    if name is None:
+        if IS_WINDOWS:
+            name = 'windows'
+        elif IS_MAC:
+            name = 'pyautogui'
+        else:
+            try:
+                return XTestBackend()
+            except _x11_input_module().XTestUnavailable as e:
+                print(f"{e}, falling back to pyautogui")
+                name = 'pyautogui'
+    if name == 'windows':
+        return WindowsBackend()
+    if name == 'xtest':
+        return XTestBackend()
+    if name == 'pyautogui':
+        return PyAutoGuiBackend()
+    if name == 'recording':
+        return RecordingBackend()
+    raise ValueError(f"Unknown injection backend: {name}")
+
+
+def get_backend():
+    """Active backend (platform default on first use)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the active backend; returns the previous one (None resets to default)."""
+    global _backend
+    with _backend_lock:
+        previous = _backend
+        _backend = backend
+    return previous
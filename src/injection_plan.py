@@ -0,0 +1,256 @@
+"""Compile parsed segments into an optimized list of injection ops.
+
+Ops are plain dicts, like segments:
+    {'op': 'paste', 'text': str}                  set clipboard, settle, send paste chord
+    {'op': 'commit', 'text': str}                 type text directly (no clipboard)
+    {'op': 'rule', 'rule': dict, 'count': int}    dispatch a keyword rule count times as one burst
+    {'op': 'restore', 'settle_s': float}          put the staged clipboard back
+        (+ 'deferred': True on the final restore: a background timer restores after
+         settle_s, off the request path)
+    {'op': 'delay', 'seconds': float}             gap between two injections
+
+Segments (and the paste / commit / rule ops built from them) may carry 'index', the
+position of the batch operation they came from (see keyword_pipeline.execute_ops);
+ops of different batch operations are never merged.
+
+Nothing here touches the keyboard or clipboard; keyword_pipeline executes the plan.
+"""
+try:
+    from .keyboard import (
+        DEFAULT_COMMIT_MODE,
+        DEFAULT_COMMIT_THRESHOLD,
+        PASTE_SETTLE_S,
+        RESTORE_SETTLE_S,
+        choose_commit,
+        paste_hotkey_keys,
+    )
+except ImportError:
+    from keyboard import (
+        DEFAULT_COMMIT_MODE,
+        DEFAULT_COMMIT_THRESHOLD,
+        PASTE_SETTLE_S,
+        RESTORE_SETTLE_S,
+        choose_commit,
+        paste_hotkey_keys,
+    )
+
+# Gap between consecutive injections (was slept after every segment)
+SEGMENT_DELAY_S = 0.03
+# Wait before the final restore when preserve_clipboard is on, so the last paste lands
+FINAL_RESTORE_SETTLE_S = 0.12
+
+_ACTION_KEYS = {
+    'shift_enter': ['shift', 'enter'],
+    'enter': ['enter'],
+    'backspace': ['backspace'],
+    'undo': ['ctrl', 'z'],
+}
+
+
+def rule_keys(rule, use_ctrl_v=False):
+    """Key tokens a rule sends (the paste alias resolves to the configured paste chord)."""
+    if 'keys' in rule:
+        return list(rule['keys'])
+    action = rule.get('action')
+    if action == 'paste':
+        return paste_hotkey_keys(use_ctrl_v)
+    return list(_ACTION_KEYS.get(action, []))
+
+
+def rule_reads_clipboard(rule):
+    """True if dispatching the rule pastes whatever is on the clipboard."""
+    if rule.get('action') == 'paste':
+        return True
+    keys = rule.get('keys') or []
+    return keys in (['ctrl', 'v'], ['shift', 'insert'])
+
+
+def _same_rule(a, b):
+    return a is b or a == b
+
+
+def segments_to_ops(segments):
+    """One op per segment, no optimization."""
+    ops = []
+    for seg in segments:
+        if seg.get('type') == 'literal':
+            text = seg.get('text') or ''
+            if text:
+                ops.append(_tagged({'op': 'paste', 'text': text}, seg))
+        elif seg.get('type') == 'keyword':
+            ops.append(_tagged({'op': 'rule', 'rule': seg['rule'], 'count': seg.get('count', 1)}, seg))
+    return ops
+
+
+def _tagged(op, seg):
+    if 'index' in seg:
+        op['index'] = seg['index']
+    return op
+
+
+def merge_adjacent_pastes(ops):
+    """Pass: consecutive literal pastes become one paste."""
+    out = []
+    for op in ops:
+        if op['op'] == 'paste' and out and out[-1]['op'] == 'paste' and out[-1].get('index') == op.get('index'):
+            out[-1] = dict(out[-1], text=out[-1]['text'] + op['text'])
+        else:
+            out.append(dict(op))
+    return out
+
+
+def collapse_rule_runs(ops):
+    """Pass: a run of the same rule (e.g. N x Enter) becomes one burst op."""
+    out = []
+    for op in ops:
+        if (
+            op['op'] == 'rule'
+            and out
+            and out[-1]['op'] == 'rule'
+            and _same_rule(out[-1]['rule'], op['rule'])
+            and out[-1].get('index') == op.get('index')
+        ):
+            out[-1] = dict(out[-1], count=out[-1]['count'] + op.get('count', 1))
+        else:
+            out.append(dict(op))
+    return out
+
+
+def commit_literals(ops, commit_mode=DEFAULT_COMMIT_MODE, commit_threshold=DEFAULT_COMMIT_THRESHOLD):
+    """
+    Pass: type the message's literals instead of pasting them, when commit_mode says so.
+    Decided once per message on all of its literal text.
+    """
+    literal = ''.join(op['text'] for op in ops if op['op'] == 'paste')
+    if not literal or not choose_commit(literal, commit_mode, commit_threshold):
+        return ops
+    return [dict(op, op='commit') if op['op'] == 'paste' else op for op in ops]
+
+
+def place_restores(ops, preserve_clipboard=False, final_settle_s=FINAL_RESTORE_SETTLE_S):
+    """
+    Pass: restore the staged clipboard only where needed.
+    A restore goes before a rule that pastes the clipboard (after a literal overwrote it)
+    and once at the end (deferred), instead of after every literal.
+    """
+    out = []
+    dirty = False
+    for op in ops:
+        if op['op'] == 'rule' and dirty and rule_reads_clipboard(op['rule']):
+            out.append({'op': 'restore', 'settle_s': 0.0})
+            dirty = False
+        out.append(op)
+        if op['op'] == 'paste':
+            dirty = True
+    if dirty:
+        settle = final_settle_s if preserve_clipboard else 0.0
+        out.append({'op': 'restore', 'settle_s': settle, 'deferred': True})
+    return out
+
+
+def insert_delays(ops, delay_s=SEGMENT_DELAY_S):
+    """Pass: one gap between consecutive injections (pastes / commits / rule bursts), none after the last."""
+    out = []
+    last_injection = None
+    for op in ops:
+        if op['op'] in ('paste', 'commit', 'rule'):
+            if last_injection is not None and delay_s > 0:
+                out.insert(last_injection + 1, {'op': 'delay', 'seconds': delay_s})
+            out.append(op)
+            last_injection = len(out) - 1
+        else:
+            out.append(op)
+    return out
+
+
+class InjectionPlan:
+    """Optimized op list for one typed payload, plus its predicted delay budget."""
+
+    def __init__(self, ops, use_ctrl_v=False, preserve_clipboard=False, baseline_delay_s=0.0,
+                 paste_settle_s=PASTE_SETTLE_S):
+        self.ops = ops
+        self.use_ctrl_v = use_ctrl_v
+        self.preserve_clipboard = preserve_clipboard
+        self.baseline_delay_s = baseline_delay_s
+        # Upper bound of the wait between clipboard write and paste chord
+        self.paste_settle_s = paste_settle_s
+
+    @property
+    def needs_staged_clipboard(self):
+        return any(op['op'] == 'restore' for op in self.ops)
+
+    def op_delay(self, op):
+        kind = op['op']
+        if kind == 'paste':
+            return self.paste_settle_s
+        if kind == 'restore':
+            # A deferred restore waits on a timer, not on the request
+            return 0.0 if op.get('deferred') else op.get('settle_s', 0.0)
+        if kind == 'delay':
+            return op['seconds']
+        # rule / commit: chords and typed text go out without sleeping (every backend)
+        return 0.0
+
+    def predicted_delay_s(self):
+        """Deliberate waiting (sleeps) this plan will spend on the request path, in seconds."""
+        return sum(self.op_delay(op) for op in self.ops)
+
+    def to_dict(self):
+        ops = []
+        for op in self.ops:
+            d = dict(op)
+            if op['op'] == 'rule':
+                d['keys'] = rule_keys(op['rule'], self.use_ctrl_v)
+            d['delay_s'] = round(self.op_delay(op), 4)
+            ops.append(d)
+        return {
+            'ops': ops,
+            'predicted_delay_s': round(self.predicted_delay_s(), 4),
+            'baseline_delay_s': round(self.baseline_delay_s, 4),
+        }
+
+
+def segments_contain_rules(segments):
+    return any(seg.get('type') == 'keyword' for seg in segments)
+
+
+def baseline_delay(segments, preserve_clipboard=False):
+    """Delay budget of the old per-segment loop (sleep after every segment), for comparison."""
+    ops = segments_to_ops(segments)
+    total = PASTE_SETTLE_S * sum(1 for op in ops if op['op'] == 'paste')
+    if not segments_contain_rules(segments):
+        if ops and preserve_clipboard:
+            total += RESTORE_SETTLE_S
+        return total
+    total += SEGMENT_DELAY_S * len(ops)
+    if preserve_clipboard:
+        total += FINAL_RESTORE_SETTLE_S
+    return total
+
+
+def compile_plan(segments, use_ctrl_v=False, preserve_clipboard=False,
+                 commit_mode=DEFAULT_COMMIT_MODE, commit_threshold=DEFAULT_COMMIT_THRESHOLD,
+                 paste_settle_s=None, restore_settle_s=None, segment_delay_s=None):
+    """
+    Run all passes over segments and return an InjectionPlan.
+    The settle / gap times default to the module constants (per-app profiles override them).
+    """
+    ops = segments_to_ops(segments)
+    ops = merge_adjacent_pastes(ops)
+    ops = collapse_rule_runs(ops)
+    ops = commit_literals(ops, commit_mode, commit_threshold)
+    if segments_contain_rules(segments):
+        final_settle_s = FINAL_RESTORE_SETTLE_S if restore_settle_s is None else restore_settle_s
+        ops = place_restores(ops, preserve_clipboard=preserve_clipboard, final_settle_s=final_settle_s)
+    elif any(op['op'] == 'paste' for op in ops) and preserve_clipboard:
+        # Literal-only text takes the plain paste_text path
+        settle = RESTORE_SETTLE_S if restore_settle_s is None else restore_settle_s
+        ops.append({'op': 'restore', 'settle_s': settle, 'deferred': True})
+    ops = insert_delays(ops, SEGMENT_DELAY_S if segment_delay_s is None else segment_delay_s)
+    return InjectionPlan(
+        ops,
+        use_ctrl_v=use_ctrl_v,
+        preserve_clipboard=preserve_clipboard,
+        baseline_delay_s=baseline_delay(segments, preserve_clipboard),
+        paste_settle_s=PASTE_SETTLE_S if paste_settle_s is None else paste_settle_s,
+    )
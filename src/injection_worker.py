@@ -0,0 +1,272 @@
+"""Single-writer injection worker.
+
+One thread owns the keyboard and clipboard. HTTP handlers and the CF client submit
+jobs to a bounded FIFO and wait on the returned future, so two requests can never
+interleave clipboard writes and chords.
+
+Consecutive text jobs are coalesced into one paste (burst coalescing): after taking
+a text job the worker waits up to coalesce_window_ms for more and merges up to
+coalesce_max_batch of them. A control-key job ends the batch, so order is kept.
+
+Queue depth changes, finished input jobs (delivery receipts) and failures are published
+on the event bus.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    from .clock import track_latency
+    from .event_bus import DELIVERED, PASTE_FAILED, QUEUE_DEPTH, get_bus
+    from .keyboard import send_hotkey
+    from .keyword_pipeline import execute_ops, execute_typed_texts, get_compiled_rules
+except ImportError:
+    from clock import track_latency
+    from event_bus import DELIVERED, PASTE_FAILED, QUEUE_DEPTH, get_bus
+    from keyboard import send_hotkey
+    from keyword_pipeline import execute_ops, execute_typed_texts, get_compiled_rules
+
+DEFAULT_QUEUE_SIZE = 64
+# How long a submitter waits for its job before giving up (the job still runs)
+DEFAULT_WAIT_TIMEOUT_S = 30.0
+
+_STOP = object()
+# Job kinds that put input on the desktop: published as DELIVERED (and PASTE_FAILED)
+_INPUT_KINDS = ('text', 'keys', 'ops')
+
+
+class QueueFullError(RuntimeError):
+    """Raised by submit() when the queue is at capacity (the request is rejected, not blocked)."""
+
+
+class InjectionJob:
+    """One unit of work: fn(*args, **kwargs) run on the worker thread under a latency report."""
+
+    def __init__(self, kind, fn, args=(), kwargs=None):
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.started_at = None
+        self.report = None
+        self.batch_size = 1
+
+    @property
+    def queue_wait_s(self):
+        if self.started_at is None:
+            return time.perf_counter() - self.enqueued_at
+        return self.started_at - self.enqueued_at
+
+    def result(self, timeout=DEFAULT_WAIT_TIMEOUT_S):
+        """Block until the job ran; re-raises its exception, concurrent.futures.TimeoutError on timeout."""
+        return self.future.result(timeout)
+
+    def latency(self):
+        """Latency report of the run (see clock.LatencyReport) plus time spent queued."""
+        d = self.report.to_dict() if self.report is not None else {}
+        d['queue_ms'] = round(self.queue_wait_s * 1000, 3)
+        if self.batch_size > 1:
+            d['batch_size'] = self.batch_size
+        return d
+
+
+class InjectionWorker:
+    """
+    Bounded FIFO consumed by one daemon thread (started on first submit).
+    coalesce_window_s / coalesce_max_batch override the config values when not None.
+    """
+
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE, coalesce_window_s=None, coalesce_max_batch=None):
+        self.maxsize = maxsize
+        self.coalesce_window_s = coalesce_window_s
+        self.coalesce_max_batch = coalesce_max_batch
+        self._queue = queue.Queue(maxsize)
+        self._held = None  # job taken while coalescing that did not fit the batch (worker thread only)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0,
+            'coalesced_batches': 0, 'pastes_saved': 0,
+        }
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='injection-worker', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        """Finish queued jobs, then stop the thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def in_worker_thread(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) and return its InjectionJob. Raises QueueFullError when full.
+        kind 'text' is coalescable: fn must take a list of texts as its only positional argument.
+        """
+        job = InjectionJob(kind, fn, args, kwargs)
+        self.start()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise QueueFullError(f"Injection queue full ({self.maxsize} pending)")
+        with self._lock:
+            self._stats['submitted'] += 1
+        get_bus().publish(QUEUE_DEPTH, self._queue.qsize())
+        return job
+
+    def submit_text(self, text, use_ctrl_v=None, preserve_clipboard=None):
+        return self.submit('text', execute_typed_texts, [text],
+                           use_ctrl_v=use_ctrl_v, preserve_clipboard=preserve_clipboard)
+
+    def submit_hotkey(self, keys):
+        return self.submit('keys', send_hotkey, list(keys))
+
+    def submit_ops(self, ops, use_ctrl_v=None, preserve_clipboard=None):
+        """Validated batch operations as one job; its result is the per-op result list."""
+        return self.submit('ops', execute_ops, ops, use_ctrl_v=use_ctrl_v, preserve_clipboard=preserve_clipboard)
+
+    def run(self, kind, fn, *args, **kwargs):
+        """Submit and wait. Called from the worker thread itself, runs inline (waiting would deadlock)."""
+        if self.in_worker_thread():
+            return fn(*args, **kwargs)
+        return self.submit(kind, fn, *args, **kwargs).result()
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is _STOP:
+                break
+            self._execute(self._collect_batch(job))
+
+    def _next_job(self, timeout=None):
+        """Held job first, then the queue. timeout=None blocks; <= 0 does not wait (queue.Empty)."""
+        if self._held is not None:
+            job, self._held = self._held, None
+            return job
+        if timeout is None:
+            return self._queue.get()
+        if timeout <= 0:
+            return self._queue.get_nowait()
+        return self._queue.get(timeout=timeout)
+
+    def _coalesce_settings(self):
+        window_s, max_batch = self.coalesce_window_s, self.coalesce_max_batch
+        if window_s is None or max_batch is None:
+            compiled = get_compiled_rules()
+            if window_s is None:
+                window_s = compiled.coalesce_window_s
+            if max_batch is None:
+                max_batch = compiled.coalesce_max_batch
+        return window_s, max_batch
+
+    def _collect_batch(self, first):
+        """first plus the text jobs directly behind it with the same paste settings."""
+        if first.kind != 'text':
+            return [first]
+        window_s, max_batch = self._coalesce_settings()
+        batch = [first]
+        deadline = time.perf_counter() + window_s
+        while len(batch) < max_batch:
+            try:
+                job = self._next_job(deadline - time.perf_counter())
+            except queue.Empty:
+                break
+            if job is _STOP or job.kind != 'text' or job.fn is not first.fn or job.kwargs != first.kwargs:
+                # Put it back in front: it runs next, after this batch
+                self._held = job
+                break
+            batch.append(job)
+        return batch
+
+    def _execute(self, batch):
+        batch = [job for job in batch if job.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        first = batch[0]
+        args = first.args
+        if len(batch) > 1:
+            args = ([text for job in batch for text in job.args[0]],)
+        started = time.perf_counter()
+        for job in batch:
+            job.started_at = started
+        error = None
+        result = None
+        with track_latency(first.kind) as report:
+            try:
+                result = first.fn(*args, **first.kwargs)
+            except Exception as e:
+                print(f"Injection job '{first.kind}' failed: {e}")
+                error = e
+        for job in batch:
+            job.report = report
+            job.batch_size = len(batch)
+        with self._lock:
+            self._stats['failed' if error is not None else 'completed'] += len(batch)
+            if len(batch) > 1:
+                self._stats['coalesced_batches'] += 1
+                self._stats['pastes_saved'] += len(batch) - 1
+        bus = get_bus()
+        bus.publish(QUEUE_DEPTH, self._queue.qsize())
+        if first.kind in _INPUT_KINDS:
+            failed = error is not None or _failed_result(result)
+            bus.publish(DELIVERED, {'kind': first.kind, 'success': not failed, 'jobs': len(batch),
+                                    'elapsed_ms': round((report.total or 0.0) * 1000, 3)}, force=True)
+            if failed:
+                bus.publish(PASTE_FAILED, {'kind': first.kind, 'error': str(error) if error is not None else None},
+                            force=True)
+        for job in batch:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pending'] = self._queue.qsize()
+        stats['maxsize'] = self.maxsize
+        return stats
+
+
+def _failed_result(result):
+    """True for a job that ran but reported failure (False, or a failed op in a batch)."""
+    if isinstance(result, list):
+        return not all(r.get('success') for r in result)
+    return result is False
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """Process-wide injection worker."""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = InjectionWorker()
+    return _worker
+
+
+def set_worker(worker):
+    """Replace the process-wide worker; returns the previous one."""
+    global _worker
+    with _worker_lock:
+        previous = _worker
+        _worker = worker
+    return previous
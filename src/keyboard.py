@@ -1,17 +1,41 @@
 """Keyboard input module"""
+import threading
 import time
-import pyautogui
+import unicodedata
 
 try:
-    from .utils import IS_WINDOWS, VK_SHIFT, VK_INSERT, KEYEVENTF_EXTENDEDKEY, KEYEVENTF_KEYUP, KEYEVENTF_SCANCODE, MAPVK_VK_TO_VSC
-    from .clipboard import clipboard_get, clipboard_set
+    from .utils import IS_WINDOWS, VK_INSERT
+    from .chord_engine import VIRTUAL_KEYS, get_chord_engine
+    from .clipboard_restore import get_restorer
+    from .injection_backend import get_backend
 except ImportError:
-    from utils import IS_WINDOWS, VK_SHIFT, VK_INSERT, KEYEVENTF_EXTENDEDKEY, KEYEVENTF_KEYUP, KEYEVENTF_SCANCODE, MAPVK_VK_TO_VSC
-    from clipboard import clipboard_get, clipboard_set
+    from utils import IS_WINDOWS, VK_INSERT
+    from chord_engine import VIRTUAL_KEYS, get_chord_engine
+    from clipboard_restore import get_restorer
+    from injection_backend import get_backend
 
 if IS_WINDOWS:
     import ctypes
 
+# Wait after setting the clipboard before sending the paste chord. Upper bound: ends as
+# soon as the write is visible to other clients, where the backend can observe that
+PASTE_SETTLE_S = 0.1
+# Wait after the paste chord before restoring a preserved clipboard (deferred, off the
+# request path). Upper bound: ends once the target has read the clipboard, where observable
+RESTORE_SETTLE_S = 0.15
+
+# Poll interval of watch_paste_consumed()
+CONSUMED_POLL_S = 0.002
+# When the paste target's X client is unknown, a read counts as the target's only this long
+# after the chord: clipboard managers read the clipboard as soon as it changes hands
+CONSUMED_FLOOR_S = 0.05
+
+# Text commit (type straight into the focused window instead of pasting):
+#   'paste' always paste, 'type' always type, 'auto' type messages up to commit_threshold chars
+COMMIT_MODES = ('paste', 'type', 'auto')
+DEFAULT_COMMIT_MODE = 'paste'
+DEFAULT_COMMIT_THRESHOLD = 30
+
 
 def ensure_insert_mode_reset():
     """Ensure insert mode is reset (not overwrite mode)"""
@@ -19,259 +43,122 @@ def ensure_insert_mode_reset():
         return
     
     try:
-        user32 = ctypes.windll.user32
-        insert_state = user32.GetKeyState(VK_INSERT)
-        
+        insert_state = ctypes.windll.user32.GetKeyState(VK_INSERT)
+
         # Low bit is 1 means overwrite mode is active
         if insert_state & 0x0001:
-            insert_scan = user32.MapVirtualKeyW(VK_INSERT, MAPVK_VK_TO_VSC)
             # Press Insert once to switch back to insert mode
-            user32.keybd_event(VK_INSERT, insert_scan, KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY, 0)
-            time.sleep(0.01)
-            user32.keybd_event(VK_INSERT, insert_scan, KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY | KEYEVENTF_KEYUP, 0)
+            get_chord_engine().send(['insert'])
             print("Detected overwrite mode, reset to insert mode")
     except Exception as e:
         print(f"Check Insert state failed: {e}")
 
 
-def send_shift_insert_windows():
-    """Send Shift+Insert combo using Windows API (using scan codes, compatible with terminals)"""
-    if not IS_WINDOWS:
-        return False
-
-    user32 = None
-    shift_scan = None
-    insert_scan = None
-    shift_pressed = False
-    insert_pressed = False
-
-    try:
-        user32 = ctypes.windll.user32
-
-        # Get scan codes (must use scan codes for terminal apps like CMD/PowerShell)
-        shift_scan = user32.MapVirtualKeyW(VK_SHIFT, MAPVK_VK_TO_VSC)
-        insert_scan = user32.MapVirtualKeyW(VK_INSERT, MAPVK_VK_TO_VSC)
-
-        # Press Shift (using scan code)
-        user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE, 0)
-        shift_pressed = True
-        time.sleep(0.05)
-
-        # Press Insert (using scan code + extended key flag)
-        user32.keybd_event(VK_INSERT, insert_scan, KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY, 0)
-        insert_pressed = True
-        time.sleep(0.02)
-
-        # Release Insert (using scan code + extended key flag)
-        user32.keybd_event(VK_INSERT, insert_scan, KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY | KEYEVENTF_KEYUP, 0)
-        insert_pressed = False
-        time.sleep(0.02)
-
-        # Release Shift (using scan code)
-        user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        shift_pressed = False
-
-        return True
-        
-    except Exception as e:
-        print(f"Windows API error: {e}")
-        return False
-        
-    finally:
-        # Use finally to ensure cleanup always executes
-        if user32 and shift_scan is not None and insert_scan is not None:
-            try:
-                # Force release all possibly pressed keys
-                if insert_pressed:
-                    user32.keybd_event(VK_INSERT, insert_scan, KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY | KEYEVENTF_KEYUP, 0)
-                    time.sleep(0.02)
-                if shift_pressed:
-                    user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-                    time.sleep(0.02)
-            except Exception as cleanup_error:
-                print(f"Error during key cleanup: {cleanup_error}")
-
-
-def send_ctrl_v_windows():
-    """Send Ctrl+V combo using Windows API"""
-    if not IS_WINDOWS:
-        return False
-
+def send_chord_windows(keys):
+    """
+    Send a chord through the Win32 chord engine (scan codes, one SendInput batch).
+    Returns None when there is no fast path for these keys (caller falls back).
+    """
+    engine = get_chord_engine()
+    if engine is None:
+        return None
+    keys = ['enter' if k == 'return' else k for k in keys]
+    if not engine.supports(keys):
+        return None
     try:
-        user32 = ctypes.windll.user32
-        VK_CONTROL = 0x11
-        VK_V = 0x56
-        
-        ctrl_scan = user32.MapVirtualKeyW(VK_CONTROL, MAPVK_VK_TO_VSC)
-        v_scan = user32.MapVirtualKeyW(VK_V, MAPVK_VK_TO_VSC)
-        
-        # Press Ctrl
-        user32.keybd_event(VK_CONTROL, ctrl_scan, KEYEVENTF_SCANCODE, 0)
-        time.sleep(0.05)
-        
-        # Press V
-        user32.keybd_event(VK_V, v_scan, KEYEVENTF_SCANCODE, 0)
-        time.sleep(0.02)
-        
-        # Release V
-        user32.keybd_event(VK_V, v_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        time.sleep(0.02)
-        
-        # Release Ctrl
-        user32.keybd_event(VK_CONTROL, ctrl_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        
-        return True
+        return engine.send(keys)
     except Exception as e:
-        print(f"Ctrl+V error: {e}")
+        print(f"Windows API error for {'+'.join(keys)}: {e}")
         return False
 
 
-def send_ctrl_z_windows():
-    """Send Ctrl+Z using Windows API"""
-    if not IS_WINDOWS:
-        return False
+def send_paste_hotkey(use_ctrl_v=False):
+    """Send only the paste shortcut (Ctrl+V or Shift+Insert); does not touch clipboard."""
     try:
-        user32 = ctypes.windll.user32
-        VK_CONTROL = 0x11
-        VK_Z = 0x5A
-        ctrl_scan = user32.MapVirtualKeyW(VK_CONTROL, MAPVK_VK_TO_VSC)
-        z_scan = user32.MapVirtualKeyW(VK_Z, MAPVK_VK_TO_VSC)
-        
-        # Press Ctrl
-        user32.keybd_event(VK_CONTROL, ctrl_scan, KEYEVENTF_SCANCODE, 0)
-        time.sleep(0.02)
-        # Press Z
-        user32.keybd_event(VK_Z, z_scan, KEYEVENTF_SCANCODE, 0)
-        time.sleep(0.02)
-        # Release Z
-        user32.keybd_event(VK_Z, z_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        time.sleep(0.02)
-        # Release Ctrl
-        user32.keybd_event(VK_CONTROL, ctrl_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        return True
+        return bool(get_backend().chord(paste_hotkey_keys(use_ctrl_v)))
     except Exception as e:
-        print(f"Windows API error for Ctrl+Z: {e}")
+        print(f"send_paste_hotkey failed: {e}")
         return False
 
 
-def send_enter_windows():
-    """Send Enter key using Windows API"""
-    if not IS_WINDOWS:
-        return False
-    try:
-        user32 = ctypes.windll.user32
-        VK_RETURN = 0x0D
-        return_scan = user32.MapVirtualKeyW(VK_RETURN, MAPVK_VK_TO_VSC)
-        # Press Enter
-        user32.keybd_event(VK_RETURN, return_scan, KEYEVENTF_SCANCODE, 0)
-        time.sleep(0.02)
-        # Release Enter
-        user32.keybd_event(VK_RETURN, return_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        return True
-    except Exception as e:
-        print(f"Windows API error for Enter: {e}")
-        return False
-
+def paste_hotkey_keys(use_ctrl_v=False):
+    """Key tokens of the configured paste shortcut."""
+    return ['ctrl', 'v'] if use_ctrl_v else ['shift', 'insert']
 
-def send_shift_enter_windows():
-    """Send Shift+Enter combo using Windows API"""
-    if not IS_WINDOWS:
-        return False
 
-    user32 = None
-    shift_scan = None
-    return_scan = None
-    shift_pressed = False
-    enter_pressed = False
+def set_clipboard_for_paste(text, settle_s=PASTE_SETTLE_S):
+    """Write text to the clipboard and wait (settle_s at most) until other clients can see it."""
+    backend = get_backend()
+    before = backend.clipboard_write_seq()
+    backend.clipboard_set(text)
+    visible = None
+    if before is not None:
+        visible = lambda: backend.clipboard_write_seq() != before
+    backend.wait_for('clipboard_visible', visible, settle_s)
 
-    try:
-        user32 = ctypes.windll.user32
-        VK_RETURN = 0x0D
-        shift_scan = user32.MapVirtualKeyW(VK_SHIFT, MAPVK_VK_TO_VSC)
-        return_scan = user32.MapVirtualKeyW(VK_RETURN, MAPVK_VK_TO_VSC)
 
-        user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE, 0)
-        shift_pressed = True
-        time.sleep(0.02)
+def paste_consumed_probe(on_consumed=None):
+    """
+    Call right before the paste chord. Returns a predicate that turns true once the paste
+    target (the focused window's client) has read the clipboard, or None when the backend
+    cannot observe reads. Reads by other clients (clipboard managers) do not count; when
+    the target's client is unknown, any read counts but not before CONSUMED_FLOOR_S.
+    on_consumed(seconds since the probe was made) is called the first time a read by the
+    target makes it true, never for unattributed reads.
+    """
+    backend = get_backend()
+    client = backend.clipboard_reader()
+    before = backend.clipboard_read_seq(client)
+    if before is None:
+        return None
+    started = time.perf_counter()
+    seen = []
+
+    def consumed():
+        if seen:
+            return True
+        if backend.clipboard_read_seq(client) == before:
+            return False
+        elapsed = time.perf_counter() - started
+        if client is None:
+            if elapsed < CONSUMED_FLOOR_S:
+                return False
+        elif on_consumed is not None:
+            on_consumed(elapsed)
+        seen.append(True)
+        return True
+    return consumed
 
-        user32.keybd_event(VK_RETURN, return_scan, KEYEVENTF_SCANCODE, 0)
-        enter_pressed = True
-        time.sleep(0.02)
 
-        user32.keybd_event(VK_RETURN, return_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        enter_pressed = False
-        time.sleep(0.02)
+def watch_paste_consumed(consumed, timeout_s=RESTORE_SETTLE_S):
+    """
+    Poll a paste_consumed_probe() predicate on a daemon thread until it turns true or
+    timeout_s passes, so its on_consumed callback fires when nothing else waits on it.
+    """
+    if consumed is None:
+        return
 
-        user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        shift_pressed = False
-        return True
-    except Exception as e:
-        print(f"Windows API error for Shift+Enter: {e}")
-        return False
-    finally:
-        if user32 and shift_scan is not None and return_scan is not None:
-            try:
-                if enter_pressed:
-                    user32.keybd_event(VK_RETURN, return_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-                    time.sleep(0.02)
-                if shift_pressed:
-                    user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-                    time.sleep(0.02)
-            except Exception as cleanup_error:
-                print(f"Error during key cleanup: {cleanup_error}")
-
-
-def send_backspace_windows():
-    """Send Backspace key using Windows API"""
-    if not IS_WINDOWS:
-        return False
-    try:
-        user32 = ctypes.windll.user32
-        VK_BACK = 0x08
-        backspace_scan = user32.MapVirtualKeyW(VK_BACK, MAPVK_VK_TO_VSC)
-        # Press Backspace
-        user32.keybd_event(VK_BACK, backspace_scan, KEYEVENTF_SCANCODE, 0)
-        time.sleep(0.02)
-        # Release Backspace
-        user32.keybd_event(VK_BACK, backspace_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        return True
-    except Exception as e:
-        print(f"Windows API error for Backspace: {e}")
-        return False
+    def poll():
+        deadline = time.monotonic() + timeout_s
+        while not consumed() and time.monotonic() < deadline:
+            time.sleep(CONSUMED_POLL_S)
+    threading.Thread(target=poll, name='paste-consumed-watch', daemon=True).start()
 
 
-def send_paste_hotkey(use_ctrl_v=False):
-    """Send only the paste shortcut (Ctrl+V or Shift+Insert); does not touch clipboard."""
-    if IS_WINDOWS:
-        if use_ctrl_v:
-            return bool(send_ctrl_v_windows())
-        ok = send_shift_insert_windows()
-        ensure_insert_mode_reset()
-        return bool(ok)
-    if use_ctrl_v:
-        pyautogui.hotkey('ctrl', 'v')
-    else:
-        pyautogui.hotkey('shift', 'insert')
-    return True
-
-
-def paste_literal_fragment(text, use_ctrl_v=False):
-    """Set clipboard to fragment, send paste hotkey. Caller restores staged clipboard after."""
-    clipboard_set(text)
-    time.sleep(0.1)
+def paste_literal_fragment(text, use_ctrl_v=False, settle_s=PASTE_SETTLE_S, on_consumed=None):
+    """
+    Set clipboard to fragment, send paste hotkey. Caller restores staged clipboard after.
+    Returns the paste_consumed_probe() predicate for this paste (None if unobservable).
+    """
+    set_clipboard_for_paste(text, settle_s)
+    consumed = paste_consumed_probe(on_consumed)
     send_paste_hotkey(use_ctrl_v=use_ctrl_v)
+    return consumed
 
 
-# Allowed token names for send_hotkey (lowercase after normalize)
-HOTKEY_KEY_WHITELIST = frozenset({
-    'ctrl', 'shift', 'alt', 'win',
-    'enter', 'return', 'tab', 'backspace', 'insert', 'delete', 'escape', 'space',
-    'up', 'down', 'left', 'right', 'home', 'end', 'pageup', 'pagedown',
-    'v', 'c', 'x', 'z', 'a', 'b', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm',
-    'n', 'o', 'p', 'q', 'r', 's', 't', 'u', 'w', 'y',
-    '0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
-    'f1', 'f2', 'f3', 'f4', 'f5', 'f6', 'f7', 'f8', 'f9', 'f10', 'f11', 'f12',
-})
+# Allowed token names for send_hotkey (lowercase after normalize): every key the chord
+# engine has a scan code for (letters, digits, F1-F24, navigation, punctuation, numpad)
+HOTKEY_KEY_WHITELIST = frozenset(VIRTUAL_KEYS) | {'return'}
 
 
 def _normalize_hotkey_token(name):
@@ -281,17 +168,6 @@ def _normalize_hotkey_token(name):
     return n
 
 
-def _pyautogui_hotkey_names(keys):
-    """Map whitelist tokens to pyautogui key names."""
-    out = []
-    for k in keys:
-        if k == 'win':
-            out.append('winleft')
-        else:
-            out.append(k)
-    return out
-
-
 def send_hotkey(keys):
     """
     Send a combo from a whitelist-validated list of key names (lowercase).
@@ -305,67 +181,64 @@ def send_hotkey(keys):
             print(f"send_hotkey: disallowed key '{k}'")
             return False
 
-    # Optimized Windows paths for common shortcuts
-    if IS_WINDOWS and len(normalized) == 2:
-        a, b = normalized[0], normalized[1]
-        if a == 'ctrl' and b == 'v':
-            return bool(send_ctrl_v_windows())
-        if a == 'ctrl' and b == 'z':
-            return bool(send_ctrl_z_windows())
-        if a == 'shift' and b == 'insert':
-            ok = send_shift_insert_windows()
-            ensure_insert_mode_reset()
-            return bool(ok)
-        if a == 'shift' and b in ('enter', 'return'):
-            return bool(send_shift_enter_windows())
-
-    if IS_WINDOWS and len(normalized) == 1:
-        k = normalized[0]
-        if k in ('enter', 'return'):
-            return bool(send_enter_windows())
-        if k == 'backspace':
-            return bool(send_backspace_windows())
-
     try:
-        pg_keys = _pyautogui_hotkey_names(normalized)
-        pyautogui.hotkey(*pg_keys)
-        if IS_WINDOWS and 'insert' in normalized:
-            ensure_insert_mode_reset()
-        return True
+        return bool(get_backend().chord(normalized))
     except Exception as e:
         print(f"send_hotkey failed: {e}")
         return False
 
 
-def paste_text(text, use_ctrl_v=False, preserve_clipboard=False):
-    """Copy to clipboard and paste"""
-    # If clipboard protection enabled, save original content
-    clipboard_saved = False
-    original_clipboard = None
-    if preserve_clipboard:
+def can_commit_text(text):
+    """Typable without the clipboard: no control characters (a typed newline would press Enter)."""
+    return bool(text) and not any(unicodedata.category(ch) == 'Cc' for ch in text)
+
+
+def choose_commit(text, commit_mode=DEFAULT_COMMIT_MODE, commit_threshold=DEFAULT_COMMIT_THRESHOLD):
+    """Whether a message should be typed (True) or pasted (False)."""
+    if commit_mode == 'type':
+        return can_commit_text(text)
+    if commit_mode == 'auto':
+        return len(text) <= commit_threshold and can_commit_text(text)
+    return False
+
+
+def commit_text(text):
+    """Type text into the focused window via the backend. False if it cannot (caller pastes instead)."""
+    try:
+        return bool(get_backend().commit_text(text))
+    except Exception as e:
+        print(f"commit_text failed: {e}")
+        return False
+
+
+def paste_text(text, use_ctrl_v=False, preserve_clipboard=False,
+               commit_mode=DEFAULT_COMMIT_MODE, commit_threshold=DEFAULT_COMMIT_THRESHOLD,
+               paste_settle_s=PASTE_SETTLE_S, restore_settle_s=RESTORE_SETTLE_S, on_consumed=None):
+    """
+    Copy to clipboard and paste (or type it directly, per commit_mode).
+    Settle times are upper bounds (per-app profiles pass their own); on_consumed is
+    called with the measured chord -> clipboard-read time where that is observable.
+    """
+    if choose_commit(text, commit_mode, commit_threshold) and commit_text(text):
+        return
+    restorer = get_restorer()
+    # If clipboard protection enabled (or a burst is still waiting for its restore),
+    # capture the original content once per burst
+    guarded = preserve_clipboard or restorer.pending
+    if guarded:
         try:
-            original_clipboard = clipboard_get()
-            clipboard_saved = True
+            original_clipboard = restorer.capture()
             print(f"[Clipboard] Saved original content (length: {len(original_clipboard) if original_clipboard else 0})")
         except Exception as e:
+            guarded = False
             print(f"[Clipboard] Failed to save: {e}")
     
-    # Copy text to clipboard
-    clipboard_set(text)
-    time.sleep(0.1)
+    # Copy text to clipboard and paste it
+    consumed = paste_literal_fragment(text, use_ctrl_v=use_ctrl_v, settle_s=paste_settle_s,
+                                      on_consumed=on_consumed)
     
-    send_paste_hotkey(use_ctrl_v=use_ctrl_v)
-    
-    # If clipboard protection enabled, restore original content (increase wait time)
-    if preserve_clipboard and clipboard_saved:
-        time.sleep(0.15)  # Increase wait time to 150ms to ensure paste completes
-        try:
-            if original_clipboard is not None:
-                clipboard_set(original_clipboard)
-            else:
-                # If original content is None, clear clipboard
-                clipboard_set('')
-            print(f"[Clipboard] Restored original content")
-        except Exception as e:
-            print(f"[Clipboard] Failed to restore: {e}")
-
+    # Restore once the last paste of the burst has been read (or settled), on a background timer
+    if guarded:
+        restorer.schedule(restore_settle_s, ready=consumed)
+    elif on_consumed is not None:
+        watch_paste_consumed(consumed, restore_settle_s)
@@ -1,43 +1,53 @@
 """Keyword-triggered hotkey pipeline for typed remote text."""
-import time
+import threading
 import unicodedata
-import pyautogui
 
 try:
-    from .config import load_config
-    from .clipboard import clipboard_get, clipboard_set
-    from .utils import IS_WINDOWS
+    from .app_profiles import get_app_profiles, profiles_from_config
+    from .config import load_config, get_config_version
+    from .clipboard_restore import get_restorer
+    from .clock import get_clock
+    from .injection_backend import get_backend
+    from .injection_plan import FINAL_RESTORE_SETTLE_S, compile_plan, rule_keys
     from .keyboard import (
+        COMMIT_MODES,
+        DEFAULT_COMMIT_MODE,
+        DEFAULT_COMMIT_THRESHOLD,
         HOTKEY_KEY_WHITELIST,
+        commit_text,
         paste_text,
         paste_literal_fragment,
         send_paste_hotkey,
         send_hotkey,
-        send_shift_enter_windows,
-        send_enter_windows,
-        send_backspace_windows,
-        send_ctrl_z_windows,
+        watch_paste_consumed,
     )
 except ImportError:
-    from config import load_config
-    from clipboard import clipboard_get, clipboard_set
-    from utils import IS_WINDOWS
+    from app_profiles import get_app_profiles, profiles_from_config
+    from config import load_config, get_config_version
+    from clipboard_restore import get_restorer
+    from clock import get_clock
+    from injection_backend import get_backend
+    from injection_plan import FINAL_RESTORE_SETTLE_S, compile_plan, rule_keys
     from keyboard import (
+        COMMIT_MODES,
+        DEFAULT_COMMIT_MODE,
+        DEFAULT_COMMIT_THRESHOLD,
         HOTKEY_KEY_WHITELIST,
+        commit_text,
         paste_text,
         paste_literal_fragment,
         send_paste_hotkey,
         send_hotkey,
-        send_shift_enter_windows,
-        send_enter_windows,
-        send_backspace_windows,
-        send_ctrl_z_windows,
+        watch_paste_consumed,
     )
 
 # Predefined action names (alias path)
 _ACTION_NAMES = frozenset({'paste', 'shift_enter', 'enter', 'backspace', 'undo'})
 
-_SEGMENT_DELAY_S = 0.03
+# Batch operations (/ops): text, the key actions, and hotkey with explicit keys
+BATCH_OP_NAMES = frozenset({'text', 'enter', 'shift_enter', 'backspace', 'undo', 'hotkey'})
+MAX_BATCH_OPS = 100
+MAX_OP_REPEAT = 100
 
 
 def _is_strippable_punct_char(ch):
@@ -147,11 +157,133 @@ def validate_keyword_actions(raw_list):
     return out
 
 
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over rule keywords.
+    Built once per rule list; scanning costs O(len(text) + matches) regardless of rule count.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules or [])
+        # Node 0 is the root. Per node: goto edges, failure link,
+        # dictionary-suffix link (nearest failure ancestor ending a keyword), terminal rule.
+        self._goto = [{}]
+        self._fail = [0]
+        self._dict = [0]
+        self._rule = [None]
+        self._depth = [0]
+        for r in self.rules:
+            kw = r.get('keyword') or ''
+            if kw:
+                self._insert(kw, r)
+        self._build_links()
+
+    def __len__(self):
+        return sum(1 for r in self._rule if r is not None)
+
+    def _insert(self, kw, rule):
+        node = 0
+        for ch in kw:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._dict.append(0)
+                self._rule.append(None)
+                self._depth.append(self._depth[node] + 1)
+                self._goto[node][ch] = nxt
+            node = nxt
+        # First rule wins for duplicate keywords (same as the linear scan)
+        if self._rule[node] is None:
+            self._rule[node] = rule
+
+    def _build_links(self):
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fc = self._goto[f].get(ch, 0)
+                self._fail[child] = fc
+                self._dict[child] = fc if self._rule[fc] is not None else self._dict[fc]
+                queue.append(child)
+
+    def longest_matches(self, text):
+        """Return {start_index: terminal_node} holding the longest keyword starting at each index."""
+        goto = self._goto
+        fail = self._fail
+        dict_link = self._dict
+        rule = self._rule
+        depth = self._depth
+        best = {}
+        node = 0
+        for j, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            out = node if rule[node] is not None else dict_link[node]
+            while out:
+                start = j - depth[out] + 1
+                prev = best.get(start)
+                if prev is None or depth[out] > depth[prev]:
+                    best[start] = out
+                out = dict_link[out]
+        return best
+
+    def parse(self, text):
+        """Leftmost-longest, non-overlapping segmentation (see parse_segments)."""
+        if not text:
+            return []
+        best = self.longest_matches(text)
+        if not best:
+            return [{'type': 'literal', 'text': text}]
+        rule = self._rule
+        depth = self._depth
+        n = len(text)
+        segments = []
+        literal_start = 0
+        i = 0
+        for start in sorted(best):
+            if start < i:
+                continue
+            node = best[start]
+            if start > literal_start:
+                segments.append({'type': 'literal', 'text': text[literal_start:start]})
+            segments.append({'type': 'keyword', 'rule': rule[node]})
+            i = start + depth[node]
+            literal_start = i
+        if literal_start < n:
+            segments.append({'type': 'literal', 'text': text[literal_start:n]})
+        return segments
+
+
+def compile_keyword_matcher(rules):
+    """Compile validated rules into a KeywordMatcher."""
+    return KeywordMatcher(rules)
+
+
 def parse_segments(text, rules):
     """
     Split text into segments: {'type': 'literal', 'text': str} or {'type': 'keyword', 'rule': dict}.
     Longest keyword match at each position.
+    rules may be a rule list or a precompiled KeywordMatcher.
     """
+    if text is None:
+        return []
+    if isinstance(rules, KeywordMatcher):
+        return rules.parse(text)
+    if not rules:
+        return [{'type': 'literal', 'text': text}] if text else []
+    return KeywordMatcher(rules).parse(text)
+
+
+def _parse_segments_linear(text, rules):
+    """Reference implementation: try every rule at every position. O(len(text) * len(rules))."""
     if text is None:
         return []
     if not rules:
@@ -186,41 +318,129 @@ def parse_segments(text, rules):
     return segments
 
 
+# Burst coalescing defaults: 0 ms window merges only payloads already queued
+DEFAULT_COALESCE_WINDOW_MS = 0
+DEFAULT_COALESCE_MAX_BATCH = 8
+
+
+def _coalesce_settings(cfg):
+    """(window_s, max_batch) from config, falling back to defaults on bad values."""
+    try:
+        window_ms = max(0.0, float(cfg.get('coalesce_window_ms', DEFAULT_COALESCE_WINDOW_MS)))
+    except (TypeError, ValueError):
+        window_ms = DEFAULT_COALESCE_WINDOW_MS
+    try:
+        max_batch = max(1, int(cfg.get('coalesce_max_batch', DEFAULT_COALESCE_MAX_BATCH)))
+    except (TypeError, ValueError):
+        max_batch = DEFAULT_COALESCE_MAX_BATCH
+    return window_ms / 1000.0, max_batch
+
+
+def _commit_settings(cfg):
+    """(commit_mode, commit_threshold) from config, falling back to defaults on bad values."""
+    mode = cfg.get('commit_mode', DEFAULT_COMMIT_MODE)
+    if mode not in COMMIT_MODES:
+        mode = DEFAULT_COMMIT_MODE
+    try:
+        threshold = max(0, int(cfg.get('commit_threshold', DEFAULT_COMMIT_THRESHOLD)))
+    except (TypeError, ValueError):
+        threshold = DEFAULT_COMMIT_THRESHOLD
+    return mode, threshold
+
+
+class CompiledRuleSet:
+    """Validated keyword rules, their matcher and paste settings from one config snapshot."""
+
+    def __init__(self, cfg, version=None):
+        cfg = cfg or {}
+        self.version = version
+        self.rules = validate_keyword_actions(cfg.get('keyword_actions', []))
+        self.matcher = compile_keyword_matcher(self.rules)
+        self.strip_punctuation = bool(cfg.get('strip_punctuation_around_keywords', False))
+        self.use_ctrl_v = bool(cfg.get('use_ctrl_v', False))
+        self.preserve_clipboard = bool(cfg.get('preserve_clipboard', False))
+        self.coalesce_window_s, self.coalesce_max_batch = _coalesce_settings(cfg)
+        self.commit_mode, self.commit_threshold = _commit_settings(cfg)
+        self.app_profiles = profiles_from_config(cfg)
+        self.app_profile_learning = bool(cfg.get('app_profile_learning', True))
+
+    def segments(self, text):
+        segments = parse_segments(text, self.matcher)
+        if self.strip_punctuation:
+            segments = strip_punctuation_around_keyword_segments(segments, True)
+        return segments
+
+
+class RuleSetCache:
+    """
+    Process-wide CompiledRuleSet, rebuilt only when the config version changes.
+    A hit costs one integer comparison: no disk I/O, no validation.
+    """
+
+    def __init__(self, loader=load_config, version_fn=get_config_version):
+        self._loader = loader
+        self._version_fn = version_fn
+        self._lock = threading.Lock()
+        self._compiled = None
+        self.hits = 0
+        self.rebuilds = 0
+
+    def get(self):
+        version = self._version_fn()
+        compiled = self._compiled
+        if compiled is not None and compiled.version == version:
+            self.hits += 1
+            return compiled
+        with self._lock:
+            compiled = self._compiled
+            if compiled is None or compiled.version != version:
+                compiled = CompiledRuleSet(self._loader(), version)
+                self._compiled = compiled
+                self.rebuilds += 1
+            else:
+                self.hits += 1
+            return compiled
+
+    def invalidate(self):
+        with self._lock:
+            self._compiled = None
+
+    def stats(self):
+        compiled = self._compiled
+        return {
+            'hits': self.hits,
+            'rebuilds': self.rebuilds,
+            'version': compiled.version if compiled is not None else None,
+            'rule_count': len(compiled.rules) if compiled is not None else 0,
+        }
+
+
+_rule_set_cache = RuleSetCache()
+
+
+def get_compiled_rules():
+    """Return the cached CompiledRuleSet for the current config version."""
+    return _rule_set_cache.get()
+
+
+def get_rule_cache_stats():
+    return _rule_set_cache.stats()
+
+
 def _restore_clipboard(content):
     try:
-        if content is None:
-            clipboard_set('')
-        else:
-            clipboard_set(content)
+        get_backend().clipboard_set('' if content is None else content)
     except Exception as e:
         print(f"[keyword_pipeline] clipboard restore failed: {e}")
 
 
 def _dispatch_action_alias(action, use_ctrl_v):
     a = (action or '').lower()
+    if a not in _ACTION_NAMES:
+        return False
     if a == 'paste':
         return bool(send_paste_hotkey(use_ctrl_v=use_ctrl_v))
-    if a == 'shift_enter':
-        if IS_WINDOWS:
-            return bool(send_shift_enter_windows())
-        pyautogui.hotkey('shift', 'enter')
-        return True
-    if a == 'enter':
-        if IS_WINDOWS:
-            return bool(send_enter_windows())
-        pyautogui.press('enter')
-        return True
-    if a == 'backspace':
-        if IS_WINDOWS:
-            return bool(send_backspace_windows())
-        pyautogui.press('backspace')
-        return True
-    if a == 'undo':
-        if IS_WINDOWS:
-            return bool(send_ctrl_z_windows())
-        pyautogui.hotkey('ctrl', 'z')
-        return True
-    return False
+    return bool(send_hotkey(rule_keys({'action': a})))
 
 
 def _dispatch_rule(rule, use_ctrl_v):
@@ -235,49 +455,228 @@ def segments_contain_keyword(segments):
     return any(s.get('type') == 'keyword' for s in segments)
 
 
-def execute_typed_text(text, use_ctrl_v=None, preserve_clipboard=None):
-    """
-    Paste full text with optional keyword expansions.
-    Returns True on success.
-    If use_ctrl_v or preserve_clipboard is None, values are read from config.json.
-    """
-    cfg = load_config()
+def _resolve_paste_settings(compiled, use_ctrl_v, preserve_clipboard):
     if use_ctrl_v is None:
-        use_ctrl_v = cfg.get('use_ctrl_v', False)
+        use_ctrl_v = compiled.use_ctrl_v
     if preserve_clipboard is None:
-        preserve_clipboard = cfg.get('preserve_clipboard', False)
+        preserve_clipboard = compiled.preserve_clipboard
+    return use_ctrl_v, preserve_clipboard
 
-    rules = validate_keyword_actions(cfg.get('keyword_actions', []))
-    segments = parse_segments(text, rules)
-    if cfg.get('strip_punctuation_around_keywords', False):
-        segments = strip_punctuation_around_keyword_segments(segments, True)
 
-    if not segments_contain_keyword(segments):
-        paste_text(text, use_ctrl_v=use_ctrl_v, preserve_clipboard=preserve_clipboard)
-        return True
+def resolve_app_settings(compiled, use_ctrl_v=None, preserve_clipboard=None):
+    """
+    (PasteSettings, preserve_clipboard) for the focused app: its profile (and learned
+    timings) override the paste method, commit mode and settle times of the config snapshot.
+    """
+    use_ctrl_v, preserve_clipboard = _resolve_paste_settings(compiled, use_ctrl_v, preserve_clipboard)
+    settings = get_app_profiles().resolve(compiled.app_profiles, use_ctrl_v, compiled.commit_mode,
+                                          learning=compiled.app_profile_learning)
+    return settings, preserve_clipboard
+
+
+def _compile_for(segments, compiled, settings, preserve_clipboard):
+    return compile_plan(segments, use_ctrl_v=settings.use_ctrl_v, preserve_clipboard=preserve_clipboard,
+                        commit_mode=settings.commit_mode, commit_threshold=compiled.commit_threshold,
+                        paste_settle_s=settings.paste_settle_s, restore_settle_s=settings.restore_settle_s,
+                        segment_delay_s=settings.segment_delay_s)
+
+
+def plan_typed_text(text, use_ctrl_v=None, preserve_clipboard=None):
+    """
+    Dry run: compile text into an InjectionPlan without touching keyboard or clipboard.
+    plan.to_dict() lists the ops and the predicted delay budget.
+    """
+    compiled = get_compiled_rules()
+    settings, preserve_clipboard = resolve_app_settings(compiled, use_ctrl_v, preserve_clipboard)
+    return _compile_for(compiled.segments(text), compiled, settings, preserve_clipboard)
+
+
+def _note_op(op_results, op, ok, started):
+    """Add one executed plan op to the result of the batch operation it came from."""
+    if op_results is None or 'index' not in op:
+        return
+    entry = op_results[op['index']]
+    entry['success'] = entry.get('success', True) and ok
+    elapsed_ms = (get_clock().now() - started) * 1000
+    entry['elapsed_ms'] = round(entry.get('elapsed_ms', 0.0) + elapsed_ms, 3)
 
-    staged = clipboard_get()
 
+def run_plan(plan, on_consumed=None, op_results=None):
+    """
+    Execute a compiled keyword plan. Returns True on success.
+    The staged clipboard is captured once per burst; the plan's final (deferred)
+    restore is left to the background restorer so this returns right after the last chord.
+    The gap after a paste ends early once the target has read the clipboard (where
+    observable); on_consumed receives the measured chord -> read times.
+    op_results (a list of dicts, one per batch operation) receives 'success' and
+    'elapsed_ms' for every executed op tagged with an 'index'.
+    """
+    backend = get_backend()
+    restorer = get_restorer()
+    staged = restorer.capture() if plan.needs_staged_clipboard else None
+    pasted_fallback = False
+    # Predicate for "the last paste has been read by the target" (None if unobservable)
+    consumed = None
+    previous = None
+    scheduled = False
+    clock = get_clock()
+    op = None
+    started = clock.now()
     try:
-        for seg in segments:
-            if seg['type'] == 'literal':
-                frag = seg.get('text') or ''
-                if frag:
-                    paste_literal_fragment(frag, use_ctrl_v=use_ctrl_v)
-                    _restore_clipboard(staged)
-                    time.sleep(_SEGMENT_DELAY_S)
-            else:
-                ok = _dispatch_rule(seg['rule'], use_ctrl_v)
-                if not ok:
+        for op in plan.ops:
+            kind = op['op']
+            started = clock.now()
+            if kind == 'paste':
+                consumed = paste_literal_fragment(op['text'], use_ctrl_v=plan.use_ctrl_v,
+                                                  settle_s=plan.paste_settle_s, on_consumed=on_consumed)
+            elif kind == 'commit':
+                if not commit_text(op['text']):
+                    # Backend cannot type this text: paste it, restore the clipboard afterwards
+                    restorer.capture()
+                    consumed = paste_literal_fragment(op['text'], use_ctrl_v=plan.use_ctrl_v,
+                                                      settle_s=plan.paste_settle_s, on_consumed=on_consumed)
+                    pasted_fallback = True
+                    kind = 'paste'
+            elif kind == 'rule':
+                for _ in range(op.get('count', 1)):
+                    if not _dispatch_rule(op['rule'], plan.use_ctrl_v):
+                        _note_op(op_results, op, False, started)
+                        restorer.flush()
+                        return False
+            elif kind == 'restore':
+                if op.get('deferred'):
+                    restorer.schedule(op.get('settle_s', 0.0), ready=consumed)
+                    scheduled = True
+                else:
+                    if op.get('settle_s'):
+                        backend.delay(op['settle_s'])
                     _restore_clipboard(staged)
-                    return False
-                time.sleep(_SEGMENT_DELAY_S)
-
-        if preserve_clipboard:
-            time.sleep(0.12)
-            _restore_clipboard(staged)
+            elif kind == 'delay':
+                if previous == 'paste' and consumed is not None:
+                    backend.wait_for('paste_consumed', consumed, op['seconds'])
+                else:
+                    backend.delay(op['seconds'])
+            _note_op(op_results, op, True, started)
+            previous = kind
+        if pasted_fallback:
+            restorer.schedule(FINAL_RESTORE_SETTLE_S if plan.preserve_clipboard else 0.0, ready=consumed)
+        elif not scheduled and on_consumed is not None:
+            watch_paste_consumed(consumed)
         return True
     except Exception as e:
         print(f"execute_typed_text error: {e}")
-        _restore_clipboard(staged)
+        if op is not None:
+            _note_op(op_results, op, False, started)
+        restorer.flush()
         return False
+
+
+def execute_typed_text(text, use_ctrl_v=None, preserve_clipboard=None):
+    """
+    Paste full text with optional keyword expansions.
+    Returns True on success.
+    If use_ctrl_v or preserve_clipboard is None, values come from the cached config snapshot.
+    """
+    return execute_typed_texts([text], use_ctrl_v, preserve_clipboard)
+
+
+def execute_typed_texts(texts, use_ctrl_v=None, preserve_clipboard=None):
+    """
+    Paste several payloads as one injection (burst coalescing).
+    Each text is parsed on its own, so a keyword never spans two payloads; the
+    segments are then concatenated and compiled into a single plan.
+    """
+    compiled = get_compiled_rules()
+    settings, preserve_clipboard = resolve_app_settings(compiled, use_ctrl_v, preserve_clipboard)
+
+    segments = []
+    for text in texts:
+        segments.extend(compiled.segments(text))
+
+    if not segments_contain_keyword(segments):
+        timings = {}
+        if settings.paste_settle_s is not None:
+            timings['paste_settle_s'] = settings.paste_settle_s
+        if settings.restore_settle_s is not None:
+            timings['restore_settle_s'] = settings.restore_settle_s
+        paste_text(''.join(texts), use_ctrl_v=settings.use_ctrl_v, preserve_clipboard=preserve_clipboard,
+                   commit_mode=settings.commit_mode, commit_threshold=compiled.commit_threshold,
+                   on_consumed=settings.on_consumed, **timings)
+        return True
+
+    return run_plan(_compile_for(segments, compiled, settings, preserve_clipboard), on_consumed=settings.on_consumed)
+
+
+def validate_batch_ops(raw_list):
+    """
+    Return a clean list of batch operations: {'op': 'text', 'text': str} or
+    {'op': name, 'count': int} (+ 'keys' for hotkey). Raises ValueError on the
+    first invalid entry, so a batch is either accepted whole or not at all.
+    """
+    if not isinstance(raw_list, list) or not raw_list:
+        raise ValueError("ops must be a non-empty list")
+    if len(raw_list) > MAX_BATCH_OPS:
+        raise ValueError(f"At most {MAX_BATCH_OPS} ops per batch")
+    out = []
+    for i, item in enumerate(raw_list):
+        if not isinstance(item, dict) or item.get('op') not in BATCH_OP_NAMES:
+            raise ValueError(f"op {i}: unknown operation")
+        name = item['op']
+        if name == 'text':
+            text = item.get('text')
+            if not isinstance(text, str) or not text:
+                raise ValueError(f"op {i}: text must be a non-empty string")
+            out.append({'op': 'text', 'text': text})
+            continue
+        try:
+            count = int(item.get('count', 1))
+        except (TypeError, ValueError):
+            raise ValueError(f"op {i}: count must be an integer")
+        if not 1 <= count <= MAX_OP_REPEAT:
+            raise ValueError(f"op {i}: count must be 1..{MAX_OP_REPEAT}")
+        op = {'op': name, 'count': count}
+        if name == 'hotkey':
+            keys = item.get('keys')
+            if not isinstance(keys, list) or not keys:
+                raise ValueError(f"op {i}: hotkey needs keys")
+            keys = [_normalize_key_token(k) for k in keys]
+            if any(k not in HOTKEY_KEY_WHITELIST for k in keys):
+                raise ValueError(f"op {i}: unsupported key")
+            op['keys'] = keys
+        out.append(op)
+    return out
+
+
+def batch_segments(ops, compiled):
+    """Segments for validated batch operations, each tagged with the index of its op."""
+    segments = []
+    for i, op in enumerate(ops):
+        if op['op'] == 'text':
+            for seg in compiled.segments(op['text']):
+                segments.append(dict(seg, index=i))
+            continue
+        rule = {'keys': op['keys']} if op['op'] == 'hotkey' else {'action': op['op']}
+        # A repeat count becomes one burst op (no gaps between the repeats)
+        segments.append({'type': 'keyword', 'rule': rule, 'count': op['count'], 'index': i})
+    return segments
+
+
+def execute_ops(ops, use_ctrl_v=None, preserve_clipboard=None):
+    """
+    Run validated batch operations as one plan (one clipboard capture, one deferred
+    restore). Returns one result per op: {'op', 'success', 'elapsed_ms'}; ops after
+    a failure are not run and report 'skipped'.
+    """
+    compiled = get_compiled_rules()
+    settings, preserve_clipboard = resolve_app_settings(compiled, use_ctrl_v, preserve_clipboard)
+    results = [{'op': op['op']} for op in ops]
+    plan = _compile_for(batch_segments(ops, compiled), compiled, settings, preserve_clipboard)
+    ok = run_plan(plan, on_consumed=settings.on_consumed, op_results=results)
+    for entry in results:
+        if 'success' not in entry:
+            if ok:
+                # Nothing to inject (e.g. text that was only stripped punctuation)
+                entry.update(success=True, elapsed_ms=0.0)
+            else:
+                entry.update(success=False, skipped=True)
+    return results
@@ -0,0 +1,133 @@
+"""Exactly-once, in-order application of sequenced type / batch requests.
+
+The phone page numbers its type operations per client ({client, seq, floor}, floor
+being the oldest seq it has not had acked yet) and may have several in flight or
+retry them. Requests are held until every lower seq has arrived, then submitted to
+the injection worker in seq order; a seq already applied answers with its recorded
+result instead of running again.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+try:
+    from .injection_worker import QueueFullError
+except ImportError:
+    from injection_worker import QueueFullError
+
+# Clients remembered (least recently seen dropped first)
+MAX_CLIENTS = 32
+# Results kept per client for answering retries
+RESULT_WINDOW = 256
+# Requests held per client while waiting for a lower seq
+MAX_HELD = 64
+
+
+def _done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class _ClientState:
+    def __init__(self, next_seq):
+        self.next_seq = next_seq
+        self.held = {}  # seq -> (start, future of the result dict, op kind)
+        self.results = OrderedDict()  # seq -> future of the result dict, oldest first
+
+
+class OpSequencer:
+    """result_fn(job) turns a finished injection job into the response dict."""
+
+    def __init__(self, result_fn):
+        self._result_fn = result_fn
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()
+        self._stats = {'applied': 0, 'duplicates': 0, 'reordered': 0, 'rejected': 0}
+
+    def submit(self, client, seq, floor, start, kind='type'):
+        """
+        Future of the response dict for seq. start() queues the request's injection job
+        (None when there is nothing to do) and is called at most once, in seq order.
+        kind names the operation in log messages. Responses with 'retry' mean the seq
+        was not applied.
+        """
+        with self._lock:
+            state = self._clients.get(client)
+            if state is None:
+                # First contact (or the server restarted): start at the client's oldest unacked seq
+                state = _ClientState(seq if floor is None else min(floor, seq))
+                self._clients[client] = state
+                while len(self._clients) > MAX_CLIENTS:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client)
+            if floor is not None and floor > state.next_seq:
+                # The client no longer waits for anything below floor
+                for s in [s for s in state.held if s < floor]:
+                    state.held.pop(s)[1].set_result({'success': False, 'error': 'Skipped'})
+                state.next_seq = floor
+
+            if seq in state.results:
+                self._stats['duplicates'] += 1
+                return state.results[seq]
+            if seq < state.next_seq:
+                self._stats['duplicates'] += 1
+                return _done({'success': True, 'duplicate': True})
+            if seq in state.held:
+                return state.held[seq][1]
+            if len(state.held) >= MAX_HELD and seq != state.next_seq:
+                self._stats['rejected'] += 1
+                return _done({'success': False, 'error': 'Too many requests ahead', 'retry': True})
+
+            future = Future()
+            state.held[seq] = (start, future, kind)
+            if seq != state.next_seq:
+                self._stats['reordered'] += 1
+            # Submitting under the lock keeps worker order equal to seq order across handler threads
+            while state.next_seq in state.held:
+                ready_seq = state.next_seq
+                ready_start, ready_future, ready_kind = state.held.pop(ready_seq)
+                if not self._start(ready_start, ready_future, f"{ready_kind} op seq {ready_seq}"):
+                    # Not applied: this and everything after it must be sent again
+                    for _, later_future, _ in state.held.values():
+                        later_future.set_result({'success': False, 'error': 'Injection queue full', 'retry': True})
+                    state.held.clear()
+                    break
+                state.results[ready_seq] = ready_future
+                state.next_seq += 1
+            while len(state.results) > RESULT_WINDOW:
+                state.results.popitem(last=False)
+            return future
+
+    def _start(self, start, future, label):
+        try:
+            job = start()
+        except QueueFullError:
+            self._stats['rejected'] += 1
+            future.set_result({'success': False, 'error': 'Injection queue full', 'retry': True})
+            return False
+        except Exception as e:
+            print(f"Sequenced {label} failed to start: {e}")
+            job = None
+        self._stats['applied'] += 1
+        if job is None:
+            future.set_result({'success': False})
+            return True
+
+        def on_done(_job_future):
+            try:
+                future.set_result(self._result_fn(job))
+            except Exception as e:
+                print(f"Sequenced {label} failed: {e}")
+                future.set_result({'success': False})
+
+        job.future.add_done_callback(on_done)
+        return True
+
+    def stats(self):
+        with self._lock:
+            d = dict(self._stats)
+            d['clients'] = len(self._clients)
+            d['held'] = sum(len(s.held) for s in self._clients.values())
+        return d
@@ -0,0 +1,188 @@
+"""Phone page built once at startup: split, minified, pre-compressed, cacheable.
+
+The page template has no per-request variables. Its inline <style> and <script> become
+fingerprinted assets (/assets/<hash>.css|js, cached for a year); the remaining HTML is
+revalidated on every load with its ETag, so a new build is picked up while an
+unchanged page costs one 304. Every body is compressed once (gzip; brotli too when the
+optional brotli module is installed), nothing is rendered or compressed per request.
+
+Minification is deliberately conservative and line based (indentation, blank lines,
+comments): the script relies on newlines for statement ends, so they are kept.
+"""
+import gzip
+import hashlib
+import re
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSET_PREFIX = '/assets/'
+# Fingerprinted assets never change under the same URL
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# The page itself is revalidated on every load, so new asset URLs are seen at once
+PAGE_CACHE_CONTROL = 'no-cache'
+# Smaller bodies are not worth compressing
+MIN_COMPRESS_BYTES = 256
+
+_RE_STYLE = re.compile(r'<style>(.*?)</style>', re.S)
+_RE_SCRIPT = re.compile(r'<script>(.*?)</script>', re.S)
+_RE_HTML_COMMENT = re.compile(r'<!--(?!\[).*?-->', re.S)
+_RE_PRESERVE = re.compile(r'<(pre|textarea)\b.*?</\1>', re.S | re.I)
+_RE_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_RE_CSS_SPACE = re.compile(r'\s*([{};,])\s*|:\s+')
+# Preference when the client accepts several
+_ENCODINGS = ('br', 'gzip', 'identity')
+
+
+def _strip_lines(text):
+    return '\n'.join(line.strip() for line in text.split('\n') if line.strip())
+
+
+def minify_html(html):
+    """Drop comments, indentation and blank lines; <pre> / <textarea> content is kept as is."""
+    html = _RE_HTML_COMMENT.sub('', html)
+    out = []
+    pos = 0
+    for m in _RE_PRESERVE.finditer(html):
+        out.append(_strip_lines(html[pos:m.start()]))
+        out.append(m.group(0))
+        pos = m.end()
+    out.append(_strip_lines(html[pos:]))
+    return ''.join(out)
+
+
+def minify_css(css):
+    css = _RE_CSS_COMMENT.sub('', css)
+    css = ' '.join(css.split())
+    css = _RE_CSS_SPACE.sub(lambda m: m.group(1) or ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    """
+    Remove indentation, blank lines, whole-line // comments and /* */ blocks that start
+    a line, and trailing // comments on lines without quotes or slashes before them.
+    Newlines stay (automatic semicolon insertion).
+    """
+    out = []
+    in_block = False
+    for line in js.split('\n'):
+        line = line.strip()
+        if in_block:
+            if '*/' in line:
+                in_block = False
+                line = line.split('*/', 1)[1].strip()
+            else:
+                continue
+        if line.startswith('/*'):
+            if '*/' not in line:
+                in_block = True
+                continue
+            line = line.split('*/', 1)[1].strip()
+        if not line or line.startswith('//'):
+            continue
+        code, sep, _ = line.partition(' //')
+        if sep and not any(c in code for c in '\'"`/'):
+            line = code.rstrip()
+        out.append(line)
+    return '\n'.join(out)
+
+
+def _accepted_encodings(header):
+    """{encoding: q} from an Accept-Encoding header."""
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+class StaticBody:
+    """One immutable response body with its ETag and pre-compressed variants."""
+
+    def __init__(self, body, content_type, cache_control):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:20]
+        self.variants = {'identity': body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(body, quality=11)
+
+    def choose_encoding(self, accept_encoding):
+        accepted = _accepted_encodings(accept_encoding)
+        default_q = accepted.get('*', 0.0)
+        for encoding in _ENCODINGS:
+            if encoding == 'identity':
+                return encoding
+            if encoding in self.variants and accepted.get(encoding, default_q) > 0:
+                return encoding
+        return 'identity'
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header names this body (any of its encodings)."""
+        for tag in (if_none_match or '').split(','):
+            tag = tag.strip()
+            if tag == '*':
+                return True
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag.strip('"').split('-', 1)[0] == self.etag:
+                return True
+        return False
+
+    def response(self, headers):
+        """Response for request headers: 304 when the client has it, else the best encoding."""
+        encoding = self.choose_encoding(headers.get('Accept-Encoding'))
+        etag = self.etag if encoding == 'identity' else f'{self.etag}-{encoding}'
+        if self.matches(headers.get('If-None-Match')):
+            resp = Response(status=304)
+        else:
+            resp = Response(self.variants[encoding], content_type=self.content_type)
+            if encoding != 'identity':
+                resp.headers['Content-Encoding'] = encoding
+        resp.headers['ETag'] = f'"{etag}"'
+        resp.headers['Cache-Control'] = self.cache_control
+        resp.headers['Vary'] = 'Accept-Encoding'
+        return resp
+
+
+class PageAssets:
+    """The rendered page with its <style> / <script> moved into fingerprinted assets."""
+
+    def __init__(self, html):
+        self.assets = {}
+        html = _RE_STYLE.sub(
+            lambda m: f'<link rel="stylesheet" href="{self._add(minify_css(m.group(1)), "css", "text/css")}">',
+            html)
+        html = _RE_SCRIPT.sub(
+            lambda m: f'<script src="{self._add(minify_js(m.group(1)), "js", "text/javascript")}"></script>',
+            html)
+        self.page = StaticBody(minify_html(html).encode('utf-8'), 'text/html; charset=utf-8', PAGE_CACHE_CONTROL)
+
+    def _add(self, text, ext, content_type):
+        body = StaticBody(text.encode('utf-8'), f'{content_type}; charset=utf-8', ASSET_CACHE_CONTROL)
+        name = f'{body.etag[:16]}.{ext}'
+        self.assets[name] = body
+        return ASSET_PREFIX + name
+
+    def stats(self):
+        """Byte sizes per body and encoding."""
+        bodies = {'/': self.page}
+        bodies.update((ASSET_PREFIX + name, body) for name, body in self.assets.items())
+        return {path: {enc: len(data) for enc, data in body.variants.items()} for path, body in bodies.items()}
@@ -11,11 +11,8 @@ import socket
 import threading
 import tkinter as tk
 from tkinter import messagebox, ttk
-from flask import Flask, request, render_template_string
-import pyautogui
-import pyperclip
+from flask import Flask
 import platform
-import time
 import logging
 import qrcode
 from PIL import Image, ImageTk
@@ -23,9 +20,6 @@ import io
 import pystray
 from pystray import MenuItem as item
 import tempfile
-import ctypes
-import asyncio
-import hashlib
 import json
 
 # 处理导入路径，支持直接运行和作为模块导入
@@ -39,56 +33,36 @@ except ImportError:
     import state
 
 try:
-    from .keyword_pipeline import execute_typed_text
+    from .config import load_config, save_config, start_config_watcher
+    from .cf_client import CF_AVAILABLE, CFChatClient
+    from .cf_delivery import CFDelivery
+    from .clipboard import clipboard_handoff, clipboard_set
+    from .clipboard_restore import get_restorer
+    from .event_bus import CF_LINK, CF_STATUS, PASTE_FAILED, QUEUE_DEPTH, TEXT_SENT, get_bus
+    from .injection_worker import get_worker
+    from .keyboard import DEFAULT_COMMIT_MODE, DEFAULT_COMMIT_THRESHOLD
+    from .keyword_pipeline import get_compiled_rules
+    from .web_routes import note_sent_text, register_routes
+    from .x11_input import close_xtest_input
 except ImportError:
-    from keyword_pipeline import execute_typed_text
-
-# 尝试导入 clipman（避免触发剪贴板历史工具如 Ditto）
-try:
-    import clipman
-    CLIPMAN_AVAILABLE = True
-    print("clipman library available - clipboard history tools will not be triggered")
-except ImportError:
-    CLIPMAN_AVAILABLE = False
-    print("clipman not available - using pyperclip (may trigger clipboard history tools)")
-
-# CF 模式依赖（可选）
-try:
-    import websockets
-    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-    CF_AVAILABLE = True
-except ImportError:
-    CF_AVAILABLE = False
-
-# --- 配置文件 ---
-def get_config_path():
-    """获取配置文件路径"""
-    if IS_WINDOWS:
-        config_dir = os.path.join(os.environ.get('APPDATA', ''), 'QAA-AirType')
-    else:
-        config_dir = os.path.join(os.path.expanduser('~'), '.config', 'qaa-airtype')
-    os.makedirs(config_dir, exist_ok=True)
-    return os.path.join(config_dir, 'config.json')
-
-def load_config() -> dict:
-    """加载配置"""
-    try:
-        config_path = get_config_path()
-        if os.path.exists(config_path):
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception:
-        pass
-    return {}
-
-def save_config(config: dict):
-    """保存配置"""
-    try:
-        config_path = get_config_path()
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"保存配置失败: {e}")
+    from config import load_config, save_config, start_config_watcher
+    from cf_client import CF_AVAILABLE, CFChatClient
+    from cf_delivery import CFDelivery
+    from clipboard import clipboard_handoff, clipboard_set
+    from clipboard_restore import get_restorer
+    from event_bus import CF_LINK, CF_STATUS, PASTE_FAILED, QUEUE_DEPTH, TEXT_SENT, get_bus
+    from injection_worker import get_worker
+    from keyboard import DEFAULT_COMMIT_MODE, DEFAULT_COMMIT_THRESHOLD
+    from keyword_pipeline import get_compiled_rules
+    from web_routes import note_sent_text, register_routes
+    from x11_input import close_xtest_input
+
+# CF 状态提示（'error' 时附带错误信息）
+CF_STATUS_TEXT = {
+    'connecting': '连接中...',
+    'connected': '已连接 CF',
+    'disconnected': '已断开，重连中...',
+}
 
 # --- 资源路径处理 ---
 def get_icon_path():
@@ -417,9 +391,373 @@ HTML_TEMPLATE = """
         const lastSentLabel = document.getElementById('lastSentLabel');
         const titleHeader = document.getElementById('titleHeader');
         const MAX_HISTORY = 10;
-        let isSending = false;
         let inputElement = document.getElementById('textInput');
 
+        // 传输层：局域网模式下保持一条 WebSocket 长连接（消息带 id，服务器逐条 ack），
+        // 连接不可用时回退到原有的 HTTP 接口
+        const HTTP_ROUTES = { type: '/type', mute: '/mute', mute_immediate: '/mute_immediate' };
+        const WS_PING_MS = 25000;
+        const WS_ACK_TIMEOUT_MS = 35000;
+        const WS_RETRY_MIN_MS = 500;
+        const WS_RETRY_MAX_MS = 5000;
+        const wsState = { socket: null, nextId: 1, pending: new Map(), retryMs: WS_RETRY_MIN_MS };
+
+        function connectWebSocket() {
+            if (!('WebSocket' in window)) return;
+            const scheme = location.protocol === 'https:' ? 'wss://' : 'ws://';
+            let socket;
+            try {
+                socket = new WebSocket(scheme + location.host + '/ws');
+            } catch (err) {
+                return;
+            }
+            socket.onopen = () => {
+                wsState.socket = socket;
+                wsState.retryMs = WS_RETRY_MIN_MS;
+                resumeQueue();
+            };
+            socket.onmessage = (event) => {
+                let msg;
+                try { msg = JSON.parse(event.data); } catch (err) { return; }
+                const entry = wsState.pending.get(msg.id);
+                if (entry) {
+                    wsState.pending.delete(msg.id);
+                    clearTimeout(entry.timer);
+                    entry.resolve(msg);
+                }
+            };
+            socket.onclose = () => {
+                if (wsState.socket === socket) wsState.socket = null;
+                // 未收到 ack 的请求按失败处理，不自动重发（避免重复输入）
+                wsState.pending.forEach(entry => {
+                    clearTimeout(entry.timer);
+                    entry.reject(new Error('Connection lost'));
+                });
+                wsState.pending.clear();
+                setTimeout(connectWebSocket, wsState.retryMs);
+                wsState.retryMs = Math.min(wsState.retryMs * 2, WS_RETRY_MAX_MS);
+            };
+        }
+
+        // 发送一个操作，返回服务器的响应（与对应 HTTP 接口的 JSON 相同）
+        function sendOp(op, payload) {
+            const socket = wsState.socket;
+            if (socket && socket.readyState === WebSocket.OPEN) {
+                return new Promise((resolve, reject) => {
+                    const id = wsState.nextId++;
+                    const timer = setTimeout(() => {
+                        wsState.pending.delete(id);
+                        reject(new Error('Ack timeout'));
+                    }, WS_ACK_TIMEOUT_MS);
+                    wsState.pending.set(id, { resolve: resolve, reject: reject, timer: timer });
+                    socket.send(JSON.stringify(Object.assign({ id: id, op: op }, payload)));
+                });
+            }
+            // 只能走 WebSocket 的操作（如 ping）没有 HTTP 接口：连接不可用时直接失败
+            if (!HTTP_ROUTES[op]) return Promise.reject(new Error('Not connected'));
+            return fetch(HTTP_ROUTES[op], {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(payload)
+            }).then(response => response.json());
+        }
+
+        // 发送队列：输入操作带序号按顺序发送，最多 SEND_WINDOW 条同时在途；
+        // 服务器按序号去重并按顺序执行，所以失败后重试不会重复输入。
+        // 未确认的条目保存在 IndexedDB 中，刷新页面后继续发送。
+        // 客户端 ID、序号和待发条目按标签页区分（sessionStorage，刷新后不变）：
+        // 同一来源的多个标签页若共用，序号会重复，服务器把重复序号当作重试而丢弃文本
+        const SEND_WINDOW = 8;
+        const RETRY_MIN_MS = 500;
+        const RETRY_MAX_MS = 8000;
+        // 其他标签页（已关闭）留下的条目保留这么久，重新打开该标签页时还能继续发送
+        const OUTBOX_MAX_AGE_MS = 24 * 3600 * 1000;
+        const sendQueue = { items: [], nextSeq: 1, ready: false, retryMs: RETRY_MIN_MS, retryTimer: null, db: null };
+        let clientId = getClientId();
+
+        function newClientId() {
+            return Date.now().toString(36) + Math.random().toString(36).slice(2, 10);
+        }
+
+        function getClientId() {
+            let id = sessionStorage.getItem('clientId');
+            if (!id) {
+                id = newClientId();
+                sessionStorage.setItem('clientId', id);
+            }
+            return id;
+        }
+
+        // “复制标签页”会连同 sessionStorage 一起复制：ID 已被另一个打开的标签页占用时换一个。
+        // navigator.locks 只在安全上下文（HTTPS）中可用，否则跳过
+        function claimClientId() {
+            if (!navigator.locks) return Promise.resolve();
+            return new Promise(resolve => {
+                const claim = () => navigator.locks.request('airtype-client-' + clientId, { ifAvailable: true }, lock => {
+                    if (!lock) {
+                        // 新 ID 的序号从哪里开始都可以：服务器按第一次收到的 floor 开始
+                        clientId = newClientId();
+                        sessionStorage.setItem('clientId', clientId);
+                        claim();
+                        return;
+                    }
+                    resolve();
+                    // 标签页存活期间一直持有
+                    return new Promise(() => {});
+                }).catch(() => resolve());
+                claim();
+            });
+        }
+
+        function outboxRecord(item) {
+            return { client: clientId, seq: item.seq, payload: item.payload, label: item.label, at: Date.now() };
+        }
+
+        // 读取本标签页上次未发送完的条目；读取完成前不发送，保证序号顺序
+        function openOutbox() {
+            sendQueue.nextSeq = parseInt(sessionStorage.getItem('nextSeq') || '1', 10);
+            const done = () => {
+                sendQueue.ready = true;
+                showQueueStatus();
+                pumpQueue();
+            };
+            claimClientId().then(() => {
+                let request;
+                try {
+                    request = indexedDB.open('airtype', 2);
+                } catch (err) {
+                    done();
+                    return;
+                }
+                request.onupgradeneeded = () => {
+                    const db = request.result;
+                    // 版本 1 按序号保存、所有标签页共用，无法区分来源
+                    if (db.objectStoreNames.contains('outbox')) db.deleteObjectStore('outbox');
+                    db.createObjectStore('outbox', { keyPath: ['client', 'seq'] }).createIndex('client', 'client');
+                };
+                request.onerror = done;
+                request.onsuccess = () => {
+                    const db = request.result;
+                    let getAll;
+                    try {
+                        getAll = db.transaction('outbox', 'readonly').objectStore('outbox').index('client').getAll(clientId);
+                    } catch (err) {
+                        done();
+                        return;
+                    }
+                    getAll.onerror = done;
+                    getAll.onsuccess = () => {
+                        sendQueue.db = db;
+                        // 本次已加入的条目还没有保存
+                        sendQueue.items.forEach(item => storeOutbox('put', outboxRecord(item)));
+                        getAll.result.forEach(stored => {
+                            sendQueue.items.push({ seq: stored.seq, payload: stored.payload, label: stored.label, inFlight: false });
+                            sendQueue.nextSeq = Math.max(sendQueue.nextSeq, stored.seq + 1);
+                        });
+                        sendQueue.items.sort((x, y) => x.seq - y.seq);
+                        sessionStorage.setItem('nextSeq', String(sendQueue.nextSeq));
+                        pruneOutbox(db);
+                        done();
+                    };
+                };
+            });
+        }
+
+        // 删除其他标签页留下的过期条目
+        function pruneOutbox(db) {
+            const cutoff = Date.now() - OUTBOX_MAX_AGE_MS;
+            try {
+                const cursorRequest = db.transaction('outbox', 'readwrite').objectStore('outbox').openCursor();
+                cursorRequest.onsuccess = () => {
+                    const cursor = cursorRequest.result;
+                    if (!cursor) return;
+                    if (cursor.value.client !== clientId && !(cursor.value.at > cutoff)) cursor.delete();
+                    cursor.continue();
+                };
+            } catch (err) {
+                console.error('Outbox prune failed:', err);
+            }
+        }
+
+        function storeOutbox(action, value) {
+            if (!sendQueue.db) return;
+            try {
+                sendQueue.db.transaction('outbox', 'readwrite').objectStore('outbox')[action](value);
+            } catch (err) {
+                console.error('Outbox write failed:', err);
+            }
+        }
+
+        // 加入发送队列；label 为按键名（文本为 null），用于状态栏提示
+        function enqueueOp(payload, label) {
+            const item = { seq: sendQueue.nextSeq++, payload: payload, label: label, inFlight: false };
+            sessionStorage.setItem('nextSeq', String(sendQueue.nextSeq));
+            sendQueue.items.push(item);
+            storeOutbox('put', outboxRecord(item));
+            showQueueStatus();
+            pumpQueue();
+        }
+
+        function pumpQueue() {
+            if (!sendQueue.ready || sendQueue.retryTimer) return;
+            let inFlight = sendQueue.items.filter(item => item.inFlight).length;
+            for (const item of sendQueue.items) {
+                if (inFlight >= SEND_WINDOW) break;
+                if (item.inFlight) continue;
+                sendItem(item);
+                inFlight++;
+            }
+        }
+
+        function sendItem(item) {
+            item.inFlight = true;
+            // floor：最早的未确认序号，服务器据此判断之前的条目是否都已收到
+            const message = Object.assign({ client: clientId, seq: item.seq, floor: sendQueue.items[0].seq }, item.payload);
+            sendOp('type', message)
+            .then(data => {
+                if (data.retry) throw new Error(data.error || 'Retry');
+                completeItem(item, data);
+            })
+            .catch(err => {
+                item.inFlight = false;
+                scheduleRetry();
+            });
+        }
+
+        function scheduleRetry() {
+            if (sendQueue.retryTimer) return;
+            sendQueue.retryTimer = setTimeout(() => {
+                sendQueue.retryTimer = null;
+                pumpQueue();
+            }, sendQueue.retryMs);
+            sendQueue.retryMs = Math.min(sendQueue.retryMs * 2, RETRY_MAX_MS);
+            showQueueStatus();
+        }
+
+        // 连接恢复后立即重试，不必等到退避结束
+        function resumeQueue() {
+            if (sendQueue.retryTimer) {
+                clearTimeout(sendQueue.retryTimer);
+                sendQueue.retryTimer = null;
+            }
+            pumpQueue();
+        }
+
+        // 服务器已处理（成功或失败）的条目出队，不再重试
+        function completeItem(item, data) {
+            const index = sendQueue.items.indexOf(item);
+            if (index < 0) return;
+            sendQueue.items.splice(index, 1);
+            storeOutbox('delete', [clientId, item.seq]);
+            sendQueue.retryMs = RETRY_MIN_MS;
+            if (data.success && item.label === null && !serverState.connected) {
+                // 没有服务器推送时，用自己发送的文本更新标签
+                showLastSent(item.payload.text);
+            }
+            // 队列发送完后，如果启用了自动静音，恢复音量
+            if (sendQueue.items.length === 0 && config.autoMute && muteRequested) {
+                muteRequested = false;
+                isFirstInput = true;
+                sendOp('mute_immediate', { mute: false }).catch(err => console.error('Failed to unmute:', err));
+            }
+            showQueueStatus(data.success, item.label);
+            pumpQueue();
+        }
+
+        // 状态栏：队列非空时显示队列长度
+        function showQueueStatus(success, label) {
+            const depth = sendQueue.items.length;
+            let text;
+            if (success === false) {
+                text = "✕ 发送失败";
+                status.style.color = "#ff3b30";
+            } else if (depth > 0) {
+                text = sendQueue.retryTimer ? "✕ 发送失败，重试中" : "发送中...";
+                status.style.color = sendQueue.retryTimer ? "#ff3b30" : "#888";
+            } else if (success) {
+                text = label ? "✓ 已发送 " + label : "✓ 已发送";
+                status.style.color = "#34c759";
+            } else {
+                return;
+            }
+            if (depth > 0) text += " (队列 " + depth + ")";
+            if (depth > 0 && serverState.queueDepth > 0) text += " · 电脑端排队 " + serverState.queueDepth;
+            status.innerText = text;
+            if (depth === 0) {
+                setTimeout(() => { if (status.innerText === text) status.innerText = ""; }, 1500);
+            }
+        }
+
+        // 心跳：保持连接活跃，并及时发现已断开的连接（如手机锁屏后）
+        setInterval(() => {
+            const socket = wsState.socket;
+            if (socket && socket.readyState === WebSocket.OPEN) sendOp('ping', {}).catch(() => {});
+        }, WS_PING_MS);
+
+        // 服务器推送的状态（GET /events）：最近发送的文本、电脑端队列长度、粘贴结果、静音和连接状态；
+        // 断开后 EventSource 按服务器指定的间隔自动重连，重连后先收到完整的 state
+        const serverState = { source: null, connected: false, queueDepth: 0, muted: null };
+
+        function connectEvents() {
+            if (!window.EventSource || serverState.source) return;
+            const source = new EventSource('/events');
+            serverState.source = source;
+            const on = (name, handler) => source.addEventListener(name, event => {
+                try {
+                    handler(JSON.parse(event.data));
+                } catch (err) {
+                    console.error('Bad event:', name, err);
+                }
+            });
+            source.onopen = () => {
+                serverState.connected = true;
+            };
+            source.onerror = () => {
+                if (!serverState.connected) return;
+                serverState.connected = false;
+                showServerStatus("✕ 与电脑的连接已断开", "#ff3b30", false);
+            };
+            on('state', data => {
+                if (status.innerText === "✕ 与电脑的连接已断开") status.innerText = "";
+                serverState.queueDepth = data.queue_depth;
+                serverState.muted = data.mute.muted;
+                showLastSent(data.last_text);
+                showQueueStatus();
+            });
+            on('text_sent', showLastSent);
+            on('queue_depth', depth => {
+                serverState.queueDepth = depth;
+                showQueueStatus();
+            });
+            on('delivered', receipt => {
+                if (!receipt.success) showServerStatus("✕ 电脑端粘贴失败", "#ff3b30", true);
+            });
+            on('mute', data => {
+                if (serverState.muted !== null && data.muted !== serverState.muted) {
+                    showServerStatus(data.muted ? "🔇 电脑已静音" : "🔊 电脑已恢复声音", "#888", true);
+                }
+                serverState.muted = data.muted;
+            });
+            on('cf_status', data => {
+                if (data && data.state === 'error') showServerStatus(data.text, "#ff3b30", true);
+            });
+        }
+
+        // 最近发送的文本标签（仅在配置开启时显示）
+        function showLastSent(text) {
+            if (!lastSentLabel || !config.showLastSent || !text) return;
+            lastSentLabel.textContent = text;
+            lastSentLabel.style.display = 'flex';
+        }
+
+        function showServerStatus(text, color, transient) {
+            status.innerText = text;
+            status.style.color = color;
+            if (transient) {
+                setTimeout(() => { if (status.innerText === text) status.innerText = ""; }, 3000);
+            }
+        }
+
         // IME composition state (voice input with underline)
         let isComposing = false;
 
@@ -656,7 +994,7 @@ HTML_TEMPLATE = """
             // Immediately send the text after composition ends
             if (config.autoSend) {
                 setTimeout(function() {
-                    if (!isComposing && !isSending) {
+                    if (!isComposing) {
                         handleSend();
                     }
                 }, 50);
@@ -722,11 +1060,7 @@ HTML_TEMPLATE = """
             config.autoMute = this.checked;
             saveConfig();
             // 通知服务器端更新静音状态
-            fetch('/mute', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ enabled: this.checked })
-            });
+            sendOp('mute', { enabled: this.checked });
         });
 
         document.getElementById('configShowLastSent').addEventListener('change', function() {
@@ -750,11 +1084,7 @@ HTML_TEMPLATE = """
             if (config.autoMute && isFirstInput && !muteRequested) {
                 isFirstInput = false;
                 muteRequested = true;
-                fetch('/mute_immediate', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ mute: true })
-                }).catch(err => console.error('Failed to mute:', err));
+                sendOp('mute_immediate', { mute: true }).catch(err => console.error('Failed to mute:', err));
             }
             
             // Non-composition input: do nothing (wait for compositionend)
@@ -798,30 +1128,7 @@ HTML_TEMPLATE = """
                 event.preventDefault();
                 event.stopPropagation();
             }
-            if (isSending) return;
-            isSending = true;
-            status.innerText = "发送中...";
-            status.style.color = "#888";
-            fetch('/type', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ text: '', enter: true })
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    status.innerText = "✓ 已发送 Enter";
-                    status.style.color = "#34c759";
-                    setTimeout(() => status.innerText = "", 1500);
-                } else { throw new Error("Server error"); }
-            })
-            .catch(err => {
-                status.innerText = "✕ 发送失败";
-                status.style.color = "#ff3b30";
-            })
-            .finally(() => {
-                isSending = false;
-            });
+            enqueueOp({ text: '', enter: true }, 'Enter');
         }
 
         // 发送Shift+Enter键
@@ -830,30 +1137,7 @@ HTML_TEMPLATE = """
                 event.preventDefault();
                 event.stopPropagation();
             }
-            if (isSending) return;
-            isSending = true;
-            status.innerText = "发送中...";
-            status.style.color = "#888";
-            fetch('/type', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ text: '', shift_enter: true })
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    status.innerText = "✓ 已发送 Shift+Enter";
-                    status.style.color = "#34c759";
-                    setTimeout(() => status.innerText = "", 1500);
-                } else { throw new Error("Server error"); }
-            })
-            .catch(err => {
-                status.innerText = "✕ 发送失败";
-                status.style.color = "#ff3b30";
-            })
-            .finally(() => {
-                isSending = false;
-            });
+            enqueueOp({ text: '', shift_enter: true }, 'Shift+Enter');
         }
 
         // 发送Backspace键
@@ -862,30 +1146,7 @@ HTML_TEMPLATE = """
                 event.preventDefault();
                 event.stopPropagation();
             }
-            if (isSending) return;
-            isSending = true;
-            status.innerText = "发送中...";
-            status.style.color = "#888";
-            fetch('/type', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ text: '', backspace: true })
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    status.innerText = "✓ 已发送 Backspace";
-                    status.style.color = "#34c759";
-                    setTimeout(() => status.innerText = "", 1500);
-                } else { throw new Error("Server error"); }
-            })
-            .catch(err => {
-                status.innerText = "✕ 发送失败";
-                status.style.color = "#ff3b30";
-            })
-            .finally(() => {
-                isSending = false;
-            });
+            enqueueOp({ text: '', backspace: true }, 'Backspace');
         }
 
         // 发送Undo键 (Ctrl+Z)
@@ -894,41 +1155,17 @@ HTML_TEMPLATE = """
                 event.preventDefault();
                 event.stopPropagation();
             }
-            if (isSending) return;
-            isSending = true;
-            status.innerText = "发送中...";
-            status.style.color = "#888";
-            fetch('/type', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ text: '', undo: true })
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    status.innerText = "✓ 已发送 Undo";
-                    status.style.color = "#34c759";
-                    setTimeout(() => status.innerText = "", 1500);
-                } else { throw new Error("Server error"); }
-            })
-            .catch(err => {
-                status.innerText = "✕ 发送失败";
-                status.style.color = "#ff3b30";
-            })
-            .finally(() => {
-                isSending = false;
-            });
+            enqueueOp({ text: '', undo: true }, 'Undo');
         }
 
         window.onload = function() { 
             loadConfig();
             setupInputEvents();
+            openOutbox();
+            connectWebSocket();
+            connectEvents();
             // 同步自动静音状态到服务器
-            fetch('/mute', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ enabled: config.autoMute })
-            });
+            sendOp('mute', { enabled: config.autoMute });
         }
 
         // 点击页面任意位置聚焦输入框（除了按钮和历史记录）
@@ -946,7 +1183,7 @@ HTML_TEMPLATE = """
         });
         function handleSend() {
             let text = config.trim ? inputElement.value.trim() : inputElement.value;
-            if (text.length === 0 || isSending) return;
+            if (text.length === 0) return;
             
             // 如果启用了追加空格，在末尾添加空格
             if (config.appendSpace) {
@@ -961,63 +1198,10 @@ HTML_TEMPLATE = """
             inputElement.focus();
         }
         function sendRequest(text) {
-            if (isSending) return;
-            isSending = true;
-            status.innerText = "发送中...";
-            status.style.color = "#888";
-            
-            fetch('/type', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ text: text })
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    status.innerText = "✓ 已发送";
-                    status.style.color = "#34c759";
-                    
-                    // 更新最后发送的文本标签（仅在配置开启时显示）
-                    if (lastSentLabel && config.showLastSent) {
-                        lastSentLabel.textContent = text;
-                        lastSentLabel.style.display = 'flex';
-                    }
-                    
-                    // Clear input immediately after sending
-                    inputElement.value = '';
-                    inputElement.focus();
-                    
-                    // 发送完成后，如果启用了自动静音，恢复音量
-                    if (config.autoMute && muteRequested) {
-                        muteRequested = false;
-                        isFirstInput = true;
-                        fetch('/mute_immediate', {
-                            method: 'POST',
-                            headers: { 'Content-Type': 'application/json' },
-                            body: JSON.stringify({ mute: false })
-                        }).catch(err => console.error('Failed to unmute:', err));
-                    }
-                    
-                    setTimeout(() => status.innerText = "", 1500);
-                } else { throw new Error("Server error"); }
-            })
-            .catch(err => {
-                status.innerText = "✕ 发送失败";
-                status.style.color = "#ff3b30";
-                // 发送失败也要恢复音量
-                if (config.autoMute && muteRequested) {
-                    muteRequested = false;
-                    isFirstInput = true;
-                    fetch('/mute_immediate', {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({ mute: false })
-                    }).catch(err => console.error('Failed to unmute:', err));
-                }
-            })
-            .finally(() => {
-                isSending = false;
-            });
+            enqueueOp({ text: text }, null);
+            // 已进入发送队列（并已保存），立即清空输入框，可以继续输入下一句
+            inputElement.value = '';
+            inputElement.focus();
         }
         function getHistory() {
             const stored = localStorage.getItem('typeHistory');
@@ -1181,620 +1365,9 @@ IS_MAC = platform.system() == 'Darwin'
 IS_WINDOWS = platform.system() == 'Windows'
 PASTE_KEY = 'command' if IS_MAC else 'ctrl'
 
-# Windows API 常量
-if IS_WINDOWS:
-    VK_SHIFT = 0x10
-    VK_INSERT = 0x2D
-    KEYEVENTF_EXTENDEDKEY = 0x0001
-    KEYEVENTF_KEYUP = 0x0002
-    KEYEVENTF_SCANCODE = 0x0008
-    MAPVK_VK_TO_VSC = 0
-
-# 系统音量控制相关
-auto_mute_enabled = False  # 默认关闭自动静音功能
-original_mute_state = False  # 记录原始静音状态
-current_muted_by_app = False  # 记录当前是否由应用控制静音
-
-# 粘贴和剪贴板配置
-use_ctrl_v = False  # False: 使用 Shift+Insert, True: 使用 Ctrl+V
-preserve_clipboard = False  # 是否保护剪贴板（不覆盖）
-auto_minimize = False  # 启动后自动最小化
-
-
-# --- 剪贴板操作包装函数（支持 clipman 避免触发 Ditto 等工具）---
-def clipboard_get():
-    """获取剪贴板内容（优先使用 clipman 避免触发 Ditto）"""
-    if CLIPMAN_AVAILABLE:
-        try:
-            clipman.init()
-            return clipman.get()
-        except Exception as e:
-            print(f"clipman.get() failed: {e}, falling back to pyperclip")
-    # 回退到 pyperclip
-    return pyperclip.paste()
-
-
-def clipboard_set(text):
-    """设置剪贴板内容（优先使用 clipman 避免触发 Ditto）"""
-    if CLIPMAN_AVAILABLE:
-        try:
-            clipman.init()
-            clipman.set(text)
-            return
-        except Exception as e:
-            print(f"clipman.set() failed: {e}, falling back to pyperclip")
-    # 回退到 pyperclip
-    pyperclip.copy(text)
-
-def set_system_mute_windows(mute: bool) -> bool:
-    """控制 Windows 系统音量静音状态（不显示音量条）"""
-    if not IS_WINDOWS:
-        return False
-    
-    try:
-        # 使用 pycaw 的正确方式：直接访问 EndpointVolume 属性
-        from pycaw.pycaw import AudioUtilities
-        
-        # 获取音频设备
-        speakers = AudioUtilities.GetSpeakers()
-        
-        # 正确的方式：直接访问 EndpointVolume 属性
-        volume = speakers.EndpointVolume
-        
-        # 设置静音状态（不会显示音量条）
-        volume.SetMute(1 if mute else 0, None)
-        print(f"[pycaw] {'静音' if mute else '取消静音'}成功（无OSD）")
-        
-        return True
-        
-    except ImportError as e:
-        print(f"Warning: pycaw 未安装: {e}")
-        print("请运行: pip install pycaw comtypes")
-        return False
-    
-    except Exception as e:
-        print(f"pycaw 静音失败: {e}")
-        import traceback
-        traceback.print_exc()
-        
-        # 使用备用方案（会显示音量条）
-        print(f"使用备用方案（会显示音量条）...")
-        try:
-            user32 = ctypes.windll.user32
-            VK_VOLUME_MUTE = 0xAD
-            
-            global current_muted_by_app
-            
-            # 只在需要切换时才按键
-            if (mute and not current_muted_by_app) or (not mute and current_muted_by_app):
-                user32.keybd_event(VK_VOLUME_MUTE, 0, 0, 0)
-                time.sleep(0.02)
-                user32.keybd_event(VK_VOLUME_MUTE, 0, 0x0002, 0)
-                print(f"[备用] {'静音' if mute else '取消静音'}（会显示OSD）")
-                return True
-            
-            return True
-                
-        except Exception as e2:
-            print(f"备用方案也失败: {e2}")
-            return False
-
-
-def ensure_insert_mode_reset():
-    """确保不在覆盖模式（检查并重置 Insert 状态）"""
-    if not IS_WINDOWS:
-        return
-    
-    try:
-        user32 = ctypes.windll.user32
-        insert_state = user32.GetKeyState(VK_INSERT)
-        
-        # 低位为1表示覆盖模式被激活
-        if insert_state & 0x0001:
-            insert_scan = user32.MapVirtualKeyW(VK_INSERT, MAPVK_VK_TO_VSC)
-            # 按一次 Insert 切换回插入模式
-            user32.keybd_event(VK_INSERT, insert_scan, KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY, 0)
-            time.sleep(0.01)
-            user32.keybd_event(VK_INSERT, insert_scan, KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY | KEYEVENTF_KEYUP, 0)
-            print("Detected overwrite mode, reset to insert mode")
-    except Exception as e:
-        print(f"Check Insert state failed: {e}")
-
-
-def send_shift_insert_windows():
-    """使用 Windows API 发送 Shift+Insert 组合键（使用扫描码，兼容终端）"""
-    if not IS_WINDOWS:
-        return False
-
-    user32 = None
-    shift_scan = None
-    insert_scan = None
-    shift_pressed = False
-    insert_pressed = False
-
-    try:
-        user32 = ctypes.windll.user32
-
-        # 获取扫描码（对于终端应用如 CMD/PowerShell 必须使用扫描码）
-        shift_scan = user32.MapVirtualKeyW(VK_SHIFT, MAPVK_VK_TO_VSC)
-        insert_scan = user32.MapVirtualKeyW(VK_INSERT, MAPVK_VK_TO_VSC)
-
-        # 按下 Shift（使用扫描码）
-        user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE, 0)
-        shift_pressed = True
-        time.sleep(0.05)
+# 注册 Flask 路由（/、/last_text、/mute、/mute_immediate、/type）
+register_routes(app, HTML_TEMPLATE)
 
-        # 按下 Insert（使用扫描码 + 扩展键标志）
-        user32.keybd_event(VK_INSERT, insert_scan, KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY, 0)
-        insert_pressed = True
-        time.sleep(0.02)
-
-        # 释放 Insert（使用扫描码 + 扩展键标志）
-        user32.keybd_event(VK_INSERT, insert_scan, KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY | KEYEVENTF_KEYUP, 0)
-        insert_pressed = False
-        time.sleep(0.02)
-
-        # 释放 Shift（使用扫描码）
-        user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        shift_pressed = False
-
-        return True
-        
-    except Exception as e:
-        print(f"Windows API error: {e}")
-        return False
-        
-    finally:
-        # 使用 finally 确保清理一定执行
-        if user32 and shift_scan is not None and insert_scan is not None:
-            try:
-                # 强制释放所有可能按下的键
-                if insert_pressed:
-                    user32.keybd_event(VK_INSERT, insert_scan, KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY | KEYEVENTF_KEYUP, 0)
-                    time.sleep(0.02)
-                if shift_pressed:
-                    user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-                    time.sleep(0.02)
-            except Exception as cleanup_error:
-                print(f"Error during key cleanup: {cleanup_error}")
-
-
-def send_shift_enter_windows():
-    """使用 Windows API 发送 Shift+Enter 组合键"""
-    if not IS_WINDOWS:
-        return False
-
-    user32 = None
-    shift_scan = None
-    return_scan = None
-    shift_pressed = False
-    enter_pressed = False
-
-    try:
-        user32 = ctypes.windll.user32
-        VK_RETURN = 0x0D
-        shift_scan = user32.MapVirtualKeyW(VK_SHIFT, MAPVK_VK_TO_VSC)
-        return_scan = user32.MapVirtualKeyW(VK_RETURN, MAPVK_VK_TO_VSC)
-
-        user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE, 0)
-        shift_pressed = True
-        time.sleep(0.02)
-
-        user32.keybd_event(VK_RETURN, return_scan, KEYEVENTF_SCANCODE, 0)
-        enter_pressed = True
-        time.sleep(0.02)
-
-        user32.keybd_event(VK_RETURN, return_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        enter_pressed = False
-        time.sleep(0.02)
-
-        user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        shift_pressed = False
-        return True
-    except Exception as e:
-        print(f"Windows API error for Shift+Enter: {e}")
-        return False
-    finally:
-        if user32 and shift_scan is not None and return_scan is not None:
-            try:
-                if enter_pressed:
-                    user32.keybd_event(VK_RETURN, return_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-                    time.sleep(0.02)
-                if shift_pressed:
-                    user32.keybd_event(VK_SHIFT, shift_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-                    time.sleep(0.02)
-            except Exception as cleanup_error:
-                print(f"Error during key cleanup: {cleanup_error}")
-
-
-def send_ctrl_v_windows():
-    """使用 Windows API 发送 Ctrl+V 组合键"""
-    if not IS_WINDOWS:
-        return False
-
-    try:
-        user32 = ctypes.windll.user32
-        VK_CONTROL = 0x11
-        VK_V = 0x56
-        
-        ctrl_scan = user32.MapVirtualKeyW(VK_CONTROL, MAPVK_VK_TO_VSC)
-        v_scan = user32.MapVirtualKeyW(VK_V, MAPVK_VK_TO_VSC)
-        
-        # 按下 Ctrl
-        user32.keybd_event(VK_CONTROL, ctrl_scan, KEYEVENTF_SCANCODE, 0)
-        time.sleep(0.05)
-        
-        # 按下 V
-        user32.keybd_event(VK_V, v_scan, KEYEVENTF_SCANCODE, 0)
-        time.sleep(0.02)
-        
-        # 释放 V
-        user32.keybd_event(VK_V, v_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        time.sleep(0.02)
-        
-        # 释放 Ctrl
-        user32.keybd_event(VK_CONTROL, ctrl_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-        
-        return True
-    except Exception as e:
-        print(f"Ctrl+V error: {e}")
-        return False
-
-
-def paste_text(text):
-    """复制到剪切板并粘贴"""
-    global use_ctrl_v, preserve_clipboard
-    
-    # 如果启用剪贴板保护，保存原内容
-    clipboard_saved = False
-    original_clipboard = None
-    if preserve_clipboard:
-        try:
-            original_clipboard = clipboard_get()
-            clipboard_saved = True
-            print(f"[Clipboard] Saved original content (length: {len(original_clipboard) if original_clipboard else 0})")
-        except Exception as e:
-            print(f"[Clipboard] Failed to save: {e}")
-    
-    # 复制文本到剪贴板
-    clipboard_set(text)
-    time.sleep(0.1)
-    
-    # 根据配置选择粘贴方式
-    if IS_WINDOWS:
-        if use_ctrl_v:
-            # 使用 Ctrl+V 粘贴
-            send_ctrl_v_windows()
-        else:
-            # 使用 Shift+Insert 粘贴
-            send_shift_insert_windows()
-            # 检查并重置 Insert 状态
-            ensure_insert_mode_reset()
-    else:
-        # Mac/Linux
-        if use_ctrl_v:
-            pyautogui.hotkey('ctrl', 'v')
-        else:
-            pyautogui.hotkey('shift', 'insert')
-    
-    # 如果启用剪贴板保护，恢复原内容（增加等待时间）
-    if preserve_clipboard and clipboard_saved:
-        time.sleep(0.15)  # 增加等待时间到 150ms，确保粘贴操作完成
-        try:
-            if original_clipboard is not None:
-                clipboard_set(original_clipboard)
-            else:
-                # 如果原内容是 None，清空剪贴板
-                clipboard_set('')
-            print(f"[Clipboard] Restored original content")
-        except Exception as e:
-            print(f"[Clipboard] Failed to restore: {e}")
-
-
-# --- CF 模式：cfchat 加密协议 ---
-def derive_key_and_room(password: str) -> tuple:
-    """从密码派生 AES 密钥和房间 ID"""
-    password = password.strip() or 'noset'
-    encoded = password.encode('utf-8')
-    hash_bytes = hashlib.sha256(encoded).digest()
-    room_id = hash_bytes.hex()
-    return hash_bytes, room_id
-
-
-def decrypt_message(key: bytes, iv_b64: str, data_b64: str) -> str:
-    """AES-GCM 解密消息"""
-    import base64
-    iv = base64.b64decode(iv_b64)
-    data = base64.b64decode(data_b64)
-    aesgcm = AESGCM(key)
-    plaintext = aesgcm.decrypt(iv, data, None)
-    return plaintext.decode('utf-8')
-
-
-class CFChatClient:
-    """CF 模式 WebSocket 客户端"""
-    def __init__(self, worker_url: str, password: str, on_message=None, on_status=None):
-        self.worker_url = worker_url.rstrip('/')
-        self.password = password
-        self.on_message = on_message
-        self.on_status = on_status
-        self.key, self.room_id = derive_key_and_room(password)
-        self.ws = None
-        self.running = False
-        self._loop = None
-        self._thread = None
-
-    def _get_ws_url(self) -> str:
-        """构建 WebSocket URL"""
-        url = self.worker_url
-        if url.startswith('https://'):
-            url = 'wss://' + url[8:]
-        elif url.startswith('http://'):
-            url = 'ws://' + url[7:]
-        elif not url.startswith('ws'):
-            url = 'wss://' + url
-        return f"{url}/ws/{self.room_id}"
-
-    async def _connect(self):
-        """连接并监听消息"""
-        ws_url = self._get_ws_url()
-        if self.on_status:
-            self.on_status('connecting', '连接中...')
-
-        try:
-            async with websockets.connect(ws_url) as ws:
-                self.ws = ws
-                if self.on_status:
-                    self.on_status('connected', '已连接 CF')
-
-                while self.running:
-                    try:
-                        raw = await asyncio.wait_for(ws.recv(), timeout=30)
-                        self._handle_message(raw)
-                    except asyncio.TimeoutError:
-                        continue
-                    except websockets.ConnectionClosed:
-                        break
-
-        except Exception as e:
-            if self.on_status:
-                self.on_status('error', f'连接失败: {e}')
-
-        finally:
-            self.ws = None
-            if self.on_status and self.running:
-                self.on_status('disconnected', '已断开，重连中...')
-
-    def _handle_message(self, raw: str):
-        """处理收到的消息"""
-        try:
-            payload = json.loads(raw)
-            msg_type = payload.get('type', 'text').lower()
-
-            if msg_type != 'text':
-                return
-
-            iv = payload.get('iv')
-            data = payload.get('data')
-            if not iv or not data:
-                return
-
-            text = decrypt_message(self.key, iv, data)
-            if self.on_message:
-                self.on_message(text)
-
-        except Exception as e:
-            print(f"消息处理错误: {e}")
-
-    def _run_loop(self):
-        """在独立线程运行事件循环"""
-        self._loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self._loop)
-
-        while self.running:
-            try:
-                self._loop.run_until_complete(self._connect())
-            except Exception as e:
-                print(f"连接错误: {e}")
-
-            if self.running:
-                time.sleep(2)
-
-        self._loop.close()
-
-    def start(self):
-        """启动客户端"""
-        if self.running:
-            return
-        self.running = True
-        self._thread = threading.Thread(target=self._run_loop, daemon=True)
-        self._thread.start()
-
-    def stop(self):
-        """停止客户端"""
-        self.running = False
-        if self.ws and self._loop:
-            try:
-                asyncio.run_coroutine_threadsafe(self.ws.close(), self._loop)
-            except:
-                pass
-
-
-@app.route('/last_text', methods=['GET'])
-def get_last_text():
-    """获取最近一次发送的文本"""
-    return {'success': True, 'text': getattr(state, 'last_sent_text', '') or ''}
-
-@app.route('/')
-def index():
-    return render_template_string(HTML_TEMPLATE)
-
-@app.route('/mute', methods=['POST'])
-def toggle_mute():
-    """切换自动静音功能"""
-    global auto_mute_enabled
-    try:
-        data = request.get_json()
-        enabled = data.get('enabled', False)
-        auto_mute_enabled = enabled
-        return {'success': True, 'enabled': auto_mute_enabled}
-    except Exception as e:
-        print(f"Error in toggle_mute: {e}")
-        return {'success': False}
-
-@app.route('/mute_immediate', methods=['POST'])
-def mute_immediate():
-    """立即静音或取消静音（用于语音输入时）"""
-    global current_muted_by_app
-    
-    try:
-        data = request.get_json()
-        mute = data.get('mute', False)
-        
-        if IS_WINDOWS:
-            if mute:
-                # 如果当前未被应用静音，则切换到静音
-                if not current_muted_by_app:
-                    success = set_system_mute_windows(True)
-                    if success:
-                        current_muted_by_app = True
-                    print(f"🔇 语音输入开始，切换到静音: {success}")
-                else:
-                    success = True
-                    print("已经处于静音状态")
-            else:
-                # 如果当前被应用静音，则切换回来
-                if current_muted_by_app:
-                    success = set_system_mute_windows(False)
-                    if success:
-                        current_muted_by_app = False
-                    print(f"🔊 语音输入结束，切换回音量: {success}")
-                else:
-                    success = True
-                    print("未处于应用静音状态，无需恢复")
-            
-            return {'success': success}
-        else:
-            return {'success': False, 'message': 'Only supported on Windows'}
-    except Exception as e:
-        print(f"Error in mute_immediate: {e}")
-        import traceback
-        traceback.print_exc()
-        return {'success': False, 'error': str(e)}
-
-@app.route('/type', methods=['POST'])
-def type_text():
-    try:
-        data = request.get_json()
-        enter = data.get('enter', False)
-        shift_enter = data.get('shift_enter', False)
-        backspace = data.get('backspace', False)
-        undo = data.get('undo', False)
-        
-        # 如果只是发送Undo键 (Ctrl+Z)
-        if undo:
-            if IS_WINDOWS:
-                # Windows: 使用 Windows API 发送 Ctrl+Z
-                try:
-                    user32 = ctypes.windll.user32
-                    VK_CONTROL = 0x11
-                    VK_Z = 0x5A
-                    ctrl_scan = user32.MapVirtualKeyW(VK_CONTROL, MAPVK_VK_TO_VSC)
-                    z_scan = user32.MapVirtualKeyW(VK_Z, MAPVK_VK_TO_VSC)
-                    
-                    # 按下 Ctrl
-                    user32.keybd_event(VK_CONTROL, ctrl_scan, KEYEVENTF_SCANCODE, 0)
-                    time.sleep(0.02)
-                    # 按下 Z
-                    user32.keybd_event(VK_Z, z_scan, KEYEVENTF_SCANCODE, 0)
-                    time.sleep(0.02)
-                    # 释放 Z
-                    user32.keybd_event(VK_Z, z_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-                    time.sleep(0.02)
-                    # 释放 Ctrl
-                    user32.keybd_event(VK_CONTROL, ctrl_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-                except Exception as e:
-                    print(f"Windows API error for Ctrl+Z: {e}")
-                    pyautogui.hotkey('ctrl', 'z')
-            else:
-                # Mac/Linux: 使用 pyautogui
-                pyautogui.hotkey('ctrl', 'z')
-            
-            return {'success': True}
-        
-        # 如果只是发送Enter键
-        if enter:
-            if IS_WINDOWS:
-                # Windows: 使用 Windows API 发送 Enter 键
-                try:
-                    user32 = ctypes.windll.user32
-                    VK_RETURN = 0x0D
-                    return_scan = user32.MapVirtualKeyW(VK_RETURN, MAPVK_VK_TO_VSC)
-                    # 按下 Enter
-                    user32.keybd_event(VK_RETURN, return_scan, KEYEVENTF_SCANCODE, 0)
-                    time.sleep(0.02)
-                    # 释放 Enter
-                    user32.keybd_event(VK_RETURN, return_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-                except Exception as e:
-                    print(f"Windows API error for Enter: {e}")
-                    pyautogui.press('enter')
-            else:
-                # Mac/Linux: 使用 pyautogui
-                pyautogui.press('enter')
-            
-            return {'success': True}
-
-        # 如果只是发送Shift+Enter组合键
-        if shift_enter:
-            if IS_WINDOWS:
-                try:
-                    send_shift_enter_windows()
-                except Exception as e:
-                    print(f"Windows API error for Shift+Enter: {e}")
-                    pyautogui.hotkey('shift', 'enter')
-            else:
-                # Mac/Linux: 使用 pyautogui
-                pyautogui.hotkey('shift', 'enter')
-
-            return {'success': True}
-        
-        # 如果只是发送Backspace键
-        if backspace:
-            if IS_WINDOWS:
-                # Windows: 使用 Windows API 发送 Backspace 键
-                try:
-                    user32 = ctypes.windll.user32
-                    VK_BACK = 0x08
-                    backspace_scan = user32.MapVirtualKeyW(VK_BACK, MAPVK_VK_TO_VSC)
-                    # 按下 Backspace
-                    user32.keybd_event(VK_BACK, backspace_scan, KEYEVENTF_SCANCODE, 0)
-                    time.sleep(0.02)
-                    # 释放 Backspace
-                    user32.keybd_event(VK_BACK, backspace_scan, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP, 0)
-                except Exception as e:
-                    print(f"Windows API error for Backspace: {e}")
-                    pyautogui.press('backspace')
-            else:
-                # Mac/Linux: 使用 pyautogui
-                pyautogui.press('backspace')
-            
-            return {'success': True}
-        
-        # 发送文本
-        text = data.get('text', '')
-        if text:
-            global use_ctrl_v, preserve_clipboard
-
-            state.last_sent_text = text
-
-            ok = execute_typed_text(text, use_ctrl_v, preserve_clipboard)
-            if ok:
-                return {'success': True}
-            return {'success': False, 'error': 'Paste failed'}
-    except Exception as e:
-        print(f"Error in type_text: {e}")
-        pass
-    return {'success': False}
 
 def get_host_ip():
     """获取主要的本机 IP 地址"""
@@ -1903,6 +1476,9 @@ class ServerApp:
 
         # 系统托盘图标
         self.tray_icon = None
+        self.tray_status = ''  # CF 状态文字，显示在托盘提示中
+        self.tray_queue_depth = 0
+        self.tray_link = None  # CF 连接质量（延迟、重连次数）
         self.create_tray_icon()
 
         # 居中屏幕
@@ -1916,10 +1492,14 @@ class ServerApp:
         self.ip_var = tk.StringVar(value=self.all_ips[0])
         self.is_running = False
         self.cf_client = None  # CF 模式客户端
+        self.cf_delivery = None  # CF 消息投递（按序号提交到注入线程）
         self.cf_mode = False   # 是否为 CF 模式
 
         # 加载配置
         self.config = load_config()
+        # 监听配置文件变化，并预编译热词规则（粘贴路径不再读取磁盘）
+        start_config_watcher()
+        get_compiled_rules()
         saved_mode = self.config.get('mode', 'lan')  # lan 或 cf
         saved_port = self.config.get('port', '15000')
         saved_ip = self.config.get('ip', '')
@@ -1927,10 +1507,9 @@ class ServerApp:
         saved_cf_key = self.config.get('cf_key', '')
         
         # 加载并应用粘贴和剪贴板配置到全局变量
-        global use_ctrl_v, preserve_clipboard, auto_minimize
-        use_ctrl_v = self.config.get('use_ctrl_v', False)
-        preserve_clipboard = self.config.get('preserve_clipboard', False)
-        auto_minimize = self.config.get('auto_minimize', False)
+        state.use_ctrl_v = self.config.get('use_ctrl_v', False)
+        state.preserve_clipboard = self.config.get('preserve_clipboard', False)
+        state.auto_minimize = self.config.get('auto_minimize', False)
 
         # 在 IP 列表末尾添加 CF 模式选项
         self.all_ips.append('Cloudflare Chat Workers')
@@ -1989,6 +1568,26 @@ class ServerApp:
                                        font=("Arial", 9))
         cb_paste_mode.pack(anchor='w', pady=2)
 
+        # 文本输入方式：粘贴 / 直接输入（不经过剪贴板）/ 自动（短消息直接输入，长消息粘贴）
+        commit_frame = tk.Frame(config_frame)
+        commit_frame.pack(anchor='w', pady=2)
+        tk.Label(commit_frame, text="文本输入方式:", font=("Arial", 9)).pack(side='left')
+        self.commit_mode_var = tk.StringVar(value=self.config.get('commit_mode', DEFAULT_COMMIT_MODE))
+        for value, label in (('paste', '粘贴'), ('type', '直接输入'), ('auto', '自动')):
+            tk.Radiobutton(commit_frame, text=label, value=value,
+                           variable=self.commit_mode_var,
+                           command=self.on_commit_mode_changed,
+                           font=("Arial", 9)).pack(side='left')
+        tk.Label(commit_frame, text="  自动阈值(字):", font=("Arial", 9)).pack(side='left')
+        self.commit_threshold_var = tk.StringVar(
+            value=str(self.config.get('commit_threshold', DEFAULT_COMMIT_THRESHOLD)))
+        commit_threshold_spin = tk.Spinbox(commit_frame, from_=1, to=500, width=4,
+                                           textvariable=self.commit_threshold_var,
+                                           command=self.on_commit_mode_changed,
+                                           font=("Arial", 9))
+        commit_threshold_spin.bind('<FocusOut>', lambda e: self.on_commit_mode_changed())
+        commit_threshold_spin.pack(side='left')
+
         # 剪贴板保护
         self.preserve_clipboard_var = tk.BooleanVar(value=self.config.get('preserve_clipboard', False))
         cb_preserve = tk.Checkbutton(config_frame, text="保护剪贴板（输入时不覆盖剪贴板内容）",
@@ -2112,9 +1711,17 @@ class ServerApp:
         # 检查是否需要自动最小化（延迟更长时间确保服务已启动）
         self.root.after(500, self.check_auto_minimize)
         
-        # 定期刷新最近发送的文本（每2秒）
+        # 订阅事件总线（发送文本、粘贴失败、CF 状态、队列长度），只在变化时更新界面，不再轮询
+        self.displayed_text = None
         self.refresh_last_text()
-        self.root.after(2000, self.auto_refresh_last_text)
+        bus = get_bus()
+        self.unsubscribers = [
+            bus.subscribe(TEXT_SENT, self._on_text_sent_event),
+            bus.subscribe(PASTE_FAILED, self._on_paste_failed_event),
+            bus.subscribe(CF_STATUS, self._on_cf_status_event),
+            bus.subscribe(QUEUE_DEPTH, self._on_queue_depth_event),
+            bus.subscribe(CF_LINK, self._on_cf_link_event),
+        ]
 
     def show_all_ips_display(self, port, started=False):
         """显示所有可用 IP 地址列表"""
@@ -2210,29 +1817,37 @@ class ServerApp:
 
     def on_paste_mode_changed(self):
         """粘贴模式改变时的回调"""
-        global use_ctrl_v
-        use_ctrl_v = self.use_ctrl_v_var.get()
-        self.config['use_ctrl_v'] = use_ctrl_v
+        state.use_ctrl_v = self.use_ctrl_v_var.get()
+        self.config['use_ctrl_v'] = state.use_ctrl_v
         save_config(self.config)
-        mode = "Ctrl+V" if use_ctrl_v else "Shift+Insert"
+        mode = "Ctrl+V" if state.use_ctrl_v else "Shift+Insert"
         print(f"Paste mode: {mode}")
 
+    def on_commit_mode_changed(self):
+        """文本输入方式改变时的回调"""
+        self.config['commit_mode'] = self.commit_mode_var.get()
+        try:
+            self.config['commit_threshold'] = max(1, int(self.commit_threshold_var.get()))
+        except ValueError:
+            self.commit_threshold_var.set(str(self.config.get('commit_threshold', DEFAULT_COMMIT_THRESHOLD)))
+        save_config(self.config)
+        print(f"Text input mode: {self.config['commit_mode']} "
+              f"(auto threshold: {self.config.get('commit_threshold', DEFAULT_COMMIT_THRESHOLD)})")
+
     def on_preserve_clipboard_changed(self):
         """剪贴板保护改变时的回调"""
-        global preserve_clipboard
-        preserve_clipboard = self.preserve_clipboard_var.get()
-        self.config['preserve_clipboard'] = preserve_clipboard
+        state.preserve_clipboard = self.preserve_clipboard_var.get()
+        self.config['preserve_clipboard'] = state.preserve_clipboard
         save_config(self.config)
-        status = "enabled" if preserve_clipboard else "disabled"
+        status = "enabled" if state.preserve_clipboard else "disabled"
         print(f"Clipboard preservation: {status}")
 
     def on_auto_minimize_changed(self):
         """自动最小化改变时的回调"""
-        global auto_minimize
-        auto_minimize = self.auto_minimize_var.get()
-        self.config['auto_minimize'] = auto_minimize
+        state.auto_minimize = self.auto_minimize_var.get()
+        self.config['auto_minimize'] = state.auto_minimize
         save_config(self.config)
-        status = "enabled" if auto_minimize else "disabled"
+        status = "enabled" if state.auto_minimize else "disabled"
         print(f"Auto minimize: {status}")
 
     def on_strip_punct_around_kw_changed(self):
@@ -2268,8 +1883,7 @@ class ServerApp:
 
     def check_auto_minimize(self):
         """检查是否需要自动最小化窗口（调用 hide_window 方法隐藏到系统托盘）"""
-        global auto_minimize
-        if auto_minimize and self.is_running:
+        if state.auto_minimize and self.is_running:
             self.hide_window()  # 调用现有的最小化按钮功能
             print("Window auto-minimized to system tray")
 
@@ -2351,12 +1965,14 @@ class ServerApp:
         self.cf_url = url
         self.cf_key = key
 
-        # 创建 CF 客户端
+        # 创建 CF 客户端：收到的消息直接交给投递队列，不经过界面线程
+        self.cf_delivery = CFDelivery(on_delivered=self.on_cf_delivered)
         self.cf_client = CFChatClient(
             worker_url=url,
             password=key,
             on_message=self.on_cf_message,
-            on_status=self.on_cf_status
+            on_status=self.on_cf_status,
+            on_stats=self.on_cf_stats
         )
         self.cf_client.start()
 
@@ -2429,22 +2045,31 @@ class ServerApp:
             self.current_url = url
             self.tip_label.config(text="提示：如无法访问，请切换 IP 或端口重新扫码")
 
-    def on_cf_message(self, text: str):
-        """CF 模式收到消息回调"""
-        self.root.after(0, lambda: self._handle_cf_message(text))
+    def on_cf_message(self, text: str, seq: int):
+        """CF 模式收到消息回调（在 CF 接收线程中：按序号交给投递队列后立即返回，不等待粘贴完成）"""
+        note_sent_text(text)
+        self.cf_delivery.deliver(seq, text)
 
-    def _handle_cf_message(self, text: str):
-        """处理 CF 消息并粘贴"""
-        global use_ctrl_v, preserve_clipboard
-        state.last_sent_text = text
-        execute_typed_text(text, use_ctrl_v, preserve_clipboard)
-        # 更新提示
-        display = text[:30] + '...' if len(text) > 30 else text
-        self.tip_label.config(text=f"已粘贴: {display}")
+    def on_cf_delivered(self, seq: int, text: str, result: dict):
+        """CF 消息粘贴完成（或失败、被丢弃）后更新提示；失败提示由事件总线的 paste_failed 负责"""
+        if result.get('success'):
+            display = text[:30] + '...' if len(text) > 30 else text
+            self.root.after(0, lambda: self.tip_label.config(text=f"已粘贴: {display}", fg="#888"))
+        elif result.get('dropped'):
+            self.root.after(0, lambda: self.tip_label.config(text=f"消息 #{seq} 已丢弃：待粘贴的消息过多",
+                                                             fg="#ff3b30"))
 
     def on_cf_status(self, state: str, text: str):
-        """CF 模式状态回调"""
-        self.root.after(0, lambda: self._update_cf_status(state, text))
+        """CF 模式状态回调（在 CF 线程中：发布到事件总线）"""
+        if state == 'error':
+            text = f'连接失败: {text}'
+        else:
+            text = CF_STATUS_TEXT.get(state, text)
+        get_bus().publish(CF_STATUS, {'state': state, 'text': text})
+
+    def on_cf_stats(self, stats: dict):
+        """CF 连接质量回调（在 CF 线程中：发布到事件总线）"""
+        get_bus().publish(CF_LINK, stats)
 
     def _update_cf_status(self, state: str, text: str):
         """更新 CF 状态显示"""
@@ -2557,10 +2182,26 @@ class ServerApp:
 
     def quit_app(self, icon=None, item=None):
         """退出应用"""
+        for unsubscribe in self.unsubscribers:
+            unsubscribe()
         # 停止 CF 客户端
         if self.cf_client:
             self.cf_client.stop()
             self.cf_client = None
+        if self.cf_delivery:
+            self.cf_delivery.stop()
+        # 立即恢复尚未恢复的剪贴板（延迟恢复在注入线程中执行）
+        try:
+            get_worker().run('restore', get_restorer().flush)
+        except Exception as e:
+            print(f"退出时恢复剪贴板失败: {e}")
+        # X11 剪贴板由本进程持有，退出前交给剪贴板管理器（没有时交给后台的 xclip/xsel），否则内容随进程消失
+        try:
+            clipboard_handoff()
+        except Exception as e:
+            print(f"退出时移交剪贴板失败: {e}")
+        # 还原 XTest 输入时重映射的空闲键码
+        close_xtest_input()
         if self.tray_icon:
             self.tray_icon.stop()
         self.root.quit()
@@ -2571,30 +2212,14 @@ class ServerApp:
             webbrowser.open(self.current_url)
     
     def refresh_last_text(self):
-        """刷新显示最近发送的文本"""
-        try:
-            if self.is_running and not self.cf_mode:
-                # 局域网模式：通过HTTP请求获取
-                import urllib.request
-                import json as json_lib
-                try:
-                    url = f"http://127.0.0.1:{self.port_var.get()}/last_text"
-                    with urllib.request.urlopen(url, timeout=1) as response:
-                        data = json_lib.loads(response.read().decode())
-                        if data.get('success'):
-                            text = data.get('text', '')
-                            self.update_last_text_display(text)
-                except Exception as e:
-                    # 如果服务未启动或无法连接，显示状态信息
-                    pass
-            else:
-                # 直接读取state中的值
-                self.update_last_text_display(getattr(state, 'last_sent_text', '') or '')
-        except Exception as e:
-            pass
-    
+        """刷新显示最近发送的文本（Web 服务与界面在同一进程，直接读取 state）"""
+        self.update_last_text_display(getattr(state, 'last_sent_text', '') or '')
+
     def update_last_text_display(self, text):
-        """更新最近发送文本的显示"""
+        """更新最近发送文本的显示（内容未变化时不重写）"""
+        if text == self.displayed_text:
+            return
+        self.displayed_text = text
         self.last_text_text.config(state=tk.NORMAL)
         self.last_text_text.delete('1.0', tk.END)
         if text:
@@ -2607,22 +2232,7 @@ class ServerApp:
     
     def get_last_sent_text(self):
         """获取最近一次发送的文本（不依赖窗口，供托盘等使用）"""
-        try:
-            if self.is_running and not self.cf_mode:
-                import urllib.request
-                import json as json_lib
-                try:
-                    url = f"http://127.0.0.1:{self.port_var.get()}/last_text"
-                    with urllib.request.urlopen(url, timeout=1) as response:
-                        data = json_lib.loads(response.read().decode())
-                        if data.get('success'):
-                            return (data.get('text') or '').strip()
-                except Exception:
-                    pass
-                return ''
-            return (getattr(state, 'last_sent_text', None) or '').strip()
-        except Exception:
-            return ''
+        return (getattr(state, 'last_sent_text', None) or '').strip()
 
     def copy_last_text(self):
         """复制最近发送的文本到剪贴板"""
@@ -2635,11 +2245,49 @@ class ServerApp:
         except Exception as e:
             self.tip_label.config(text=f"复制失败: {e}", fg="#ff3b30")
     
-    def auto_refresh_last_text(self):
-        """自动刷新最近发送的文本"""
-        if self.root.winfo_exists():
-            self.refresh_last_text()
-            self.root.after(2000, self.auto_refresh_last_text)
+    def _on_text_sent_event(self, text):
+        """事件：发送了新文本（在发布者线程中，调度到主线程）"""
+        self.root.after(0, lambda: self.update_last_text_display(text))
+
+    def _on_paste_failed_event(self, event):
+        """事件：注入失败"""
+        text = f"粘贴失败: {event['error']}" if event.get('error') else "粘贴失败"
+        self.root.after(0, lambda: self.tip_label.config(text=text, fg="#ff3b30"))
+
+    def _on_cf_status_event(self, status):
+        """事件：CF 连接状态变化（界面提示和托盘提示）"""
+        self.root.after(0, lambda: self._update_cf_status(status['state'], status['text']))
+        self.tray_status = status['text']
+        self._update_tray_title()
+
+    def _on_cf_link_event(self, stats):
+        """事件：CF 连接质量变化（托盘提示）"""
+        self.tray_link = stats
+        self._update_tray_title()
+
+    def _on_queue_depth_event(self, depth):
+        """事件：注入队列长度变化（托盘提示）"""
+        self.tray_queue_depth = depth
+        self._update_tray_title()
+
+    def _update_tray_title(self):
+        """托盘提示：CF 状态、连接质量和排队数量"""
+        if not self.tray_icon:
+            return
+        parts = ["QAA AirType"]
+        if self.tray_status:
+            parts.append(self.tray_status)
+        link = self.tray_link if self.cf_mode else None
+        if link and link.get('connected') and link.get('rtt_avg_ms') is not None:
+            parts.append(f"延迟 {link['rtt_avg_ms']:.0f} ms")
+        if link and link.get('reconnects'):
+            parts.append(f"重连 {link['reconnects']} 次")
+        if self.tray_queue_depth:
+            parts.append(f"排队 {self.tray_queue_depth}")
+        try:
+            self.tray_icon.title = " - ".join(parts)
+        except Exception:
+            pass
 
 if __name__ == '__main__':
     root = tk.Tk()
@@ -9,14 +9,14 @@ IS_MAC = platform.system() == 'Darwin'
 IS_WINDOWS = platform.system() == 'Windows'
 PASTE_KEY = 'command' if IS_MAC else 'ctrl'
 
-# Windows API constants
-if IS_WINDOWS:
-    VK_SHIFT = 0x10
-    VK_INSERT = 0x2D
-    KEYEVENTF_EXTENDEDKEY = 0x0001
-    KEYEVENTF_KEYUP = 0x0002
-    KEYEVENTF_SCANCODE = 0x0008
-    MAPVK_VK_TO_VSC = 0
+# Windows API constants (plain ints, defined everywhere so modules import on any OS)
+VK_SHIFT = 0x10
+VK_INSERT = 0x2D
+KEYEVENTF_EXTENDEDKEY = 0x0001
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+KEYEVENTF_SCANCODE = 0x0008
+MAPVK_VK_TO_VSC = 0
 
 
 def get_icon_path():
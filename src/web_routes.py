@@ -1,150 +1,390 @@
 """Flask web routes module"""
-import pyautogui
-from flask import request, render_template_string
-from .utils import IS_WINDOWS
-from .audio import set_system_mute_windows
-from .keyboard import (
-    send_ctrl_z_windows, send_enter_windows, send_shift_enter_windows, send_backspace_windows
-)
-from .keyword_pipeline import execute_typed_text
-from . import state
+import json
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from functools import partial
+
+from flask import Response, abort, request
 
-# Import audio state variables
-from . import audio
+try:
+    from .utils import IS_WINDOWS
+    from .audio import set_system_mute_windows
+    from .app_profiles import get_app_profiles
+    from .clipboard_restore import get_restorer
+    from .event_bus import CF_LINK, CF_STATUS, MUTE_STATE, TEXT_SENT, get_bus
+    from .event_stream import EventStreams
+    from .injection_worker import DEFAULT_WAIT_TIMEOUT_S, QueueFullError, get_worker
+    from .keyword_pipeline import get_rule_cache_stats, validate_batch_ops
+    from .op_sequencer import OpSequencer
+    from .page_assets import ASSET_PREFIX, PageAssets
+    from .ws_transport import WebSocketError
+    from . import state, ws_transport
+    # Import audio state variables
+    from . import audio
+except ImportError:
+    from utils import IS_WINDOWS
+    from audio import set_system_mute_windows
+    from app_profiles import get_app_profiles
+    from clipboard_restore import get_restorer
+    from event_bus import CF_LINK, CF_STATUS, MUTE_STATE, TEXT_SENT, get_bus
+    from event_stream import EventStreams
+    from injection_worker import DEFAULT_WAIT_TIMEOUT_S, QueueFullError, get_worker
+    from keyword_pipeline import get_rule_cache_stats, validate_batch_ops
+    from op_sequencer import OpSequencer
+    from page_assets import ASSET_PREFIX, PageAssets
+    from ws_transport import WebSocketError
+    import state
+    import ws_transport
+    import audio
+
+# Single-key /type flags and the chord each one sends
+_CONTROL_KEYS = (
+    ('undo', ['ctrl', 'z']),
+    ('enter', ['enter']),
+    ('shift_enter', ['shift', 'enter']),
+    ('backspace', ['backspace']),
+)
 
 
 def register_routes(app, html_template):
     """Register Flask routes"""
-    
+    # Sequenced /type and /ops requests ({client, seq, floor}) are applied once each, in seq order
+    sequencer = OpSequencer(_job_result)
+    # The page has no per-request variables: render, split, minify and compress it once
+    page = PageAssets(app.jinja_env.from_string(html_template).render())
+    # Pushed server state for the phone page (GET /events)
+    streams = EventStreams(get_bus)
+
     @app.route('/')
     def index():
-        return render_template_string(html_template)
+        return page.page.response(request.headers)
+
+    @app.route(ASSET_PREFIX + '<name>')
+    def asset(name):
+        """Fingerprinted CSS / JS split out of the page"""
+        body = page.assets.get(name)
+        if body is None:
+            abort(404)
+        return body.response(request.headers)
+
+    @app.route('/last_text', methods=['GET'])
+    def get_last_text():
+        """Return the most recently sent text"""
+        return {'success': True, 'text': getattr(state, 'last_sent_text', '') or ''}
+
+    @app.route('/stats', methods=['GET'])
+    def get_stats():
+        """Injection queue / coalescing, sequencing, clipboard restore, app profile, rule cache and event counters"""
+        return {
+            'success': True,
+            'injection': get_worker().stats(),
+            'sequencer': sequencer.stats(),
+            'clipboard_restore': get_restorer().stats(),
+            'app_profiles': get_app_profiles().stats(),
+            'rule_cache': get_rule_cache_stats(),
+            'events': get_bus().stats(),
+            'event_streams': streams.stats(),
+            'cf_link': get_bus().latest(CF_LINK),
+        }
+
+    @app.route('/events', methods=['GET'])
+    def events():
+        """
+        Server-Sent Events: a 'state' snapshot, then text_sent, delivered, paste_failed,
+        queue_depth, mute and cf_status events as they happen (see event_stream)
+        """
+        stream = streams.open()
+        if stream is None:
+            return {'success': False, 'error': 'Too many event streams'}, 503
+        resp = Response(stream.frames(_state_snapshot()), mimetype='text/event-stream')
+        resp.headers['Cache-Control'] = 'no-cache'
+        resp.headers['X-Accel-Buffering'] = 'no'
+        # Also unsubscribes a stream whose generator never started
+        resp.call_on_close(stream.close)
+        return resp
 
     @app.route('/mute', methods=['POST'])
     def toggle_mute():
         """Toggle auto mute feature"""
-        try:
-            data = request.get_json()
-            enabled = data.get('enabled', False)
-            audio.auto_mute_enabled = enabled
-            return {'success': True, 'enabled': audio.auto_mute_enabled}
-        except Exception as e:
-            print(f"Error in toggle_mute: {e}")
-            return {'success': False}
+        return _toggle_mute(request.get_json(silent=True))
 
     @app.route('/mute_immediate', methods=['POST'])
     def mute_immediate():
         """Immediately mute or unmute (for voice input)"""
-        try:
-            data = request.get_json()
-            mute = data.get('mute', False)
-            
-            if IS_WINDOWS:
-                if mute:
-                    # If currently not muted by app, switch to mute
-                    if not audio.current_muted_by_app:
-                        success = set_system_mute_windows(True)
-                        if success:
-                            audio.current_muted_by_app = True
-                        print(f"Mute on voice input start: {success}")
-                    else:
-                        success = True
-                        print("Already muted")
-                else:
-                    # If currently muted by app, switch back
-                    if audio.current_muted_by_app:
-                        success = set_system_mute_windows(False)
-                        if success:
-                            audio.current_muted_by_app = False
-                        print(f"Unmute on voice input end: {success}")
-                    else:
-                        success = True
-                        print("Not muted by app, no need to restore")
-                
-                return {'success': success}
-            else:
-                return {'success': False, 'message': 'Only supported on Windows'}
-        except Exception as e:
-            print(f"Error in mute_immediate: {e}")
-            import traceback
-            traceback.print_exc()
-            return {'success': False, 'error': str(e)}
+        return _mute_immediate(request.get_json(silent=True))
 
     @app.route('/type', methods=['POST'])
     def type_text():
+        # Injection runs on the single worker thread; this handler only queues and waits.
+        # Responses carry a latency report: queue / sleep / clipboard / inject / other (ms)
         try:
             data = request.get_json()
-            enter = data.get('enter', False)
-            shift_enter = data.get('shift_enter', False)
-            backspace = data.get('backspace', False)
-            undo = data.get('undo', False)
-            
-            # If just sending Undo key (Ctrl+Z)
-            if undo:
-                if IS_WINDOWS:
-                    try:
-                        send_ctrl_z_windows()
-                    except Exception as e:
-                        print(f"Windows API error for Ctrl+Z: {e}")
-                        pyautogui.hotkey('ctrl', 'z')
-                else:
-                    # Mac/Linux: use pyautogui
-                    pyautogui.hotkey('ctrl', 'z')
-                
-                return {'success': True}
-            
-            # If just sending Enter key
-            if enter:
-                if IS_WINDOWS:
-                    try:
-                        send_enter_windows()
-                    except Exception as e:
-                        print(f"Windows API error for Enter: {e}")
-                        pyautogui.press('enter')
-                else:
-                    # Mac/Linux: use pyautogui
-                    pyautogui.press('enter')
-                
-                return {'success': True}
-
-            # If just sending Shift+Enter combo
-            if shift_enter:
-                if IS_WINDOWS:
-                    try:
-                        send_shift_enter_windows()
-                    except Exception as e:
-                        print(f"Windows API error for Shift+Enter: {e}")
-                        pyautogui.hotkey('shift', 'enter')
-                else:
-                    # Mac/Linux: use pyautogui
-                    pyautogui.hotkey('shift', 'enter')
-
-                return {'success': True}
-            
-            # If just sending Backspace key
-            if backspace:
-                if IS_WINDOWS:
-                    try:
-                        send_backspace_windows()
-                    except Exception as e:
-                        print(f"Windows API error for Backspace: {e}")
-                        pyautogui.press('backspace')
-                else:
-                    # Mac/Linux: use pyautogui
-                    pyautogui.press('backspace')
-                
-                return {'success': True}
-            
-            # Send text
-            text = data.get('text', '')
-            if text:
-                state.last_sent_text = text
-                ok = execute_typed_text(text)
-                if ok:
-                    return {'success': True}
-                return {'success': False, 'error': 'Paste failed'}
+            sequenced = _submit_sequenced(sequencer, data, partial(_submit_type_job, data), 'type')
+            if sequenced is not None:
+                return sequenced.result(DEFAULT_WAIT_TIMEOUT_S)
+            job = _submit_type_job(data)
+            if job is None:
+                return {'success': False}
+            return _type_result(job)
+        except QueueFullError:
+            return {'success': False, 'error': 'Injection queue full'}
+        except FutureTimeoutError:
+            # Still queued or running: a retry of the same seq gets its result
+            return {'success': False, 'error': 'Injection timed out'}
         except Exception as e:
             print(f"Error in type_text: {e}")
             pass
         return {'success': False}
 
+    @app.route('/ops', methods=['POST'])
+    def run_ops():
+        """
+        Ordered batch {ops: [{op: text, text} | {op: enter | shift_enter | backspace | undo,
+        count?} | {op: hotkey, keys, count?}]} run as one injection job; repeat counts
+        become key bursts. The response lists {op, success, elapsed_ms} per op.
+        """
+        try:
+            data = request.get_json()
+            ops = validate_batch_ops(data.get('ops'))
+            sequenced = _submit_sequenced(sequencer, data, partial(_submit_ops_job, ops), 'ops')
+            if sequenced is not None:
+                return sequenced.result(DEFAULT_WAIT_TIMEOUT_S)
+            return _ops_result(_submit_ops_job(ops))
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
+        except QueueFullError:
+            return {'success': False, 'error': 'Injection queue full'}
+        except FutureTimeoutError:
+            return {'success': False, 'error': 'Injection timed out'}
+        except Exception as e:
+            print(f"Error in run_ops: {e}")
+        return {'success': False}
+
+    @app.route('/ws', websocket=True)
+    def websocket():
+        """
+        Persistent connection carrying the /type, /ops, /mute and /mute_immediate operations.
+        Client messages are JSON {id, op, ...the HTTP body}; each is answered with
+        {id, ack: op, ...the HTTP response}. Type jobs are queued in receive order and
+        acked when the worker finishes them, so the page can pipeline requests.
+        """
+        try:
+            ws = ws_transport.accept(request.environ)
+        except WebSocketError as e:
+            return {'success': False, 'error': str(e)}, 400
+        _serve_websocket(ws, sequencer)
+        return _WebSocketDone()
+
+
+class _WebSocketDone(Response):
+    """
+    Returned after a WebSocket session: the socket was taken over (and closed), so the
+    HTTP server must not write a response. werkzeug treats ConnectionError from the
+    response as a dropped connection and closes quietly.
+    """
+
+    def __call__(self, environ, start_response):
+        raise ConnectionError("WebSocket closed")
+
+
+def _toggle_mute(data):
+    try:
+        enabled = data.get('enabled', False)
+        audio.auto_mute_enabled = enabled
+        get_bus().publish(MUTE_STATE, _mute_state())
+        return {'success': True, 'enabled': audio.auto_mute_enabled}
+    except Exception as e:
+        print(f"Error in toggle_mute: {e}")
+        return {'success': False}
+
+
+def _mute_immediate(data):
+    try:
+        mute = data.get('mute', False)
+
+        if IS_WINDOWS:
+            if mute:
+                # If currently not muted by app, switch to mute
+                if not audio.current_muted_by_app:
+                    success = set_system_mute_windows(True)
+                    if success:
+                        audio.current_muted_by_app = True
+                    print(f"Mute on voice input start: {success}")
+                else:
+                    success = True
+                    print("Already muted")
+            else:
+                # If currently muted by app, switch back
+                if audio.current_muted_by_app:
+                    success = set_system_mute_windows(False)
+                    if success:
+                        audio.current_muted_by_app = False
+                    print(f"Unmute on voice input end: {success}")
+                else:
+                    success = True
+                    print("Not muted by app, no need to restore")
+
+            get_bus().publish(MUTE_STATE, _mute_state())
+            return {'success': success}
+        else:
+            return {'success': False, 'message': 'Only supported on Windows'}
+    except Exception as e:
+        print(f"Error in mute_immediate: {e}")
+        import traceback
+        traceback.print_exc()
+        return {'success': False, 'error': str(e)}
+
+
+def _mute_state():
+    return {'auto_mute': bool(audio.auto_mute_enabled), 'muted': bool(audio.current_muted_by_app)}
+
+
+def _state_snapshot():
+    """First event of an /events stream: the server's current view."""
+    return {
+        'last_text': getattr(state, 'last_sent_text', '') or '',
+        'queue_depth': get_worker().stats()['pending'],
+        'mute': _mute_state(),
+        'cf_status': get_bus().latest(CF_STATUS),
+    }
+
+
+def _type_result(job):
+    """Response for a finished (or timed out) type job."""
+    try:
+        ok = job.result()
+    except FutureTimeoutError:
+        return {'success': False, 'error': 'Injection timed out'}
+    result = {'success': bool(ok), 'latency': job.latency()}
+    if not ok and job.kind == 'text':
+        result['error'] = 'Paste failed'
+    return result
+
+
+def note_sent_text(text):
+    """Record the last sent text (/last_text, tray) and announce it to subscribers."""
+    state.last_sent_text = text
+    get_bus().publish(TEXT_SENT, text)
+
+
+def _ops_result(job):
+    """Response for a finished (or timed out) batch job."""
+    try:
+        results = job.result()
+    except FutureTimeoutError:
+        return {'success': False, 'error': 'Injection timed out'}
+    return {'success': all(r['success'] for r in results), 'ops': results, 'latency': job.latency()}
+
+
+def _job_result(job):
+    return _ops_result(job) if job.kind == 'ops' else _type_result(job)
+
+
+def _submit_ops_job(ops):
+    """Queue validated batch operations as one job."""
+    texts = [op['text'] for op in ops if op['op'] == 'text']
+    if texts:
+        note_sent_text(''.join(texts))
+    return get_worker().submit_ops(ops)
+
+
+def _submit_type_job(data):
+    """Queue the job for a /type payload; None if there is nothing to do."""
+    worker = get_worker()
+
+    # Control keys (Ctrl+Z / Enter / Shift+Enter / Backspace)
+    for flag, keys in _CONTROL_KEYS:
+        if data.get(flag, False):
+            return worker.submit_hotkey(keys)
+
+    # Send text
+    text = data.get('text', '')
+    if text:
+        note_sent_text(text)
+        return worker.submit_text(text)
+    return None
+
+
+def _submit_sequenced(sequencer, data, start, kind):
+    """
+    Future of the response for a payload carrying {client, seq, floor}, or None when
+    it has no seq (handled directly, as before). start() queues its job; kind ('type',
+    'ops') names it in log messages.
+    """
+    if data.get('seq') is None:
+        return None
+    try:
+        client = str(data.get('client') or '')
+        seq = int(data['seq'])
+        floor = int(data['floor']) if data.get('floor') is not None else None
+    except (TypeError, ValueError):
+        future = Future()
+        future.set_result({'success': False, 'error': 'Bad sequence'})
+        return future
+    return sequencer.submit(client, seq, floor, start, kind)
+
+
+def _serve_websocket(ws, sequencer):
+    """Read messages until the connection closes."""
+    while True:
+        raw = ws.receive()
+        if raw is None:
+            break
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            ws.send(json.dumps({'id': None, 'success': False, 'error': 'Bad message'}))
+            continue
+        _dispatch_ws_message(ws, message, sequencer)
+
+
+def _dispatch_ws_message(ws, message, sequencer):
+    msg_id = message.get('id')
+    op = message.get('op')
+
+    def reply(result):
+        ws.send(json.dumps(dict(result, id=msg_id, ack=op), ensure_ascii=False))
+
+    if op in ('type', 'ops'):
+        try:
+            if op == 'ops':
+                ops = validate_batch_ops(message.get('ops'))
+                start = partial(_submit_ops_job, ops)
+            else:
+                start = partial(_submit_type_job, message)
+            sequenced = _submit_sequenced(sequencer, message, start, op)
+            if sequenced is not None:
+                sequenced.add_done_callback(lambda f: reply(f.result()))
+                return
+            job = start()
+        except ValueError as e:
+            reply({'success': False, 'error': str(e)})
+            return
+        except QueueFullError:
+            reply({'success': False, 'error': 'Injection queue full'})
+            return
+        except Exception as e:
+            print(f"Error in {op}: {e}")
+            reply({'success': False})
+            return
+        if job is None:
+            reply({'success': False})
+            return
+
+        def on_done(_future):
+            try:
+                reply(_job_result(job))
+            except Exception as e:
+                print(f"Error in {op}: {e}")
+                reply({'success': False})
+
+        job.future.add_done_callback(on_done)
+    elif op == 'mute':
+        reply(_toggle_mute(message))
+    elif op == 'mute_immediate':
+        reply(_mute_immediate(message))
+    elif op == 'ping':
+        reply({'success': True})
+    else:
+        reply({'success': False, 'error': 'Unknown op'})
@@ -0,0 +1,89 @@
+"""Win32 SendInput helpers.
+
+The ctypes structures use fixed-width fields so they can be built (and tested) on any
+OS; only send_inputs() needs Windows.
+"""
+import ctypes
+
+try:
+    from .utils import IS_WINDOWS, KEYEVENTF_KEYUP, KEYEVENTF_UNICODE
+except ImportError:
+    from utils import IS_WINDOWS, KEYEVENTF_KEYUP, KEYEVENTF_UNICODE
+
+INPUT_KEYBOARD = 1
+
+ULONG_PTR = ctypes.c_size_t
+
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ('wVk', ctypes.c_uint16),
+        ('wScan', ctypes.c_uint16),
+        ('dwFlags', ctypes.c_uint32),
+        ('time', ctypes.c_uint32),
+        ('dwExtraInfo', ULONG_PTR),
+    ]
+
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [
+        ('dx', ctypes.c_int32),
+        ('dy', ctypes.c_int32),
+        ('mouseData', ctypes.c_uint32),
+        ('dwFlags', ctypes.c_uint32),
+        ('time', ctypes.c_uint32),
+        ('dwExtraInfo', ULONG_PTR),
+    ]
+
+
+class HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [
+        ('uMsg', ctypes.c_uint32),
+        ('wParamL', ctypes.c_uint16),
+        ('wParamH', ctypes.c_uint16),
+    ]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [('ki', KEYBDINPUT), ('mi', MOUSEINPUT), ('hi', HARDWAREINPUT)]
+
+
+class INPUT(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_uint32), ('union', _INPUTUNION)]
+
+
+def key_input(vk=0, scan=0, flags=0):
+    """One keyboard INPUT record."""
+    return INPUT(type=INPUT_KEYBOARD, union=_INPUTUNION(ki=KEYBDINPUT(wVk=vk, wScan=scan, dwFlags=flags)))
+
+
+def utf16_units(text):
+    """UTF-16 code units of text (characters outside the BMP become a surrogate pair)."""
+    data = text.encode('utf-16-le')
+    return [data[i] | (data[i + 1] << 8) for i in range(0, len(data), 2)]
+
+
+def unicode_inputs(text):
+    """
+    KEYEVENTF_UNICODE down/up per UTF-16 code unit. Both halves of a surrogate pair
+    are sent back to back in the same batch, which Windows turns into one WM_CHAR pair.
+    """
+    inputs = []
+    for unit in utf16_units(text):
+        inputs.append(key_input(scan=unit, flags=KEYEVENTF_UNICODE))
+        inputs.append(key_input(scan=unit, flags=KEYEVENTF_UNICODE | KEYEVENTF_KEYUP))
+    return inputs
+
+
+def send_inputs(inputs):
+    """Send INPUT records in one SendInput call (atomic w.r.t. other input). True if all were injected."""
+    if not IS_WINDOWS or not inputs:
+        return False
+    array = (INPUT * len(inputs))(*inputs)
+    sent = ctypes.windll.user32.SendInput(len(inputs), array, ctypes.sizeof(INPUT))
+    return sent == len(inputs)
+
+
+def send_unicode_text(text):
+    """Type text into the focused window without the clipboard."""
+    return send_inputs(unicode_inputs(text))
@@ -0,0 +1,212 @@
+"""Minimal server-side WebSocket (RFC 6455) on a socket handed over by the HTTP server.
+
+Flask's development server (werkzeug) exposes the client socket as
+environ['werkzeug.socket']; accept() answers the upgrade handshake on it and returns a
+WebSocket. Text messages only. Frames are written by one thread per connection, so
+send() never blocks the caller (e.g. the injection worker completing a job).
+"""
+import base64
+import hashlib
+import queue
+import struct
+import threading
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+# Larger messages are refused (close code 1009)
+MAX_MESSAGE_BYTES = 1024 * 1024
+# A connection with no traffic for this long is dropped (the page pings every 25 s)
+IDLE_TIMEOUT_S = 90.0
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+_CLOSE = object()
+
+
+class WebSocketError(RuntimeError):
+    """Not a valid upgrade request, or the peer broke the protocol."""
+
+
+class ConnectionClosed(Exception):
+    """The peer closed the connection (or it dropped)."""
+
+
+def accept_key(key):
+    """Sec-WebSocket-Accept for a client's Sec-WebSocket-Key."""
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode('ascii')).digest()).decode('ascii')
+
+
+def handshake_response(environ):
+    """The 101 response for a WSGI environ, or WebSocketError if it is not a WebSocket upgrade."""
+    if environ.get('REQUEST_METHOD') != 'GET':
+        raise WebSocketError("WebSocket upgrade must be a GET")
+    if 'websocket' not in environ.get('HTTP_UPGRADE', '').lower():
+        raise WebSocketError("Missing Upgrade: websocket")
+    if 'upgrade' not in environ.get('HTTP_CONNECTION', '').lower():
+        raise WebSocketError("Missing Connection: Upgrade")
+    if environ.get('HTTP_SEC_WEBSOCKET_VERSION') != '13':
+        raise WebSocketError("Unsupported WebSocket version")
+    key = environ.get('HTTP_SEC_WEBSOCKET_KEY', '')
+    if not key:
+        raise WebSocketError("Missing Sec-WebSocket-Key")
+    return ('HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept_key(key)}\r\n\r\n').encode('ascii')
+
+
+def encode_frame(opcode, payload=b'', mask=None):
+    """One final frame. Server frames are unmasked; pass a 4-byte mask to build client frames (tests)."""
+    n = len(payload)
+    mask_bit = 0x80 if mask is not None else 0
+    if n < 126:
+        header = struct.pack('!BB', 0x80 | opcode, mask_bit | n)
+    elif n < 0x10000:
+        header = struct.pack('!BBH', 0x80 | opcode, mask_bit | 126, n)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, mask_bit | 127, n)
+    if mask is None:
+        return header + payload
+    return header + mask + _unmask(payload, mask)
+
+
+def _unmask(payload, mask):
+    n = len(payload)
+    if not n:
+        return payload
+    key = int.from_bytes((mask * (n // 4 + 1))[:n], 'big')
+    return (int.from_bytes(payload, 'big') ^ key).to_bytes(n, 'big')
+
+
+def _read_exact(rfile, n):
+    data = rfile.read(n) if n else b''
+    if len(data) < n:
+        raise ConnectionClosed()
+    return data
+
+
+def read_frame(rfile, max_bytes=MAX_MESSAGE_BYTES):
+    """(fin, opcode, payload) of one client frame. Client frames must be masked."""
+    b0, b1 = _read_exact(rfile, 2)
+    if b0 & 0x70:
+        raise WebSocketError("Reserved bits set")
+    if not b1 & 0x80:
+        raise WebSocketError("Client frame not masked")
+    n = b1 & 0x7F
+    if n == 126:
+        n = struct.unpack('!H', _read_exact(rfile, 2))[0]
+    elif n == 127:
+        n = struct.unpack('!Q', _read_exact(rfile, 8))[0]
+    if n > max_bytes:
+        raise WebSocketError("Message too big")
+    mask = _read_exact(rfile, 4)
+    return bool(b0 & 0x80), b0 & 0x0F, _unmask(_read_exact(rfile, n), mask)
+
+
+class WebSocket:
+    """One accepted connection: receive() on the handler thread, send() from any thread."""
+
+    def __init__(self, sock, idle_timeout_s=IDLE_TIMEOUT_S):
+        self._sock = sock
+        sock.settimeout(idle_timeout_s)
+        self._rfile = sock.makefile('rb')
+        self._outbox = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name='ws-writer', daemon=True)
+        self._writer.start()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def receive(self):
+        """Next text message, or None once the connection is closed."""
+        parts = []
+        size = 0
+        while not self._closed:
+            try:
+                fin, opcode, payload = read_frame(self._rfile)
+            except ConnectionClosed:
+                self._shutdown()
+                return None
+            except WebSocketError as e:
+                self.close(1009 if str(e) == "Message too big" else 1002)
+                return None
+            except OSError:
+                # Idle timeout or reset
+                self._shutdown()
+                return None
+            if opcode == OP_PING:
+                self._outbox.put(encode_frame(OP_PONG, payload))
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                self.close()
+                return None
+            if opcode == OP_BINARY or (opcode == OP_CONTINUATION) != bool(parts):
+                self.close(1003 if opcode == OP_BINARY else 1002)
+                return None
+            parts.append(payload)
+            size += len(payload)
+            if size > MAX_MESSAGE_BYTES:
+                self.close(1009)
+                return None
+            if fin:
+                try:
+                    return b''.join(parts).decode('utf-8')
+                except UnicodeDecodeError:
+                    self.close(1007)
+                    return None
+        return None
+
+    def send(self, text):
+        """Queue a text message; False if the connection is already closed."""
+        if self._closed:
+            return False
+        self._outbox.put(encode_frame(OP_TEXT, text.encode('utf-8')))
+        return True
+
+    def close(self, code=1000):
+        """Send a close frame (after anything already queued) and stop."""
+        if self._closed:
+            return
+        self._outbox.put(encode_frame(OP_CLOSE, struct.pack('!H', code)))
+        self._outbox.put(_CLOSE)
+        self._closed = True
+        self._writer.join(timeout=2)
+
+    def _shutdown(self):
+        if not self._closed:
+            self._closed = True
+            self._outbox.put(_CLOSE)
+
+    def _write_loop(self):
+        while True:
+            frame = self._outbox.get()
+            if frame is _CLOSE:
+                break
+            try:
+                self._sock.sendall(frame)
+            except OSError:
+                self._closed = True
+                break
+        try:
+            self._rfile.close()
+            self._sock.close()
+        except OSError:
+            pass
+
+
+def accept(environ, idle_timeout_s=IDLE_TIMEOUT_S):
+    """Complete the upgrade on the server's socket; WebSocketError if the request or server cannot."""
+    sock = environ.get('werkzeug.socket')
+    if sock is None:
+        raise WebSocketError("HTTP server does not expose the client socket")
+    response = handshake_response(environ)
+    sock.sendall(response)
+    return WebSocket(sock, idle_timeout_s)
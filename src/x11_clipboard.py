@@ -0,0 +1,283 @@
+"""Long-lived X11 CLIPBOARD provider (Linux).
+
+Keeps one Xlib connection and a hidden window for the life of the process. set() takes
+ownership of CLIPBOARD and a background thread answers SelectionRequest events itself,
+so no xclip/xsel process is spawned per call. get() returns our own text directly while
+we own the selection and otherwise converts it over the same connection.
+
+The serving thread blocks in next_event() while callers on other threads send requests
+and wait for replies on that connection, so Xlib.threaded is imported before it is
+opened (without it python-xlib's locks are no-ops). It has to be one connection: X
+sends SelectionRequest to the client that took ownership.
+
+write_seq / read_seq count our writes and the text requests we answered, so the paste
+path can tell when a write is visible and when the target has read it. Reads are also
+counted per X client (reads_by; client_of() maps a window id to its client, e.g. the
+focused window's): clipboard managers read the CLIPBOARD right after every ownership
+change, and only a read by the paste target means the paste has happened.
+
+Not implemented: INCR (incremental) transfers; callers fall back to clipman/pyperclip.
+As with any X selection, the content is gone when the process exits unless someone else
+takes it over: handoff() asks the clipboard manager to save it (see
+clipboard.clipboard_handoff, which falls back to a detached xclip/xsel).
+"""
+import threading
+
+# Above this the data would need the INCR protocol; raise so the caller falls back
+MAX_INLINE_BYTES = 256 * 1024
+# How long get() waits for another client's SelectionNotify
+CONVERT_TIMEOUT_S = 1.0
+# Per-client read counters kept; reset beyond this (clients come and go)
+MAX_TRACKED_CLIENTS = 64
+# How long handoff() waits for the clipboard manager to save our text
+HANDOFF_TIMEOUT_S = 2.0
+
+_TEXT_TARGETS = ('UTF8_STRING', 'text/plain;charset=utf-8', 'TEXT', 'STRING')
+_ATOM_NAMES = ('CLIPBOARD', 'TARGETS', 'INCR', 'AIRTYPE_SELECTION', 'CLIPBOARD_MANAGER', 'SAVE_TARGETS') + _TEXT_TARGETS
+
+
+class X11ClipboardError(RuntimeError):
+    """The X11 provider cannot serve this call; use the fallback clipboard."""
+
+
+def encode_for_target(text, target_name):
+    """(bytes, type name) served for a requested target, or None if the target is unsupported."""
+    if target_name == 'STRING':
+        return text.encode('latin-1', errors='replace'), 'STRING'
+    if target_name in _TEXT_TARGETS:
+        return text.encode('utf-8'), 'UTF8_STRING'
+    return None
+
+
+class X11SelectionOwner:
+    """Holds CLIPBOARD from a hidden window and serves it from a daemon thread."""
+
+    def __init__(self, display_name=None):
+        try:
+            # Real locks for every Display opened from here on (see the module docstring)
+            import Xlib.threaded  # noqa: F401
+            from Xlib import X, Xatom, display
+            from Xlib.protocol import event
+        except ImportError as e:
+            raise X11ClipboardError(f"python-xlib not available: {e}")
+        try:
+            self._d = display.Display(display_name)
+        except Exception as e:
+            raise X11ClipboardError(f"Cannot open X display: {e}")
+        self._X = X
+        self._Xatom = Xatom
+        self._event = event
+        root = self._d.screen().root
+        self._window = root.create_window(-10, -10, 1, 1, 0, X.CopyFromParent)
+        self._atoms = {name: self._d.intern_atom(name) for name in _ATOM_NAMES}
+        self._names = {atom: name for name, atom in self._atoms.items()}
+        self._lock = threading.Lock()
+        self._convert_lock = threading.RLock()
+        self._notify = threading.Condition()
+        self._notified = None
+        self._text = None
+        self._owned = False
+        self._closed = False
+        self._stats = {'sets': 0, 'served': 0, 'reads': 0, 'refused': 0, 'local_gets': 0, 'remote_gets': 0}
+        # Window ids carry their client's id outside these bits
+        self._client_mask = ~self._d.display.info.resource_id_mask
+        self._client_reads = {}  # client id bits -> reads answered
+        self._thread = threading.Thread(target=self._serve, name='x11-clipboard', daemon=True)
+        self._thread.start()
+
+    @property
+    def owned(self):
+        return self._owned
+
+    @property
+    def write_seq(self):
+        """Changes once set() has confirmed ownership (the text is then visible to every client)."""
+        return self._stats['sets']
+
+    @property
+    def read_seq(self):
+        """Changes whenever another client has been sent our text (TARGETS queries do not count)."""
+        return self._stats['reads']
+
+    def reads_by(self, client):
+        """Reads answered for one client (client id bits, see client_of())."""
+        with self._lock:
+            return self._client_reads.get(client, 0)
+
+    def client_of(self, window):
+        """Client id bits of a window (or window id)."""
+        return getattr(window, 'id', window) & self._client_mask
+
+    def focused_client(self):
+        """
+        Client id bits of the window with the input focus; None when there is none (or
+        PointerRoot). A round trip on this connection: callers with a connection of their
+        own (XTestInput.focused_window()) should ask there and use client_of().
+        """
+        X = self._X
+        try:
+            focus = self._d.get_input_focus().focus
+        except Exception:
+            return None
+        if getattr(focus, 'id', focus) in (X.NONE, X.PointerRoot):
+            return None
+        return self.client_of(focus)
+
+    def set(self, text):
+        """Take CLIPBOARD ownership with text (served on request, no subprocess)."""
+        if len(text.encode('utf-8')) > MAX_INLINE_BYTES:
+            raise X11ClipboardError("Text too large for a single-property transfer")
+        clipboard = self._atoms['CLIPBOARD']
+        with self._lock:
+            self._text = text
+        self._window.set_selection_owner(clipboard, self._X.CurrentTime)
+        owner = self._d.get_selection_owner(clipboard)
+        if getattr(owner, 'id', owner) != self._window.id:
+            raise X11ClipboardError("Could not take clipboard ownership")
+        with self._lock:
+            self._owned = True
+            self._stats['sets'] += 1
+
+    def get(self):
+        """Clipboard text; '' when nothing is on the clipboard."""
+        with self._lock:
+            if self._owned:
+                self._stats['local_gets'] += 1
+                return self._text
+        return self._convert()
+
+    def handoff(self, timeout=HANDOFF_TIMEOUT_S):
+        """
+        Ask the clipboard manager to save our text before the process exits
+        (freedesktop ClipboardManager: ConvertSelection of CLIPBOARD_MANAGER to
+        SAVE_TARGETS). The manager reads the text from us meanwhile, so the serving thread
+        must still run. False when there is no manager or it refused or timed out.
+        """
+        X = self._X
+        manager = self._d.get_selection_owner(self._atoms['CLIPBOARD_MANAGER'])
+        if getattr(manager, 'id', manager) in (X.NONE, None):
+            return False
+        prop_atom = self._atoms['AIRTYPE_SELECTION']
+        # The property lists the targets to save
+        self._window.change_property(prop_atom, self._Xatom.ATOM, 32,
+                                     [self._atoms[name] for name in _TEXT_TARGETS])
+        try:
+            notified = self._request(self._atoms['CLIPBOARD_MANAGER'], self._atoms['SAVE_TARGETS'],
+                                     prop_atom, timeout)
+        except X11ClipboardError:
+            return False
+        finally:
+            self._window.delete_property(prop_atom)
+            self._d.flush()
+        return notified.property != X.NONE
+
+    def _request(self, selection, target, prop_atom, timeout):
+        """ConvertSelection and wait for the owner's SelectionNotify (caller holds no lock)."""
+        with self._convert_lock:
+            with self._notify:
+                self._notified = None
+            self._window.convert_selection(selection, target, prop_atom, self._X.CurrentTime)
+            self._d.flush()
+            with self._notify:
+                if not self._notify.wait_for(lambda: self._notified is not None, timeout):
+                    raise X11ClipboardError("Timed out waiting for the selection owner")
+                return self._notified
+
+    def _convert(self):
+        X = self._X
+        prop_atom = self._atoms['AIRTYPE_SELECTION']
+        with self._convert_lock:
+            notified = self._request(self._atoms['CLIPBOARD'], self._atoms['UTF8_STRING'],
+                                     prop_atom, CONVERT_TIMEOUT_S)
+            with self._lock:
+                self._stats['remote_gets'] += 1
+            if notified.property == X.NONE:
+                return ''
+            prop = self._window.get_full_property(prop_atom, X.AnyPropertyType)
+            self._window.delete_property(prop_atom)
+            self._d.flush()
+        if prop is None:
+            return ''
+        if prop.property_type == self._atoms['INCR']:
+            raise X11ClipboardError("INCR clipboard transfers are not supported")
+        value = prop.value
+        if isinstance(value, bytes):
+            return value.decode('utf-8', errors='replace')
+        return str(value)
+
+    def _serve(self):
+        X = self._X
+        while not self._closed:
+            try:
+                ev = self._d.next_event()
+            except Exception as e:
+                if not self._closed:
+                    print(f"[X11 clipboard] Event loop stopped: {e}")
+                break
+            if ev.type == X.SelectionRequest:
+                self._answer(ev)
+            elif ev.type == X.SelectionClear:
+                # Another client copied something; stop answering
+                with self._lock:
+                    self._owned = False
+                    self._text = None
+            elif ev.type == X.SelectionNotify:
+                with self._notify:
+                    self._notified = ev
+                    self._notify.notify_all()
+
+    def _answer(self, ev):
+        """Reply to one SelectionRequest (ICCCM: write the property, then send SelectionNotify)."""
+        X = self._X
+        # Obsolete clients pass property None and expect the target name to be used
+        prop = ev.property if ev.property != X.NONE else ev.target
+        with self._lock:
+            text = self._text if self._owned else None
+        target = self._names.get(ev.target)
+        ok = False
+        try:
+            if text is not None and ev.selection == self._atoms['CLIPBOARD']:
+                if target == 'TARGETS':
+                    targets = [self._atoms[name] for name in ('TARGETS',) + _TEXT_TARGETS]
+                    ev.requestor.change_property(prop, self._Xatom.ATOM, 32, targets)
+                    ok = True
+                else:
+                    encoded = encode_for_target(text, target)
+                    if encoded is not None:
+                        data, type_name = encoded
+                        ev.requestor.change_property(prop, self._atoms[type_name], 8, data)
+                        ok = True
+            notify = self._event.SelectionNotify(
+                time=ev.time,
+                requestor=ev.requestor,
+                selection=ev.selection,
+                target=ev.target,
+                property=prop if ok else X.NONE,
+            )
+            ev.requestor.send_event(notify, event_mask=0)
+            self._d.flush()
+        except Exception as e:
+            ok = False
+            print(f"[X11 clipboard] Failed to answer selection request: {e}")
+        with self._lock:
+            self._stats['served' if ok else 'refused'] += 1
+            if ok and target != 'TARGETS':
+                self._stats['reads'] += 1
+                client = self.client_of(ev.requestor)
+                if client not in self._client_reads and len(self._client_reads) >= MAX_TRACKED_CLIENTS:
+                    self._client_reads.clear()
+                self._client_reads[client] = self._client_reads.get(client, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['owned'] = self._owned
+        return stats
+
+    def close(self):
+        self._closed = True
+        try:
+            self._window.destroy()
+            self._d.close()
+        except Exception:
+            pass
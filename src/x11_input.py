@@ -0,0 +1,237 @@
+"""XTest keyboard input (Linux/X11).
+
+Chords: every hotkey token maps to an X keysym; the keycode table is resolved once
+when the connection is opened, and a chord's presses/releases go out back to back
+with a single sync (no per-key pauses, unlike pyautogui).
+
+Text: arbitrary Unicode is typed by remapping a few spare keycodes to the wanted
+keysyms and faking key presses on them, like xdotool does.
+
+One Xlib connection is kept for the life of the process. The remapped keycodes are
+global to the X server, so close() puts their original keysyms back; the process-wide
+instance is closed at exit (atexit, and quit_app through close_xtest_input()).
+"""
+import atexit
+import threading
+
+try:
+    from .clock import delay
+except ImportError:
+    from clock import delay
+
+# Spare keycodes rotated through, so a keycode is not remapped while the focused
+# client may still be translating the previous press
+MAX_SPARE_KEYCODES = 8
+# Gap after each typed character (clients refresh their keymap on MappingNotify)
+CHAR_DELAY_S = 0.004
+
+
+def _build_keysym_names():
+    names = {
+        # Modifiers
+        'ctrl': 'Control_L', 'shift': 'Shift_L', 'alt': 'Alt_L', 'win': 'Super_L',
+        # Editing / whitespace
+        'enter': 'Return', 'return': 'Return', 'tab': 'Tab', 'backspace': 'BackSpace',
+        'escape': 'Escape', 'space': 'space',
+        # Navigation
+        'insert': 'Insert', 'delete': 'Delete', 'home': 'Home', 'end': 'End',
+        'pageup': 'Prior', 'pagedown': 'Next',
+        'left': 'Left', 'up': 'Up', 'right': 'Right', 'down': 'Down',
+        # System
+        'printscreen': 'Print', 'pause': 'Pause', 'capslock': 'Caps_Lock',
+        'numlock': 'Num_Lock', 'scrolllock': 'Scroll_Lock', 'apps': 'Menu',
+        # Punctuation
+        ';': 'semicolon', '=': 'equal', ',': 'comma', '-': 'minus', '.': 'period',
+        '/': 'slash', '`': 'grave', '[': 'bracketleft', '\\': 'backslash',
+        ']': 'bracketright', "'": 'apostrophe',
+        # Numpad
+        'multiply': 'KP_Multiply', 'add': 'KP_Add', 'separator': 'KP_Separator',
+        'subtract': 'KP_Subtract', 'decimal': 'KP_Decimal', 'divide': 'KP_Divide',
+    }
+    for c in 'abcdefghijklmnopqrstuvwxyz':
+        names[c] = c
+    for d in range(10):
+        names[str(d)] = str(d)
+        names[f'num{d}'] = f'KP_{d}'
+    for n in range(1, 25):
+        names[f'f{n}'] = f'F{n}'
+    return names
+
+
+# hotkey token -> X keysym name
+KEYSYM_NAMES = _build_keysym_names()
+
+
+class XTestUnavailable(RuntimeError):
+    """No X display or no XTEST extension."""
+
+
+def char_to_keysym(ch):
+    """Keysym for one character: Latin-1 keysyms are the code point, the rest use 0x01000000 + code point."""
+    cp = ord(ch)
+    if 0x20 <= cp <= 0x7E or 0xA0 <= cp <= 0xFF:
+        return cp
+    return 0x01000000 | cp
+
+
+class XTestInput:
+    """Persistent XTest connection: keycode table for chords plus a pool of spare keycodes for text."""
+
+    def __init__(self, display_name=None):
+        try:
+            from Xlib import X, XK, display
+            from Xlib.ext import xtest
+        except ImportError as e:
+            raise XTestUnavailable(f"python-xlib not available: {e}")
+        try:
+            self._d = display.Display(display_name)
+        except Exception as e:
+            raise XTestUnavailable(f"Cannot open X display: {e}")
+        if not self._d.has_extension('XTEST'):
+            self._d.close()
+            raise XTestUnavailable("X server has no XTEST extension")
+        self._X = X
+        self._xtest = xtest
+        self._lock = threading.Lock()
+        self._closed = False
+        self._original = self._find_spare_keycodes()  # spare keycode -> its keysyms before we remap it
+        self._spare = sorted(self._original)
+        if not self._spare:
+            self._d.close()
+            raise XTestUnavailable("No spare keycodes to remap")
+        self._mapped = {}  # keycode -> keysym currently assigned
+        self._next = 0
+        self.table = self._build_keycode_table(XK)
+
+    def _build_keycode_table(self, XK):
+        """token -> (keysym, keycode); keycode 0 when the keymap has no key for it (remapped on use)."""
+        table = {}
+        for token, name in KEYSYM_NAMES.items():
+            keysym = XK.string_to_keysym(name)
+            if keysym:
+                table[token] = (keysym, self._d.keysym_to_keycode(keysym))
+        return table
+
+    def supports(self, keys):
+        return bool(keys) and all(k in self.table for k in keys)
+
+    def _find_spare_keycodes(self):
+        """{keycode: original keysyms} of the spare keycodes to use."""
+        first = self._d.display.info.min_keycode
+        count = self._d.display.info.max_keycode - first + 1
+        mapping = self._d.get_keyboard_mapping(first, count)
+        spare = [(first + i, tuple(syms)) for i, syms in enumerate(mapping) if not any(syms)]
+        # Highest keycodes are the least likely to be touched by anything else
+        return dict(spare[-MAX_SPARE_KEYCODES:])
+
+    def _keycode_for(self, keysym):
+        for keycode, mapped in self._mapped.items():
+            if mapped == keysym:
+                return keycode
+        keycode = self._spare[self._next % len(self._spare)]
+        self._next += 1
+        self._d.change_keyboard_mapping(keycode, [(keysym, keysym)])
+        self._d.sync()
+        self._mapped[keycode] = keysym
+        return keycode
+
+    def chord(self, keys):
+        """Press keys in order, release in reverse, one sync for the whole chord."""
+        X = self._X
+        with self._lock:
+            self._check_open()
+            keycodes = []
+            for token in keys:
+                keysym, keycode = self.table[token]
+                keycodes.append(keycode or self._keycode_for(keysym))
+            pressed = []
+            try:
+                for keycode in keycodes:
+                    self._xtest.fake_input(self._d, X.KeyPress, keycode)
+                    pressed.append(keycode)
+            finally:
+                # Always release whatever went down, so a failure cannot leave a modifier stuck
+                for keycode in reversed(pressed):
+                    self._xtest.fake_input(self._d, X.KeyRelease, keycode)
+                self._d.sync()
+        return True
+
+    def type_text(self, text):
+        X = self._X
+        with self._lock:
+            self._check_open()
+            for ch in text:
+                keycode = self._keycode_for(char_to_keysym(ch))
+                self._xtest.fake_input(self._d, X.KeyPress, keycode)
+                self._xtest.fake_input(self._d, X.KeyRelease, keycode)
+                self._d.sync()
+                delay(CHAR_DELAY_S)
+        return True
+
+    def focused_window(self):
+        """Id of the window with the input focus; None when there is none (or PointerRoot)."""
+        X = self._X
+        with self._lock:
+            if self._closed:
+                return None
+            try:
+                focus = self._d.get_input_focus().focus
+            except Exception:
+                return None
+        focus = getattr(focus, 'id', focus)
+        return None if focus in (X.NONE, X.PointerRoot) else focus
+
+    def _check_open(self):
+        if self._closed:
+            raise XTestUnavailable("XTest connection closed")
+
+    def close(self):
+        """Put the original keysyms back on the remapped keycodes and close the connection (idempotent)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                for keycode in self._mapped:
+                    self._d.change_keyboard_mapping(keycode, [self._original[keycode]])
+                self._d.sync()
+            except Exception as e:
+                print(f"XTest: could not restore the keyboard mapping: {e}")
+            try:
+                self._d.close()
+            except Exception:
+                pass
+            self._mapped = {}
+
+
+_input = None
+_input_unavailable = False
+_input_lock = threading.Lock()
+
+
+def get_xtest_input():
+    """Process-wide XTestInput, or None when XTest cannot be used."""
+    global _input, _input_unavailable
+    if _input is not None or _input_unavailable:
+        return _input
+    with _input_lock:
+        if _input is None and not _input_unavailable:
+            try:
+                _input = XTestInput()
+                # Remapped keycodes outlive the process otherwise, even after a crash mid-string
+                atexit.register(close_xtest_input)
+            except XTestUnavailable as e:
+                print(f"XTest input unavailable: {e}")
+                _input_unavailable = True
+    return _input
+
+
+def close_xtest_input():
+    """Restore the keyboard mapping and close the process-wide XTestInput (shutdown path)."""
+    global _input, _input_unavailable
+    with _input_lock:
+        xinput, _input = _input, None
+        # No new connection after shutdown
+        _input_unavailable = True
+    if xinput is not None:
+        xinput.close()
@@ -0,0 +1,56 @@
+"""Shared setUp for tests that run injections: process-wide state swapped for fakes."""
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src import keyword_pipeline
+from src.app_profiles import AppProfiles, ForegroundTracker, set_app_profiles
+from src.clipboard_restore import DeferredRestore, set_restorer
+from src.clock import VirtualClock, set_clock
+from src.injection_backend import RecordingBackend, set_backend
+from src.injection_worker import InjectionWorker, set_worker
+from src.keyword_pipeline import RuleSetCache
+
+
+class InjectionTestCase(unittest.TestCase):
+    """
+    Installs a RecordingBackend (self.backend, clipboard 'orig'), a VirtualClock
+    (self.clock) and no foreground-app profile, so injections run with the global
+    settings; everything is put back on cleanup. Subclasses set rules_config to serve
+    keyword rules from memory, with_worker for a fresh InjectionWorker (self.worker) and
+    with_restorer for a DeferredRestore that never runs by itself (self.restorer).
+    """
+
+    rules_config = None
+    with_worker = False
+    with_restorer = False
+
+    def setUp(self):
+        self.backend = RecordingBackend(clipboard='orig')
+        self._swap(set_backend, self.backend)
+        self._swap(set_app_profiles, AppProfiles(ForegroundTracker(probe=lambda: None)))
+        self.clock = VirtualClock()
+        self._swap(set_clock, self.clock)
+        if self.with_restorer:
+            self.restorer = DeferredRestore(submit=lambda fn, *args: None)
+            self._swap(set_restorer, self.restorer)
+            self.addCleanup(self.restorer.flush)
+        if self.with_worker:
+            self.worker = InjectionWorker()
+            self._swap(set_worker, self.worker)
+            self.addCleanup(self.worker.stop)
+        if self.rules_config is not None:
+            config = self.rules_config
+            cache = RuleSetCache(loader=lambda: config, version_fn=lambda: 0)
+            patch = mock.patch.object(keyword_pipeline, '_rule_set_cache', cache)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _swap(self, setter, value):
+        """setter(value) now, setter(previous) on cleanup."""
+        self.addCleanup(setter, setter(value))
@@ -0,0 +1,172 @@
+"""Tests for per-application paste profiles and learned timings."""
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src import keyboard, keyword_pipeline
+from src.app_profiles import (
+    AppProfiles,
+    ForegroundTracker,
+    match_profile,
+    profiles_from_config,
+    set_app_profiles,
+    validate_app_profiles,
+)
+from src.clipboard_restore import DeferredRestore, set_restorer
+from src.clock import VirtualClock, set_clock
+from src.injection_backend import RecordingBackend, set_backend
+from src.keyword_pipeline import RuleSetCache
+
+_CONFIG = {
+    'use_ctrl_v': True,
+    'keyword_actions': [{'keyword': '换行', 'action': 'enter'}],
+    'app_profiles': [{'name': 'slow', 'match': 'slowapp', 'paste_settle_ms': 250, 'commit_mode': 'type'}],
+    'app_profiles_builtin_paste_keys': True,
+}
+
+
+class ProfileMatchingTests(unittest.TestCase):
+    def test_validate(self):
+        profiles = validate_app_profiles([
+            {'match': 'Foo', 'paste_settle_ms': '40', 'use_ctrl_v': 'yes', 'commit_mode': 'x'},
+            {'match': []},
+            'junk',
+        ])
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]['match'], ('foo',))
+        self.assertAlmostEqual(profiles[0]['paste_settle_s'], 0.04)
+        self.assertIsNone(profiles[0]['use_ctrl_v'])
+        self.assertIsNone(profiles[0]['commit_mode'])
+        self.assertIsNone(profiles[0]['segment_delay_s'])
+
+    def test_user_profiles_before_builtin(self):
+        profiles = profiles_from_config(_CONFIG)
+        self.assertEqual(match_profile(profiles, 'slowapp.exe|xterm')['name'], 'slow')
+        self.assertEqual(match_profile(profiles, 'windowsterminal.exe|cascadia_hosting_window_class')['name'],
+                         'terminal')
+        self.assertEqual(match_profile(profiles, 'navigator.firefox')['name'], 'browser_editor')
+        self.assertIsNone(match_profile(profiles, 'unknown.app'))
+        self.assertIsNone(match_profile(profiles, None))
+        self.assertEqual(profiles_from_config({'app_profiles_builtin': False}), [])
+
+    def test_electron_apps_are_not_browsers(self):
+        profiles = profiles_from_config({})
+        self.assertEqual(match_profile(profiles, 'chrome.exe|chrome_widgetwin_1')['name'], 'browser_editor')
+        self.assertEqual(match_profile(profiles, 'google-chrome.google-chrome')['name'], 'browser_editor')
+        self.assertIsNone(match_profile(profiles, 'slack.exe|chrome_widgetwin_1'))
+
+    def test_builtin_paste_keys_are_opt_in(self):
+        terminal = match_profile(profiles_from_config({}), 'xterm.xterm')
+        self.assertIsNone(terminal['use_ctrl_v'])
+        self.assertAlmostEqual(terminal['paste_settle_s'], 0.1)
+        terminal = match_profile(profiles_from_config({'app_profiles_builtin_paste_keys': True}), 'xterm.xterm')
+        self.assertFalse(terminal['use_ctrl_v'])
+
+    def test_foreground_is_cached(self):
+        now = [0.0]
+        apps = iter(['a', 'b'])
+        tracker = ForegroundTracker(probe=lambda: next(apps), ttl_s=0.5, now=lambda: now[0])
+        self.assertEqual(tracker.current(), 'a')
+        now[0] = 0.4
+        self.assertEqual(tracker.current(), 'a')
+        now[0] = 0.6
+        self.assertEqual(tracker.current(), 'b')
+        self.assertEqual(tracker.lookups, 2)
+
+    def test_learning_only_shortens(self):
+        app_profiles = AppProfiles(ForegroundTracker(probe=lambda: 'navigator.firefox'))
+        profiles = profiles_from_config({})
+        for _ in range(2):
+            app_profiles.record_consumed('navigator.firefox', 0.01)
+        self.assertFalse(app_profiles.resolve(profiles, False, 'paste').learned)
+        app_profiles.record_consumed('navigator.firefox', 0.01)
+        settings = app_profiles.resolve(profiles, False, 'paste')
+        self.assertTrue(settings.learned)
+        self.assertFalse(settings.use_ctrl_v)
+        self.assertAlmostEqual(settings.restore_settle_s, 0.03)
+        self.assertAlmostEqual(settings.segment_delay_s, 0.015)
+        self.assertFalse(app_profiles.resolve(profiles, False, 'paste', learning=False).learned)
+
+    def test_learning_stays_above_profile_settle(self):
+        app_profiles = AppProfiles(ForegroundTracker(probe=lambda: 'xterm.xterm'))
+        for _ in range(3):
+            app_profiles.record_consumed('xterm.xterm', 0.001)
+        settings = app_profiles.resolve(profiles_from_config({}), False, 'paste')
+        # Terminal profile: paste settle 100 ms, restore 150 ms
+        self.assertAlmostEqual(settings.restore_settle_s, 0.1)
+        self.assertAlmostEqual(settings.segment_delay_s, 0.05)
+
+
+class ProfileExecutionTests(unittest.TestCase):
+    def setUp(self):
+        self.backend = RecordingBackend(clipboard='orig', observe_paste=True)
+        self._previous_backend = set_backend(self.backend)
+        self.clock = VirtualClock()
+        self._previous_clock = set_clock(self.clock)
+        self.restorer = DeferredRestore(submit=lambda fn, *args: None)
+        self._previous_restorer = set_restorer(self.restorer)
+        self.app = 'xterm.xterm'
+        self.app_profiles = AppProfiles(ForegroundTracker(probe=lambda: self.app, ttl_s=0))
+        self._previous_profiles = set_app_profiles(self.app_profiles)
+        cache = RuleSetCache(loader=lambda: _CONFIG, version_fn=lambda: 0)
+        self._cache_patch = mock.patch.object(keyword_pipeline, '_rule_set_cache', cache)
+        self._cache_patch.start()
+
+    def tearDown(self):
+        self._cache_patch.stop()
+        self.restorer.flush()
+        set_app_profiles(self._previous_profiles)
+        set_restorer(self._previous_restorer)
+        set_clock(self._previous_clock)
+        set_backend(self._previous_backend)
+
+    def _chords(self):
+        return [tuple(e['keys']) for e in self.backend.events if e['kind'] == 'chord']
+
+    def test_terminal_profile_overrides_paste_method(self):
+        self.assertTrue(keyword_pipeline.execute_typed_text('a换行b'))
+        self.assertEqual(self._chords(), [('shift', 'insert'), ('enter',), ('shift', 'insert')])
+        self.app = 'navigator.firefox'
+        self.backend.clear()
+        keyword_pipeline.execute_typed_text('c')
+        self.assertEqual(self._chords(), [('ctrl', 'v')])
+
+    def test_profile_commit_mode_and_plan_timings(self):
+        self.app = 'slowapp'
+        keyword_pipeline.execute_typed_text('hi')
+        self.assertEqual(self.backend.kinds(), ['commit_text'])
+        self.app = 'konsole.konsole'
+        plan = keyword_pipeline.plan_typed_text('a换行b')
+        self.assertEqual([op['seconds'] for op in plan.ops if op['op'] == 'delay'], [0.05, 0.05])
+
+    def test_consumed_pastes_are_learned(self):
+        # No profile matches: the learned bound may go down to LEARN_FLOOR_S
+        self.app = 'someapp.someapp'
+        # The gap after the first paste of each run waits on (and samples) the read; the last
+        # paste is sampled in the background, so only the first three runs are guaranteed
+        for _ in range(4):
+            keyword_pipeline.execute_typed_text('a换行b')
+        learned = self.app_profiles.stats()['learned']
+        self.assertGreaterEqual(learned['someapp.someapp']['samples'], 4)
+        # Gaps after a paste end as soon as the (fake) target reads the clipboard; only the
+        # gap after each Enter is slept, and the last run uses the learned (shorter) bound
+        self.assertEqual(len(self.clock.sleeps), 4)
+        self.assertEqual(self.clock.sleeps[0], 0.03)
+        self.assertEqual(self.clock.sleeps[-1], 0.02)
+        self.assertTrue(self.app_profiles.resolve(profiles_from_config(_CONFIG), False, 'paste').learned)
+
+    def test_clipboard_manager_reads_are_not_learned(self):
+        self.app = 'someapp.someapp'
+        consumed = keyboard.paste_consumed_probe(self.app_profiles.resolve([], False, 'paste').on_consumed)
+        self.backend.simulate_read('manager')
+        self.assertFalse(consumed())
+        self.assertEqual(self.app_profiles.stats()['learned'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
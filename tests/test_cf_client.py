@@ -0,0 +1,69 @@
+"""Tests for the CF crypto session (cipher reuse, replay rejection, batch decryption) and reconnect backoff."""
+import json
+import random
+import sys
+import unittest
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.cf_client import CF_AVAILABLE, Backoff, CryptoSession, ReplayError, decrypt_message, derive_key_and_room
+
+
+def _frame(session, text):
+    iv, data = session.encrypt(text)
+    return json.dumps({'type': 'text', 'iv': iv, 'data': data})
+
+
+@unittest.skipUnless(CF_AVAILABLE, 'websockets / cryptography not installed')
+class CryptoSessionTests(unittest.TestCase):
+    def setUp(self):
+        self.phone = CryptoSession('pw')
+        self.session = CryptoSession('pw')
+
+    def test_compatible_with_per_message_decrypt(self):
+        self.assertEqual((self.session.key, self.session.room_id), derive_key_and_room('pw'))
+        iv, data = self.phone.encrypt('你好')
+        self.assertEqual(decrypt_message(self.session.key, iv, data), '你好')
+        self.assertEqual(self.session.decrypt(iv, data), '你好')
+
+    def test_replay_is_rejected(self):
+        raw = _frame(self.phone, 'once')
+        self.assertEqual(self.session.decrypt_frame(raw), 'once')
+        with self.assertRaises(ReplayError):
+            self.session.decrypt_frame(raw)
+        self.assertEqual(self.session.stats()['replayed'], 1)
+
+    def test_replay_window_is_bounded(self):
+        session = CryptoSession('pw', replay_window=2)
+        frames = [_frame(self.phone, str(i)) for i in range(3)]
+        self.assertEqual(session.decrypt_batch(frames), ['0', '1', '2'])
+        self.assertEqual(session.stats()['remembered_ivs'], 2)
+        # The oldest IV was forgotten
+        self.assertEqual(session.decrypt_frame(frames[0]), '0')
+
+    def test_batch_skips_bad_frames(self):
+        other = CryptoSession('other')
+        good = _frame(self.phone, 'a')
+        frames = [good, json.dumps({'type': 'join'}), _frame(other, 'x'), good, _frame(self.phone, 'b')]
+        self.assertEqual(self.session.decrypt_batch(frames), ['a', 'b'])
+        stats = self.session.stats()
+        self.assertEqual((stats['decrypted'], stats['ignored'], stats['failed'], stats['replayed']), (2, 1, 1, 1))
+
+
+class BackoffTests(unittest.TestCase):
+    def test_fast_first_retry_then_jittered_exponential(self):
+        backoff = Backoff(first_s=0.1, base_s=1.0, max_s=8.0, rng=random.Random(3))
+        delays = [backoff.next_delay() for _ in range(7)]
+        self.assertEqual(delays[0], 0.1)
+        for n, delay in enumerate(delays[1:]):
+            ceiling = min(8.0, 2 ** n)
+            self.assertTrue(ceiling / 2 <= delay <= ceiling, (n, delay))
+        backoff.reset()
+        self.assertEqual(backoff.next_delay(), 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Tests for CF message numbering and non-blocking, in-order delivery to the injection worker."""
+import base64
+import json
+import os
+import sys
+import time
+import unittest
+from concurrent.futures import Future
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.cf_client import CF_AVAILABLE, CFChatClient, derive_key_and_room
+from src.cf_delivery import CFDelivery
+from src.injection_worker import QueueFullError
+
+
+class FakeJob:
+    def __init__(self, text):
+        self.text = text
+        self.future = Future()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def latency(self):
+        return {}
+
+
+class FakeWorker:
+    def __init__(self):
+        self.jobs = []
+        self.full = False
+
+    def submit_text(self, text):
+        if self.full:
+            raise QueueFullError()
+        job = FakeJob(text)
+        self.jobs.append(job)
+        return job
+
+    def finish_all(self):
+        for job in self.jobs:
+            if not job.future.done():
+                job.future.set_result(True)
+
+
+class CFDeliveryTests(unittest.TestCase):
+    def setUp(self):
+        self.worker = FakeWorker()
+        self.delivered = []
+        self.delivery = CFDelivery(on_delivered=lambda seq, text, result: self.delivered.append((seq, result)),
+                                   max_backlog=2, retry_s=0.01, worker_fn=lambda: self.worker)
+
+    def tearDown(self):
+        self.delivery.stop()
+
+    def _queued(self):
+        return [job.text for job in self.worker.jobs]
+
+    def _wait_for(self, predicate):
+        for _ in range(200):
+            if predicate():
+                return
+            time.sleep(0.01)
+        self.fail('timed out')
+
+    def test_deliver_returns_before_paste(self):
+        self.delivery.deliver(1, 'a')
+        self.delivery.deliver(2, 'b')
+        self.assertEqual(self._queued(), ['a', 'b'])
+        self.assertEqual(self.delivered, [])
+        self.worker.finish_all()
+        self.assertEqual([seq for seq, result in self.delivered if result['success']], [1, 2])
+
+    def test_queue_full_is_retried_in_order(self):
+        self.delivery.deliver(1, 'a')
+        self.worker.full = True
+        self.delivery.deliver(2, 'b')
+        self.delivery.deliver(3, 'c')
+        self.delivery.deliver(4, 'd')
+        self.assertEqual(self.delivered, [(4, {'success': False, 'error': 'Backlog full', 'dropped': True})])
+        self.worker.full = False
+        self._wait_for(lambda: len(self.worker.jobs) == 3)
+        self.delivery.deliver(5, 'e')
+        self.assertEqual(self._queued(), ['a', 'b', 'c', 'e'])
+        stats = self.delivery.stats()
+        self.assertEqual((stats['dropped'], stats['backlog']), (1, 0))
+
+
+@unittest.skipUnless(CF_AVAILABLE, 'websockets / cryptography not installed')
+class CFChatClientTests(unittest.TestCase):
+    def test_messages_are_numbered_in_receive_order(self):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        received = []
+        client = CFChatClient('https://example.invalid', 'pw', on_message=lambda text, seq: received.append((seq, text)))
+        key, _ = derive_key_and_room('pw')
+        for text in ('一', 'two'):
+            iv = os.urandom(12)
+            data = AESGCM(key).encrypt(iv, text.encode('utf-8'), None)
+            client._handle_message(json.dumps({'type': 'text', 'iv': base64.b64encode(iv).decode(),
+                                               'data': base64.b64encode(data).decode()}))
+        client._handle_message(json.dumps({'type': 'join'}))
+        self.assertEqual(received, [(1, '一'), (2, 'two')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests for the binary CF frame format: packing, fragmentation, compression and decryption."""
+import json
+import random
+import sys
+import unittest
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.cf_client import CF_AVAILABLE, CryptoSession, ReplayError
+from src.cf_frames import (FLAG_DEFLATE, FLAG_FRAGMENT, FrameError, Reassembler, accepts_binary, deflate, hello,
+                           inflate, pack)
+
+
+class FrameTests(unittest.TestCase):
+    def test_small_body_is_one_frame(self):
+        frames = pack(b'body', FLAG_DEFLATE)
+        self.assertEqual(frames, [b'\x01\x01body'])
+        self.assertEqual(Reassembler().feed(frames[0]), (FLAG_DEFLATE, b'body'))
+
+    def test_fragments_reassemble_in_any_order_and_interleaved(self):
+        body_a, body_b = bytes(range(256)) * 4, b'b' * 300
+        frames_a = pack(body_a, 0, max_frame=100, message_id=1)
+        frames_b = pack(body_b, 0, max_frame=100, message_id=2)
+        self.assertTrue(all(len(f) <= 100 and f[1] & FLAG_FRAGMENT for f in frames_a))
+        mixed = frames_a[::-1] + frames_b
+        random.Random(5).shuffle(mixed)
+        reassembler = Reassembler()
+        done = [m for m in map(reassembler.feed, mixed) if m is not None]
+        self.assertEqual(sorted(done, key=lambda m: len(m[1])), [(0, body_b), (0, body_a)])
+        self.assertEqual(reassembler.stats()['pending'], 0)
+
+    def test_limits(self):
+        reassembler = Reassembler(max_pending=1, max_bytes=150)
+        reassembler.feed(pack(b'x' * 100, 0, max_frame=50, message_id=1)[0])
+        reassembler.feed(pack(b'x' * 100, 0, max_frame=50, message_id=2)[0])
+        self.assertEqual(reassembler.stats()['evicted'], 1)
+        with self.assertRaises(FrameError):
+            for frame in pack(b'x' * 200, 0, max_frame=50, message_id=3):
+                reassembler.feed(frame)
+        with self.assertRaises(FrameError):
+            reassembler.feed(b'\x02\x00body')
+        with self.assertRaises(FrameError):
+            inflate(deflate(b'a' * 1000), limit=100)
+
+    def test_hello(self):
+        payload = json.loads(hello(reply=True))
+        self.assertTrue(accepts_binary(payload) and payload['reply'])
+        self.assertFalse(accepts_binary({'type': 'hello', 'versions': [7]}))
+
+
+@unittest.skipUnless(CF_AVAILABLE, 'websockets / cryptography not installed')
+class BinarySessionTests(unittest.TestCase):
+    def setUp(self):
+        self.phone = CryptoSession('pw')
+        self.session = CryptoSession('pw')
+
+    def test_short_text_is_sent_uncompressed(self):
+        frames = self.phone.encrypt_binary('你好')
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0][1], 0)
+        # 2 header + 12 nonce + 6 text + 16 tag
+        self.assertEqual(len(frames[0]), 36)
+        self.assertEqual(self.session.decrypt_frame(frames[0]), '你好')
+
+    def test_long_text_is_compressed_and_fragmented(self):
+        rng = random.Random(1)
+        text = ''.join(rng.choice('今天的会议记录如下我们讨论了三个问题。') for _ in range(20000))
+        frames = self.phone.encrypt_binary(text, max_frame=1024)
+        self.assertGreater(len(frames), 1)
+        self.assertTrue(frames[0][1] & FLAG_DEFLATE)
+        self.assertLess(sum(map(len, frames)), len(text.encode('utf-8')) // 2)
+        self.assertEqual(self.session.decrypt_batch(frames), [text])
+        self.assertEqual(self.session.stats()['binary'], 1)
+
+    def test_replayed_binary_frame_is_rejected(self):
+        frame, = self.phone.encrypt_binary('once')
+        self.assertEqual(self.session.decrypt_frame(frame), 'once')
+        with self.assertRaises(ReplayError):
+            self.session.decrypt_frame(frame)
+
+    def test_header_is_authenticated(self):
+        frame, = self.phone.encrypt_binary('x' * 1000)
+        tampered = frame[:1] + bytes([frame[1] & ~FLAG_DEFLATE]) + frame[2:]
+        with self.assertRaises(Exception):
+            self.session.decrypt_frame(tampered)
+        self.assertEqual(self.session.stats()['failed'], 1)
+        self.assertEqual(self.session.decrypt_frame(frame), 'x' * 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
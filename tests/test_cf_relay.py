@@ -0,0 +1,129 @@
+"""Tests for the local stand-in CF relay (forwarding, dropped frames, forced disconnects) and CF client liveness."""
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.cf_client import CF_AVAILABLE, CFChatClient
+
+if CF_AVAILABLE:
+    from src.cf_relay import LocalRelay
+
+
+@unittest.skipUnless(CF_AVAILABLE, 'websockets / cryptography not installed')
+class LocalRelayTests(unittest.TestCase):
+    def _start(self, heartbeat_s=10.0, dead_after_s=20.0, **relay_kwargs):
+        self.relay = LocalRelay(**relay_kwargs).start()
+        self.addCleanup(self.relay.stop)
+        self.received = []
+        self.connected = threading.Event()
+        self.client = CFChatClient(self.relay.url, 'pw', on_message=lambda text, seq: self.received.append((seq, text)),
+                                   on_status=lambda state, text: state == 'connected' and self.connected.set(),
+                                   heartbeat_s=heartbeat_s, dead_after_s=dead_after_s)
+        self.client.start()
+        self.addCleanup(self.client.stop)
+        self._wait_for(lambda: self.relay.members(self.client.room_id) == 1)
+
+    def _wait_for(self, predicate, timeout=10.0):
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            if time.perf_counter() > deadline:
+                self.fail('timed out')
+            time.sleep(0.01)
+
+    def test_frames_are_forwarded_in_order_despite_jitter(self):
+        self._start(latency_s=0.005, jitter_s=0.02, seed=1)
+        # A phone page that only knows the JSON envelope: no hello frames either way
+        phone = self.relay.phone('pw', binary=False)
+        for n in range(20):
+            phone.send(f'msg {n}')
+        self._wait_for(lambda: len(self.received) == 20)
+        self.assertEqual(self.received, [(n + 1, f'msg {n}') for n in range(20)])
+        self.assertEqual(self.relay.stats()['forwarded'], 20)
+        phone.close()
+
+    def test_pages_without_hello_never_receive_one(self):
+        self._start()
+        phone = self.relay.phone('pw', binary=False)
+        # The client reconnects while the old page stays: still nothing sent its way
+        self.connected.clear()
+        self.assertEqual(self.relay.disconnect_all(refuse_s=0.0), 2)
+        self.assertTrue(self.connected.wait(15))
+        self._wait_for(lambda: self.relay.members(self.client.room_id) == 1)
+        phone.send('after reconnect')
+        self._wait_for(lambda: self.received)
+        self.assertEqual(phone.received, 0)
+        self.assertEqual(self.relay.stats()['forwarded'], 1)
+
+    def test_other_rooms_do_not_receive(self):
+        self._start()
+        self.relay.phone('another password').send('secret')
+        self.relay.phone('pw').send('hello')
+        self._wait_for(lambda: self.received)
+        time.sleep(0.05)
+        self.assertEqual(self.received, [(1, 'hello')])
+
+    def test_drop_rate_one_drops_every_frame(self):
+        self._start(drop_rate=1.0)
+        phone = self.relay.phone('pw')
+        for n in range(5):
+            phone.send(f'msg {n}')
+        self._wait_for(lambda: self.relay.stats()['dropped'] == 5)
+        time.sleep(0.05)
+        self.assertEqual(self.received, [])
+
+    def test_client_and_phone_reconnect_after_disconnect_all(self):
+        self._start()
+        phone = self.relay.phone('pw')
+        self.connected.clear()
+        self.assertEqual(self.relay.disconnect_all(refuse_s=0.1), 2)
+        self.assertTrue(self.connected.wait(15))
+        self._wait_for(lambda: self.relay.members(self.client.room_id) == 1)
+        phone.send('after restart')
+        self._wait_for(lambda: self.received)
+        self.assertEqual(self.received, [(1, 'after restart')])
+        self.assertEqual(phone.reconnects, 1)
+        self.assertEqual(self.client.stats()['reconnects'], 1)
+
+    def test_phone_switches_to_binary_frames_after_hello(self):
+        self._start()
+        phone = self.relay.phone('pw')
+        self._wait_for(lambda: phone.peer_binary)
+        text = '一段很长的语音输入。' * 500
+        phone.send('short')
+        phone.send(text)
+        self._wait_for(lambda: len(self.received) == 2)
+        self.assertEqual(self.received, [(1, 'short'), (2, text)])
+        stats = self.client.stats()
+        self.assertEqual((stats['binary_peers'], stats['session']['binary']), (1, 2))
+        # Compressed: far fewer bytes than the text, hellos included
+        self.assertLess(self.relay.stats()['forwarded_bytes'], len(text.encode('utf-8')) // 5)
+
+    def test_heartbeat_measures_rtt(self):
+        self._start(heartbeat_s=0.02)
+        self._wait_for(lambda: self.client.stats()['heartbeats'] >= 3)
+        stats = self.client.stats()
+        self.assertTrue(stats['connected'])
+        self.assertGreater(stats['rtt_avg_ms'], 0)
+        self.assertEqual(stats['reconnects'], 0)
+
+    def test_half_open_connection_is_detected_and_replaced(self):
+        self._start(heartbeat_s=0.05, dead_after_s=0.2)
+        self.connected.clear()
+        self.assertEqual(self.relay.stall(), 1)
+        self.assertTrue(self.connected.wait(5))
+        self._wait_for(lambda: self.relay.members(self.client.room_id) == 1)
+        self.relay.phone('pw').send('still here')
+        self._wait_for(lambda: self.received)
+        self.assertEqual(self.received, [(1, 'still here')])
+        stats = self.client.stats()
+        self.assertEqual((stats['dead_peers'], stats['reconnects']), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
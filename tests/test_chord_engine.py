@@ -0,0 +1,65 @@
+"""Tests for the Win32 chord engine (scan codes and SendInput are faked)."""
+import sys
+import unittest
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.chord_engine import VIRTUAL_KEYS, ChordEngine
+from src.keyboard import HOTKEY_KEY_WHITELIST
+from src.keyword_pipeline import validate_keyword_actions
+from src.utils import KEYEVENTF_EXTENDEDKEY, KEYEVENTF_KEYUP, KEYEVENTF_SCANCODE
+
+
+class _FakeSendInput:
+    def __init__(self, results):
+        self.results = list(results)
+        self.batches = []
+
+    def __call__(self, inputs):
+        self.batches.append([(i.union.ki.wVk, i.union.ki.wScan, i.union.ki.dwFlags) for i in inputs])
+        return self.results.pop(0)
+
+
+class ChordEngineTests(unittest.TestCase):
+    def _engine(self, *results):
+        self.sent = _FakeSendInput(results or [True])
+        return ChordEngine(scan_fn=lambda vk: vk + 0x100, send_fn=self.sent)
+
+    def test_whitelist_fully_covered(self):
+        engine = self._engine()
+        self.assertTrue(all(k in engine.table for k in HOTKEY_KEY_WHITELIST if k != 'return'))
+        for token in (',', '/', 'num5', 'divide', 'pageup', 'f13', 'apps'):
+            self.assertIn(token, HOTKEY_KEY_WHITELIST)
+
+    def test_chord_is_one_batch_released_in_reverse(self):
+        engine = self._engine()
+        self.assertTrue(engine.send(['ctrl', 'shift', 'left']))
+        self.assertEqual(len(self.sent.batches), 1)
+        vks = [(vk, bool(flags & KEYEVENTF_KEYUP)) for vk, _, flags in self.sent.batches[0]]
+        self.assertEqual(vks, [(0x11, False), (0x10, False), (0x25, False),
+                               (0x25, True), (0x10, True), (0x11, True)])
+        left = self.sent.batches[0][2]
+        self.assertEqual(left[1], 0x25 + 0x100)
+        self.assertEqual(left[2], KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY)
+
+    def test_short_injection_releases_modifiers(self):
+        engine = self._engine(False, True)
+        self.assertFalse(engine.send(['ctrl', 'z']))
+        released = self.sent.batches[1]
+        self.assertEqual([vk for vk, _, _ in released], [VIRTUAL_KEYS['z'][0], 0x11])
+        self.assertTrue(all(flags & KEYEVENTF_KEYUP for _, _, flags in released))
+
+    def test_keyword_rules_accept_new_keys(self):
+        rules = validate_keyword_actions([
+            {'keyword': '逗号', 'keys': [',']},
+            {'keyword': '小键盘', 'keys': ['num1']},
+            {'keyword': '翻页', 'keys': ['ctrl', 'pagedown']},
+        ])
+        self.assertEqual(len(rules), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,295 @@
+"""Tests for clipboard provider selection and the X11 selection-request handler.
+
+Only X11ConcurrencyTests needs an X server (a private Xvfb); the rest use fakes.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src import clipboard
+from src.x11_clipboard import X11ClipboardError, X11SelectionOwner, encode_for_target
+
+try:
+    import Xlib  # noqa: F401
+    XLIB_AVAILABLE = True
+except ImportError:
+    XLIB_AVAILABLE = False
+
+
+def _start_xvfb():
+    """A private Xvfb on a display number it picks itself; (process, display name)."""
+    read_fd, write_fd = os.pipe()
+    proc = subprocess.Popen(['Xvfb', '-displayfd', str(write_fd), '-nolisten', 'tcp'], pass_fds=(write_fd,),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        number = f.readline().strip()
+    if not number:
+        proc.kill()
+        raise RuntimeError("Xvfb did not start")
+    return proc, f':{number}'
+
+
+class _FakeProvider:
+    def __init__(self, fail=False):
+        self.text = ''
+        self.fail = fail
+
+    def set(self, text):
+        if self.fail:
+            raise X11ClipboardError('nope')
+        self.text = text
+
+    def get(self):
+        if self.fail:
+            raise X11ClipboardError('nope')
+        return self.text
+
+
+class ClipboardProviderTests(unittest.TestCase):
+    def _patch(self, provider, unavailable=False):
+        patches = [
+            mock.patch.object(clipboard, '_x11', provider),
+            mock.patch.object(clipboard, '_x11_unavailable', unavailable),
+            mock.patch.object(clipboard, 'CLIPMAN_AVAILABLE', False),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_x11_provider_used_without_spawning(self):
+        provider = _FakeProvider()
+        self._patch(provider)
+        with mock.patch.object(clipboard.pyperclip, 'copy') as copy:
+            clipboard.clipboard_set('你好')
+            self.assertEqual(clipboard.clipboard_get(), '你好')
+        copy.assert_not_called()
+
+    def test_falls_back_to_pyperclip(self):
+        self._patch(_FakeProvider(fail=True))
+        with mock.patch.object(clipboard.pyperclip, 'copy') as copy, \
+                mock.patch.object(clipboard.pyperclip, 'paste', return_value='p'):
+            clipboard.clipboard_set('x')
+            self.assertEqual(clipboard.clipboard_get(), 'p')
+        copy.assert_called_once_with('x')
+
+    def test_no_display_disables_x11(self):
+        with mock.patch.object(clipboard, '_x11', None), \
+                mock.patch.object(clipboard, '_x11_unavailable', False), \
+                mock.patch.object(clipboard, 'IS_WINDOWS', False), \
+                mock.patch.object(clipboard, 'IS_MAC', False), \
+                mock.patch.dict('os.environ', {}, clear=True):
+            self.assertIsNone(clipboard._x11_provider())
+            self.assertTrue(clipboard._x11_unavailable)
+
+    def test_clipman_initialized_once(self):
+        fake = mock.Mock()
+        fake.get.return_value = 'c'
+        self._patch(None, unavailable=True)
+        with mock.patch.object(clipboard, 'CLIPMAN_AVAILABLE', True), \
+                mock.patch.object(clipboard, 'clipman', fake, create=True), \
+                mock.patch.object(clipboard, '_clipman_ready', False):
+            clipboard.clipboard_set('a')
+            clipboard.clipboard_get()
+            clipboard.clipboard_set('b')
+        self.assertEqual(fake.init.call_count, 1)
+
+
+class _FakeOwner:
+    def __init__(self, saves):
+        self.owned = True
+        self.write_seq = 1
+        self.saves = saves
+        self.handoffs = 0
+
+    def get(self):
+        return 'restored'
+
+    def handoff(self):
+        self.handoffs += 1
+        return self.saves
+
+
+class ClipboardHandoffTests(unittest.TestCase):
+    def _patch(self, owner):
+        for p in (mock.patch.object(clipboard, '_x11', owner), mock.patch.object(clipboard, '_handed_off_seq', None)):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_clipboard_manager_saves_once(self):
+        owner = _FakeOwner(saves=True)
+        self._patch(owner)
+        with mock.patch.object(clipboard.subprocess, 'Popen') as popen:
+            self.assertTrue(clipboard.clipboard_handoff())
+            self.assertTrue(clipboard.clipboard_handoff())
+        self.assertEqual(owner.handoffs, 1)
+        popen.assert_not_called()
+
+    def test_falls_back_to_detached_xclip(self):
+        self._patch(_FakeOwner(saves=False))
+        with mock.patch.object(clipboard.shutil, 'which', side_effect=lambda name: name == 'xclip' and '/usr/bin/xclip'), \
+                mock.patch.object(clipboard.subprocess, 'Popen') as popen:
+            self.assertTrue(clipboard.clipboard_handoff())
+        self.assertEqual(popen.call_args[0][0][0], 'xclip')
+        self.assertTrue(popen.call_args[1]['start_new_session'])
+        popen.return_value.communicate.assert_called_once_with(b'restored', timeout=2.0)
+
+    def test_nothing_to_hand_off(self):
+        owner = _FakeOwner(saves=False)
+        owner.owned = False
+        self._patch(owner)
+        self.assertTrue(clipboard.clipboard_handoff())
+        self.assertEqual(owner.handoffs, 0)
+
+
+class SelectionRequestTests(unittest.TestCase):
+    """Drive X11SelectionOwner._answer with fake Xlib objects."""
+
+    ATOMS = {'CLIPBOARD': 1, 'TARGETS': 2, 'INCR': 3, 'AIRTYPE_SELECTION': 4,
+             'UTF8_STRING': 5, 'text/plain;charset=utf-8': 6, 'TEXT': 7, 'STRING': 8,
+             'CLIPBOARD_MANAGER': 9, 'SAVE_TARGETS': 10}
+
+    def _owner(self, text):
+        owner = X11SelectionOwner.__new__(X11SelectionOwner)
+        owner._X = SimpleNamespace(NONE=0)
+        owner._Xatom = SimpleNamespace(ATOM=40)
+        owner._event = SimpleNamespace(SelectionNotify=lambda **kw: kw)
+        owner._d = mock.Mock()
+        owner._window = mock.Mock()
+        owner._atoms = dict(self.ATOMS)
+        owner._names = {v: k for k, v in self.ATOMS.items()}
+        owner._lock = mock.MagicMock()
+        owner._text = text
+        owner._owned = text is not None
+        owner._stats = {'sets': 0, 'served': 0, 'reads': 0, 'refused': 0}
+        owner._client_mask = ~0x1FFFFF
+        owner._client_reads = {}
+        return owner
+
+    def _request(self, target, prop=99, selection=1, requestor=0x1200005):
+        return SimpleNamespace(time=0, requestor=mock.Mock(id=requestor), selection=selection, target=target,
+                               property=prop)
+
+    def test_utf8_request(self):
+        owner = self._owner('你好')
+        ev = self._request(self.ATOMS['UTF8_STRING'])
+        owner._answer(ev)
+        ev.requestor.change_property.assert_called_once_with(99, 5, 8, '你好'.encode('utf-8'))
+        notify = ev.requestor.send_event.call_args[0][0]
+        self.assertEqual(notify['property'], 99)
+        self.assertEqual(owner.read_seq, 1)
+
+    def test_targets_request(self):
+        owner = self._owner('x')
+        ev = self._request(self.ATOMS['TARGETS'])
+        owner._answer(ev)
+        args = ev.requestor.change_property.call_args[0]
+        self.assertEqual(args[1:3], (40, 32))
+        self.assertIn(self.ATOMS['UTF8_STRING'], args[3])
+        # A TARGETS query is not a read of the text
+        self.assertEqual(owner.read_seq, 0)
+
+    def test_reads_are_counted_per_client(self):
+        owner = self._owner('x')
+        owner._X.PointerRoot = 1
+        owner._d.get_input_focus.return_value = SimpleNamespace(focus=SimpleNamespace(id=0x1200009))
+        target = owner.focused_client()
+        # A clipboard manager (another client) reads first, then the focused window's client
+        owner._answer(self._request(self.ATOMS['UTF8_STRING'], requestor=0x0400003))
+        self.assertEqual((owner.read_seq, owner.reads_by(target)), (1, 0))
+        owner._answer(self._request(self.ATOMS['UTF8_STRING'], requestor=0x1200005))
+        self.assertEqual((owner.read_seq, owner.reads_by(target)), (2, 1))
+        owner._d.get_input_focus.return_value = SimpleNamespace(focus=1)
+        self.assertIsNone(owner.focused_client())
+
+    def test_refuses_when_not_owner_or_unknown_target(self):
+        for text, target in ((None, 5), ('x', 123)):
+            owner = self._owner(text)
+            ev = self._request(target)
+            owner._answer(ev)
+            ev.requestor.change_property.assert_not_called()
+            self.assertEqual(ev.requestor.send_event.call_args[0][0]['property'], 0)
+            self.assertEqual(owner._stats['refused'], 1)
+
+    def test_handoff_to_clipboard_manager(self):
+        owner = self._owner('x')
+        owner._d.get_selection_owner.return_value = SimpleNamespace(id=0)
+        self.assertFalse(owner.handoff())
+        owner._d.get_selection_owner.return_value = SimpleNamespace(id=77)
+        with mock.patch.object(owner, '_request', return_value=SimpleNamespace(property=4)) as request:
+            self.assertTrue(owner.handoff())
+        self.assertEqual(request.call_args[0][:3], (9, 10, 4))
+        targets = owner._window.change_property.call_args[0][3]
+        self.assertEqual(targets, [5, 6, 7, 8])
+        with mock.patch.object(owner, '_request', return_value=SimpleNamespace(property=0)):
+            self.assertFalse(owner.handoff())
+
+    def test_encode_for_target(self):
+        self.assertEqual(encode_for_target('é', 'STRING'), (b'\xe9', 'STRING'))
+        self.assertEqual(encode_for_target('é', 'TEXT'), ('é'.encode('utf-8'), 'UTF8_STRING'))
+        self.assertIsNone(encode_for_target('é', 'image/png'))
+
+
+@unittest.skipUnless(XLIB_AVAILABLE and shutil.which('Xvfb'), 'python-xlib / Xvfb not installed')
+class X11ConcurrencyTests(unittest.TestCase):
+    """Requests from several threads on the owner's connection while its thread serves events."""
+
+    def setUp(self):
+        self.xvfb, display_name = _start_xvfb()
+        self.addCleanup(self.xvfb.wait, 5)
+        self.addCleanup(self.xvfb.terminate)
+        self.owner = X11SelectionOwner(display_name)
+        self.addCleanup(self.owner.close)
+        # A second connection reads the clipboard like any other application
+        self.reader = X11SelectionOwner(display_name)
+        self.addCleanup(self.reader.close)
+
+    def test_set_get_and_focus_from_several_threads(self):
+        texts = [f'第{i}段 text {i}' for i in range(200)]
+        self.owner.set(texts[0])
+        errors = []
+
+        def writer():
+            for text in texts:
+                self.owner.set(text)
+
+        def reader():
+            for _ in range(200):
+                got = self.reader.get()
+                if got not in texts:
+                    raise AssertionError(f'read {got!r}')
+
+        def prober():
+            for _ in range(500):
+                self.owner.focused_client()
+                self.owner.get()
+
+        def run(fn):
+            try:
+                fn()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(fn,)) for fn in (writer, reader, prober)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(60)
+        self.assertEqual(errors, [])
+        self.assertTrue(self.owner._thread.is_alive())
+        self.assertEqual(self.reader.get(), texts[-1])
+        self.assertGreaterEqual(self.owner.stats()['reads'], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Tests for deferred, per-burst clipboard restoration."""
+import sys
+import time
+import unittest
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.clipboard_restore import DeferredRestore, set_restorer
+from src.clock import VirtualClock, set_clock, track_latency
+from src.injection_backend import RecordingBackend, set_backend
+from src.keyboard import CONSUMED_FLOOR_S, PASTE_SETTLE_S, RESTORE_SETTLE_S, paste_consumed_probe, paste_text
+
+
+class DeferredRestoreTests(unittest.TestCase):
+    def setUp(self):
+        self.backend = RecordingBackend(clipboard='orig')
+        self._previous_backend = set_backend(self.backend)
+        self.clock = VirtualClock()
+        self._previous_clock = set_clock(self.clock)
+        self.submitted = []
+        self.restorer = DeferredRestore(submit=lambda fn, *args: self.submitted.append((fn, args)))
+        self._previous_restorer = set_restorer(self.restorer)
+
+    def tearDown(self):
+        self.restorer.flush()
+        set_restorer(self._previous_restorer)
+        set_clock(self._previous_clock)
+        set_backend(self._previous_backend)
+
+    def _clipboard_sets(self):
+        return [e['text'] for e in self.backend.events if e['kind'] == 'clipboard_set']
+
+    def _wait_for_timer(self, count=1):
+        deadline = time.monotonic() + 2
+        while len(self.submitted) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_paste_returns_before_restore(self):
+        paste_text('hello', preserve_clipboard=True)
+        self.assertEqual(self._clipboard_sets(), ['hello'])
+        # The request path no longer sleeps for the restore settle
+        self.assertNotIn(RESTORE_SETTLE_S, self.clock.sleeps)
+        self._wait_for_timer()
+        fn, args = self.submitted[0]
+        self.assertTrue(fn(*args))
+        self.assertEqual(self._clipboard_sets(), ['hello', 'orig'])
+
+    def test_burst_captures_once_and_restores_once(self):
+        for text in ('a', 'b', 'c'):
+            paste_text(text, preserve_clipboard=True)
+        self.assertEqual(self.backend.kinds().count('clipboard_get'), 1)
+        self._wait_for_timer()
+        time.sleep(RESTORE_SETTLE_S + 0.05)
+        # Earlier timers were cancelled; only the latest generation restores
+        self.assertEqual(len(self.submitted), 1)
+        fn, args = self.submitted[0]
+        fn(*args)
+        self.assertEqual(self._clipboard_sets(), ['a', 'b', 'c', 'orig'])
+        self.assertEqual(self.restorer.stats()['restores'], 1)
+
+    def test_stale_generation_does_not_restore(self):
+        self.restorer.capture()
+        self.restorer.schedule(10)
+        self.restorer.schedule(10)
+        self.assertFalse(self.restorer.restore(generation=1))
+        self.assertTrue(self.restorer.restore(generation=2))
+        self.assertFalse(self.restorer.pending)
+
+    def test_non_preserving_paste_during_burst_keeps_restore(self):
+        paste_text('a', preserve_clipboard=True)
+        paste_text('b', preserve_clipboard=False)
+        self.assertEqual(self.backend.kinds().count('clipboard_get'), 1)
+        self.restorer.flush()
+        self.assertEqual(self._clipboard_sets(), ['a', 'b', 'orig'])
+
+
+class PasteCompletionTests(unittest.TestCase):
+    """Backends that can observe clipboard writes and reads end the settle waits early."""
+
+    def setUp(self):
+        self.backend = RecordingBackend(clipboard='orig', observe_paste=True)
+        self._previous_backend = set_backend(self.backend)
+        self.clock = VirtualClock()
+        self._previous_clock = set_clock(self.clock)
+        self.submitted = []
+        self.restorer = DeferredRestore(submit=lambda fn, *args: self.submitted.append((fn, args)))
+        self._previous_restorer = set_restorer(self.restorer)
+
+    def tearDown(self):
+        self.restorer.flush()
+        set_restorer(self._previous_restorer)
+        set_clock(self._previous_clock)
+        set_backend(self._previous_backend)
+
+    def test_visible_write_skips_paste_settle(self):
+        with track_latency() as report:
+            paste_text('hello')
+        self.assertEqual(self.clock.total_slept, 0)
+        stage = report.to_dict()['stages']['clipboard_visible']
+        self.assertEqual(stage['observed'], 1)
+        self.assertAlmostEqual(stage['saved_ms'], PASTE_SETTLE_S * 1000)
+
+    def test_unobservable_backend_keeps_fixed_settle(self):
+        set_backend(RecordingBackend())
+        with track_latency() as report:
+            paste_text('hello')
+        self.assertEqual(self.clock.sleeps, [PASTE_SETTLE_S])
+        self.assertEqual(report.to_dict()['stages']['clipboard_visible']['observed'], 0)
+
+    def test_restore_fires_once_paste_is_read(self):
+        t0 = time.monotonic()
+        paste_text('hello', preserve_clipboard=True)
+        deadline = time.monotonic() + 2
+        while not self.submitted and time.monotonic() < deadline:
+            time.sleep(0.001)
+        self.assertLess(time.monotonic() - t0, RESTORE_SETTLE_S)
+        self.assertEqual(self.restorer.stats()['early'], 1)
+
+    def test_clipboard_manager_read_is_not_the_paste(self):
+        learned = []
+        consumed = paste_consumed_probe(learned.append)
+        # A clipboard manager reads the new contents before the target gets to it
+        self.backend.simulate_read('manager')
+        self.assertFalse(consumed())
+        self.backend.simulate_read('target')
+        self.assertTrue(consumed())
+        self.assertEqual(len(learned), 1)
+
+    def test_unattributed_read_counts_only_after_floor(self):
+        learned = []
+        self.backend.clipboard_reader = lambda: None
+        consumed = paste_consumed_probe(learned.append)
+        self.backend.simulate_read('manager')
+        self.assertFalse(consumed())
+        time.sleep(CONSUMED_FLOOR_S)
+        self.assertTrue(consumed())
+        # Not known to be the target's read: nothing to learn from
+        self.assertEqual(learned, [])
+
+    def test_restore_waits_out_settle_when_unread(self):
+        self.restorer.capture()
+        t0 = time.monotonic()
+        self.restorer.schedule(0.05, ready=lambda: False)
+        deadline = time.monotonic() + 2
+        while not self.submitted and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertGreaterEqual(time.monotonic() - t0, 0.05)
+        self.assertEqual(self.restorer.stats()['early'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
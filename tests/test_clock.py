@@ -0,0 +1,78 @@
+"""Tests for the injectable clock and per-request latency reports."""
+import sys
+import time
+import unittest
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src import clock
+from src.clock import VirtualClock, delay, measure, set_clock, track_latency, wait_until
+
+
+class ClockTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self._previous = set_clock(self.clock)
+
+    def tearDown(self):
+        set_clock(self._previous)
+
+    def test_virtual_sleep_is_instant_and_recorded(self):
+        t0 = time.perf_counter()
+        for _ in range(50):
+            delay(0.1)
+        self.assertLess(time.perf_counter() - t0, 0.5)
+        self.assertAlmostEqual(self.clock.total_slept, 5.0)
+        self.assertAlmostEqual(self.clock.now(), 5.0)
+
+    def test_report_splits_categories(self):
+        with track_latency('x') as report:
+            with measure('clipboard'):
+                pass
+            with measure('inject'):
+                delay(0.05)  # sleeps inside an injection count as sleep, not inject
+            delay(0.02)
+        d = report.to_dict()
+        self.assertAlmostEqual(d['sleep_ms'], 70.0)
+        self.assertEqual(d['counts'], {'sleep': 2, 'clipboard': 1, 'inject': 1})
+        self.assertLess(d['inject_ms'], 5.0)
+        self.assertEqual(d['label'], 'x')
+        self.assertIs(clock.last_report(), report)
+
+    def test_no_report_outside_block(self):
+        self.assertIsNone(clock.current_report())
+        with measure('inject'):
+            delay(0.01)
+        self.assertIsNone(clock.current_report())
+
+    def test_nested_reports_restore_outer(self):
+        with track_latency() as outer:
+            with track_latency() as inner:
+                delay(0.01)
+            self.assertIs(clock.current_report(), outer)
+        self.assertEqual(outer.counts['sleep'], 0)
+        self.assertEqual(inner.counts['sleep'], 1)
+
+    def test_wait_until_ends_when_observed(self):
+        polls = []
+
+        def seen():
+            polls.append(self.clock.now())
+            return len(polls) > 3
+
+        with track_latency() as report:
+            self.assertTrue(wait_until(seen, 0.1, 'clipboard_visible'))
+            self.assertFalse(wait_until(lambda: False, 0.05, 'paste_consumed'))
+        self.assertAlmostEqual(self.clock.total_slept, 0.003 + 0.05)
+        stages = report.to_dict()['stages']
+        self.assertEqual(stages['clipboard_visible']['observed'], 1)
+        self.assertAlmostEqual(stages['clipboard_visible']['saved_ms'], 97.0)
+        self.assertEqual(stages['paste_consumed']['observed'], 0)
+        self.assertAlmostEqual(stages['paste_consumed']['waited_ms'], 50.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
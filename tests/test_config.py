@@ -0,0 +1,51 @@
+"""Tests for config version tracking (temporary config path, no real user config)."""
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src import config
+
+
+class ConfigVersionTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self._tmp.name, 'config.json')
+        self._patch = mock.patch.object(config, 'get_config_path', return_value=path)
+        self._patch.start()
+        self.path = path
+
+    def tearDown(self):
+        self._patch.stop()
+        self._tmp.cleanup()
+
+    def test_save_bumps_version(self):
+        before = config.get_config_version()
+        config.save_config({'use_ctrl_v': True})
+        self.assertGreater(config.get_config_version(), before)
+        self.assertEqual(config.load_config(), {'use_ctrl_v': True})
+
+    def test_own_save_not_reported_as_external_edit(self):
+        config.save_config({'a': 1})
+        self.assertFalse(config.poll_config_file())
+
+    def test_external_edit_detected_by_poll(self):
+        config.save_config({'a': 1})
+        before = config.get_config_version()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"a": 2}')
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000))
+        self.assertTrue(config.poll_config_file())
+        self.assertGreater(config.get_config_version(), before)
+        self.assertFalse(config.poll_config_file())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""Tests for the in-process event bus, its producers (injection worker, web routes) and /events."""
+import json
+import sys
+import unittest
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from flask import Flask
+
+from src.event_bus import DELIVERED, MUTE_STATE, PASTE_FAILED, QUEUE_DEPTH, TEXT_SENT, EventBus, set_bus
+from src.event_stream import EventStream, format_event
+from src.injection_worker import InjectionWorker
+from src.web_routes import note_sent_text, register_routes
+
+
+class EventBusTests(unittest.TestCase):
+    def setUp(self):
+        self.bus = EventBus()
+
+    def test_only_changes_are_delivered(self):
+        seen = []
+        unsubscribe = self.bus.subscribe(TEXT_SENT, seen.append)
+        self.assertTrue(self.bus.publish(TEXT_SENT, 'a'))
+        self.assertFalse(self.bus.publish(TEXT_SENT, 'a'))
+        self.bus.publish(TEXT_SENT, 'b')
+        self.bus.publish(TEXT_SENT, 'b', force=True)
+        unsubscribe()
+        self.bus.publish(TEXT_SENT, 'c')
+        self.assertEqual(seen, ['a', 'b', 'b'])
+        self.assertEqual(self.bus.latest(TEXT_SENT), 'c')
+        self.assertEqual(self.bus.stats()['dropped_unchanged'], 1)
+
+    def test_failing_subscriber_does_not_block_others(self):
+        seen = []
+        self.bus.subscribe(QUEUE_DEPTH, lambda value: 1 / 0)
+        self.bus.subscribe(QUEUE_DEPTH, seen.append)
+        self.bus.publish(QUEUE_DEPTH, 3)
+        self.assertEqual(seen, [3])
+        self.assertEqual(self.bus.stats()['callback_errors'], 1)
+
+
+class ProducerTests(unittest.TestCase):
+    def setUp(self):
+        self.bus = EventBus()
+        self._previous = set_bus(self.bus)
+        self.events = []
+        for topic in (TEXT_SENT, PASTE_FAILED, QUEUE_DEPTH):
+            self.bus.subscribe(topic, lambda value, topic=topic: self.events.append((topic, value)))
+
+    def tearDown(self):
+        set_bus(self._previous)
+
+    def test_worker_publishes_depth_and_failures(self):
+        worker = InjectionWorker()
+        worker.submit('text', lambda texts: False, ['x']).result()
+        worker.submit('ops', lambda: [{'op': 'enter', 'success': True}]).result()
+        worker.submit('restore', lambda: False).result()
+        worker.stop()
+        failures = [value for topic, value in self.events if topic == PASTE_FAILED]
+        self.assertEqual(failures, [{'kind': 'text', 'error': None}])
+        receipts = self.bus.latest(DELIVERED)
+        self.assertEqual((receipts['kind'], receipts['success'], receipts['jobs']), ('ops', True, 1))
+        self.assertEqual(self.bus.latest(QUEUE_DEPTH), 0)
+
+    def test_sent_text(self):
+        note_sent_text('hello')
+        note_sent_text('hello')
+        self.assertEqual(self.events, [(TEXT_SENT, 'hello')])
+
+
+def _parse(frame):
+    lines = [line for line in frame.split('\n') if line and not line.startswith(('retry', ':'))]
+    fields = dict(line.split(': ', 1) for line in lines)
+    return fields['event'], json.loads(fields['data'])
+
+
+class EventStreamTests(unittest.TestCase):
+    def setUp(self):
+        self.bus = EventBus()
+        self._previous = set_bus(self.bus)
+
+    def tearDown(self):
+        set_bus(self._previous)
+
+    def test_frames_and_backlog(self):
+        stream = EventStream(self.bus, backlog=2)
+        frames = stream.frames({'queue_depth': 0}, heartbeat_s=0.01)
+        self.assertEqual(_parse(next(frames)), ('state', {'queue_depth': 0}))
+        for depth in (1, 2, 3):
+            self.bus.publish(QUEUE_DEPTH, depth)
+        self.assertEqual(stream.dropped, 1)
+        self.assertEqual(_parse(next(frames)), ('queue_depth', 2))
+        self.assertEqual(_parse(next(frames)), ('queue_depth', 3))
+        self.assertEqual(next(frames), ': ping\n\n')
+        frames.close()
+        self.assertEqual(self.bus.stats()['subscribers'], 0)
+        self.assertEqual(format_event(TEXT_SENT, '你好'), 'event: text_sent\ndata: "你好"\n\n')
+
+    def test_route_pushes_events(self):
+        app = Flask(__name__)
+        register_routes(app, '<html></html>')
+        client = app.test_client()
+        resp = client.get('/events', buffered=False)
+        self.assertEqual(resp.mimetype, 'text/event-stream')
+        frames = iter(resp.response)
+        event, snapshot = _parse(next(frames).decode())
+        self.assertEqual(event, 'state')
+        self.assertEqual(set(snapshot), {'last_text', 'queue_depth', 'mute', 'cf_status'})
+        client.post('/mute', json={'enabled': True})
+        self.assertEqual(_parse(next(frames).decode()), (MUTE_STATE, {'auto_mute': True, 'muted': False}))
+        client.post('/mute', json={'enabled': False})
+        self.assertEqual(client.get('/stats').get_json()['event_streams']['open'], 1)
+        resp.close()
+        self.assertEqual(client.get('/stats').get_json()['event_streams']['open'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+"""Tests for injection_plan passes and the plan executor (no real keyboard or clipboard)."""
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src import keyword_pipeline
+from src.injection_plan import (
+    FINAL_RESTORE_SETTLE_S,
+    SEGMENT_DELAY_S,
+    compile_plan,
+)
+from src.keyword_pipeline import (
+    batch_segments,
+    parse_segments,
+    validate_batch_ops,
+    validate_keyword_actions,
+)
+from injection_fixtures import InjectionTestCase
+
+_RULES = validate_keyword_actions(
+    [
+        {'keyword': '换行', 'action': 'enter'},
+        {'keyword': '粘贴', 'action': 'paste'},
+        {'keyword': '全选', 'keys': ['ctrl', 'a']},
+    ]
+)
+
+
+def _kinds(plan):
+    return [op['op'] for op in plan.ops]
+
+
+class InjectionPlanPassTests(unittest.TestCase):
+    def test_enter_run_collapses_to_one_burst(self):
+        segs = parse_segments('a' + '换行' * 20 + 'b', _RULES)
+        plan = compile_plan(segs)
+        self.assertEqual(_kinds(plan), ['paste', 'delay', 'rule', 'delay', 'paste', 'restore'])
+        self.assertEqual(plan.ops[2]['count'], 20)
+        self.assertLess(plan.predicted_delay_s(), plan.baseline_delay_s)
+
+    def test_adjacent_literals_merge(self):
+        segs = [
+            {'type': 'literal', 'text': 'ab'},
+            {'type': 'literal', 'text': 'cd'},
+            {'type': 'keyword', 'rule': _RULES[0]},
+        ]
+        plan = compile_plan(segs)
+        self.assertEqual(plan.ops[0], {'op': 'paste', 'text': 'abcd'})
+
+    def test_restore_before_clipboard_paste_rule(self):
+        segs = parse_segments('x粘贴y', _RULES)
+        plan = compile_plan(segs)
+        self.assertEqual(_kinds(plan), ['paste', 'delay', 'restore', 'rule', 'delay', 'paste', 'restore'])
+
+    def test_no_restore_without_literals(self):
+        plan = compile_plan(parse_segments('换行全选', _RULES))
+        self.assertEqual(_kinds(plan), ['rule', 'delay', 'rule'])
+        self.assertFalse(plan.needs_staged_clipboard)
+
+    def test_final_restore_is_deferred_when_preserving(self):
+        plan = compile_plan(parse_segments('a换行b', _RULES), preserve_clipboard=True)
+        self.assertEqual(plan.ops[-1], {'op': 'restore', 'settle_s': FINAL_RESTORE_SETTLE_S, 'deferred': True})
+        self.assertEqual(plan.op_delay(plan.ops[-1]), 0.0)
+
+    def test_dry_run_dict(self):
+        d = compile_plan(parse_segments('换行换行', _RULES)).to_dict()
+        self.assertEqual(d['ops'][0]['keys'], ['enter'])
+        self.assertEqual(d['ops'][0]['count'], 2)
+        # Chords are sent without sleeping: only the gaps between injections count
+        self.assertEqual(d['ops'][0]['delay_s'], 0.0)
+        self.assertAlmostEqual(d['baseline_delay_s'] - d['predicted_delay_s'], 2 * SEGMENT_DELAY_S, places=4)
+
+
+class RunPlanTests(InjectionTestCase):
+    with_restorer = True
+
+    def test_executes_ops_in_order_with_single_restore(self):
+        plan = compile_plan(parse_segments('a换行换行b', _RULES))
+        self.assertTrue(keyword_pipeline.run_plan(plan))
+        self.assertEqual(self.backend.typed_output(), ['a', ('enter',), ('enter',), 'b'])
+        sets = [e['text'] for e in self.backend.events if e['kind'] == 'clipboard_set']
+        self.assertEqual(sets, ['a', 'b'])
+        self.assertTrue(self.restorer.pending)
+        self.restorer.flush()
+        self.assertEqual(self.backend.events[-1]['text'], 'orig')
+
+    def test_paste_rule_sees_staged_clipboard(self):
+        plan = compile_plan(parse_segments('x粘贴', _RULES))
+        self.assertTrue(keyword_pipeline.run_plan(plan))
+        self.assertEqual(self.backend.typed_output(), ['x', 'orig'])
+
+    def test_failed_rule_restores_and_stops(self):
+        with mock.patch.object(keyword_pipeline, '_dispatch_rule', return_value=False):
+            plan = compile_plan(parse_segments('a换行b', _RULES))
+            self.assertFalse(keyword_pipeline.run_plan(plan))
+        self.assertEqual(self.backend.typed_output(), ['a'])
+        last = self.backend.events[-1]
+        self.assertEqual((last['kind'], last['text']), ('clipboard_set', 'orig'))
+
+    def test_delays_recorded_not_slept(self):
+        plan = compile_plan(parse_segments('a' + '换行' * 20 + 'b', _RULES))
+        keyword_pipeline.run_plan(plan)
+        self.assertAlmostEqual(self.backend.total_delay(), 0.1 + SEGMENT_DELAY_S * 2 + 0.1)
+        self.assertAlmostEqual(self.clock.total_slept, self.backend.total_delay())
+
+
+class BatchOpsTests(InjectionTestCase):
+    rules_config = {'keyword_actions': [{'keyword': '换行', 'action': 'enter'}]}
+    with_restorer = True
+
+    def test_validate(self):
+        ops = validate_batch_ops([{'op': 'backspace', 'count': '3'}, {'op': 'hotkey', 'keys': ['Control', 'a']}])
+        self.assertEqual(ops, [{'op': 'backspace', 'count': 3}, {'op': 'hotkey', 'count': 1, 'keys': ['ctrl', 'a']}])
+        for bad in ([], [{'op': 'launch'}], [{'op': 'text', 'text': ''}], [{'op': 'enter', 'count': 0}],
+                    [{'op': 'hotkey', 'keys': ['ctrl', 'nosuchkey']}]):
+            with self.assertRaises(ValueError):
+                validate_batch_ops(bad)
+
+    def test_ops_are_not_merged_across_batch_entries(self):
+        ops = validate_batch_ops([{'op': 'text', 'text': 'a'}, {'op': 'text', 'text': 'b'},
+                                  {'op': 'backspace', 'count': 3}, {'op': 'backspace'}])
+        plan = compile_plan(batch_segments(ops, keyword_pipeline.get_compiled_rules()))
+        injections = [op for op in plan.ops if op['op'] in ('paste', 'rule')]
+        self.assertEqual([(op['op'], op['index']) for op in injections],
+                         [('paste', 0), ('paste', 1), ('rule', 2), ('rule', 3)])
+        self.assertEqual(injections[2]['count'], 3)
+
+    def test_execute_reports_per_op(self):
+        ops = validate_batch_ops([{'op': 'text', 'text': 'a'}, {'op': 'shift_enter'},
+                                  {'op': 'text', 'text': 'b换行'}, {'op': 'backspace', 'count': 2}])
+        results = keyword_pipeline.execute_ops(ops)
+        self.assertEqual(self.backend.typed_output(),
+                         ['a', ('shift', 'enter'), 'b', ('enter',), ('backspace',), ('backspace',)])
+        self.assertEqual([r['success'] for r in results], [True] * 4)
+        self.assertGreater(results[0]['elapsed_ms'], 0)
+        # One capture for the whole batch, one deferred restore
+        self.assertEqual(self.restorer.stats()['captures'], 1)
+
+    def test_failure_skips_the_rest(self):
+        ops = validate_batch_ops([{'op': 'text', 'text': 'a'}, {'op': 'enter'}, {'op': 'text', 'text': 'b'}])
+        with mock.patch.object(keyword_pipeline, '_dispatch_rule', return_value=False):
+            results = keyword_pipeline.execute_ops(ops)
+        self.assertEqual([r['success'] for r in results], [True, False, False])
+        self.assertTrue(results[2]['skipped'])
+        self.assertEqual(self.backend.typed_output(), ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+"""Tests for the single-writer injection worker."""
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.clock import VirtualClock, delay, set_clock
+from src.injection_worker import InjectionWorker, QueueFullError
+from src.keyword_pipeline import _coalesce_settings
+from injection_fixtures import InjectionTestCase
+
+_CONFIG = {'keyword_actions': [{'keyword': '换行', 'action': 'enter'}]}
+
+
+class InjectionWorkerTests(unittest.TestCase):
+    def setUp(self):
+        self._previous_clock = set_clock(VirtualClock())
+        self.worker = InjectionWorker(maxsize=4)
+
+    def tearDown(self):
+        self.worker.stop()
+        set_clock(self._previous_clock)
+
+    def test_concurrent_submitters_never_interleave(self):
+        log = []
+
+        def inject(tag):
+            # A clipboard-set / paste / restore cycle must run as one unit
+            for step in ('set', 'paste', 'restore'):
+                log.append((tag, step))
+                delay(0.01)
+            return tag
+
+        worker = InjectionWorker(maxsize=64)
+        results = []
+
+        def client(tag):
+            results.append(worker.run('call', inject, tag))
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        worker.stop()
+        self.assertEqual(sorted(results), list(range(16)))
+        for i in range(0, len(log), 3):
+            self.assertEqual({tag for tag, _ in log[i:i + 3]}, {log[i][0]})
+
+    def test_fifo_order(self):
+        jobs = [self.worker.submit('call', lambda i=i: i) for i in range(4)]
+        self.assertEqual([job.result() for job in jobs], [0, 1, 2, 3])
+
+    def test_full_queue_rejects(self):
+        gate = threading.Event()
+        self.worker.submit('call', gate.wait)  # occupies the thread
+        while self.worker.stats()['pending']:
+            pass
+        for _ in range(4):
+            self.worker.submit('call', lambda: None)
+        with self.assertRaises(QueueFullError):
+            self.worker.submit('call', lambda: None)
+        gate.set()
+        self.assertEqual(self.worker.stats()['rejected'], 1)
+
+    def test_exception_reaches_submitter(self):
+        def boom():
+            raise ValueError('x')
+
+        job = self.worker.submit('call', boom)
+        with self.assertRaises(ValueError):
+            job.result()
+        self.assertEqual(self.worker.stats()['failed'], 1)
+
+    def test_job_carries_latency_report(self):
+        job = self.worker.submit('call', delay, 0.25)
+        job.result()
+        latency = job.latency()
+        self.assertAlmostEqual(latency['sleep_ms'], 250.0)
+        self.assertIn('queue_ms', latency)
+
+    def test_run_inside_worker_is_inline(self):
+        job = self.worker.submit('call', lambda: self.worker.run('call', lambda: 'inner'))
+        self.assertEqual(job.result(timeout=2), 'inner')
+
+
+class CoalescingTests(InjectionTestCase):
+    rules_config = _CONFIG
+
+    def setUp(self):
+        super().setUp()
+        self.gate = threading.Event()
+
+    def _run_queued(self, worker, submit):
+        """Hold the worker on a gate job, queue everything, then release it."""
+        worker.submit('call', self.gate.wait)
+        jobs = submit()
+        self.gate.set()
+        results = [job.result(timeout=5) for job in jobs]
+        worker.stop()
+        return jobs, results
+
+    def test_queued_texts_merge_without_crossing_control_keys(self):
+        worker = InjectionWorker(coalesce_window_s=0.0, coalesce_max_batch=8)
+        jobs, results = self._run_queued(worker, lambda: [
+            worker.submit_text('a'),
+            worker.submit_text('b'),
+            worker.submit_hotkey(['enter']),
+            worker.submit_text('c'),
+        ])
+        self.assertEqual(results, [True, True, True, True])
+        self.assertEqual(self.backend.typed_output(), ['ab', ('enter',), 'c'])
+        self.assertEqual(jobs[0].latency()['batch_size'], 2)
+        stats = worker.stats()
+        self.assertEqual((stats['coalesced_batches'], stats['pastes_saved']), (1, 1))
+
+    def test_keyword_never_spans_payloads(self):
+        worker = InjectionWorker(coalesce_window_s=0.0)
+        self._run_queued(worker, lambda: [worker.submit_text('x换'), worker.submit_text('行y换行z')])
+        self.assertEqual(self.backend.typed_output(), ['x换行y', ('enter',), 'z'])
+
+    def test_max_batch(self):
+        worker = InjectionWorker(coalesce_window_s=0.0, coalesce_max_batch=2)
+        self._run_queued(worker, lambda: [worker.submit_text(t) for t in 'abc'])
+        self.assertEqual(self.backend.typed_output(), ['ab', 'c'])
+
+    def test_different_paste_settings_not_merged(self):
+        worker = InjectionWorker(coalesce_window_s=0.0)
+        self._run_queued(worker, lambda: [
+            worker.submit_text('a', use_ctrl_v=True),
+            worker.submit_text('b', use_ctrl_v=False),
+        ])
+        self.assertEqual(self.backend.typed_output(), ['a', 'b'])
+
+    def test_window_waits_for_late_payload(self):
+        worker = InjectionWorker(coalesce_window_s=0.2)
+        first = worker.submit_text('a')
+        second = worker.submit_text('b')
+        self.assertTrue(first.result(timeout=5) and second.result(timeout=5))
+        worker.stop()
+        self.assertEqual(self.backend.typed_output(), ['ab'])
+
+    def test_settings_from_config(self):
+        self.assertEqual(_coalesce_settings({}), (0.0, 8))
+        self.assertEqual(_coalesce_settings({'coalesce_window_ms': 40, 'coalesce_max_batch': 3}), (0.04, 3))
+        self.assertEqual(_coalesce_settings({'coalesce_window_ms': 'x', 'coalesce_max_batch': 0}), (0.0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
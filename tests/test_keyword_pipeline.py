@@ -1,4 +1,5 @@
 """Tests for keyword_pipeline (no real keyboard or clipboard)."""
+import random
 import sys
 import unittest
 from pathlib import Path
@@ -8,6 +9,9 @@ if str(_root) not in sys.path:
     sys.path.insert(0, str(_root))
 
 from src.keyword_pipeline import (
+    KeywordMatcher,
+    RuleSetCache,
+    _parse_segments_linear,
     parse_segments,
     validate_keyword_actions,
     segments_contain_keyword,
@@ -85,5 +89,106 @@ class KeywordPipelineParseTests(unittest.TestCase):
         self.assertEqual(stripped, segs)
 
 
+class KeywordMatcherDifferentialTests(unittest.TestCase):
+    """Automaton output must equal the linear reference scan."""
+
+    def _assert_same(self, text, rules):
+        self.assertEqual(parse_segments(text, rules), _parse_segments_linear(text, rules))
+        self.assertEqual(KeywordMatcher(rules).parse(text), _parse_segments_linear(text, rules))
+
+    def test_overlapping_and_nested_keywords(self):
+        rules = validate_keyword_actions(
+            [
+                {'keyword': 'he', 'action': 'enter'},
+                {'keyword': 'she', 'action': 'undo'},
+                {'keyword': 'his', 'action': 'paste'},
+                {'keyword': 'hers', 'action': 'backspace'},
+                {'keyword': 'ushers', 'action': 'shift_enter'},
+            ]
+        )
+        for text in ('ushers', 'ahishers', 'shehe', 'xhersx', 'hhhe', ''):
+            self._assert_same(text, rules)
+
+    def test_cjk_keywords(self):
+        rules = validate_keyword_actions(
+            [
+                {'keyword': '换行', 'action': 'shift_enter'},
+                {'keyword': '换行发送', 'action': 'enter'},
+                {'keyword': '撤销', 'action': 'undo'},
+            ]
+        )
+        self._assert_same('你好换行世界换行发送撤销撤', rules)
+
+    def test_duplicate_keyword_first_rule_wins(self):
+        rules = [
+            {'keyword': 'ab', 'action': 'enter'},
+            {'keyword': 'ab', 'action': 'undo'},
+        ]
+        segs = parse_segments('xab', rules)
+        self.assertEqual(segs[1]['rule']['action'], 'enter')
+        self._assert_same('xab', rules)
+
+    def test_random_differential(self):
+        rng = random.Random(1234)
+        alphabet = 'abc换行'
+        for _ in range(300):
+            raw = []
+            for i in range(rng.randint(1, 12)):
+                kw = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+                raw.append({'keyword': kw, 'action': 'enter'})
+            rules = validate_keyword_actions(raw)
+            text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+            self._assert_same(text, rules)
+
+    def test_precompiled_matcher_accepted(self):
+        rules = validate_keyword_actions([{'keyword': 'K', 'action': 'paste'}])
+        matcher = KeywordMatcher(rules)
+        self.assertEqual(len(matcher), 1)
+        self.assertEqual(parse_segments('aKb', matcher), parse_segments('aKb', rules))
+
+
+class RuleSetCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.version = 1
+        self.loads = 0
+        self.cfg = {
+            'keyword_actions': [{'keyword': 'K', 'action': 'enter'}],
+            'strip_punctuation_around_keywords': True,
+            'use_ctrl_v': True,
+        }
+
+    def _loader(self):
+        self.loads += 1
+        return self.cfg
+
+    def test_hit_does_not_reload(self):
+        cache = RuleSetCache(loader=self._loader, version_fn=lambda: self.version)
+        first = cache.get()
+        second = cache.get()
+        self.assertIs(first, second)
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['rebuilds'], 1)
+        self.assertTrue(first.use_ctrl_v)
+        self.assertEqual(first.segments('a，K，b')[0], {'type': 'literal', 'text': 'a'})
+
+    def test_version_change_rebuilds(self):
+        cache = RuleSetCache(loader=self._loader, version_fn=lambda: self.version)
+        cache.get()
+        self.cfg = {'keyword_actions': [{'keyword': 'Z', 'action': 'undo'}]}
+        self.version = 2
+        compiled = cache.get()
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(compiled.rules[0]['keyword'], 'Z')
+        self.assertEqual(cache.stats()['version'], 2)
+
+    def test_invalidate_forces_rebuild(self):
+        cache = RuleSetCache(loader=self._loader, version_fn=lambda: self.version)
+        cache.get()
+        cache.invalidate()
+        cache.get()
+        self.assertEqual(cache.stats()['rebuilds'], 2)
+
+
 if __name__ == '__main__':
     unittest.main()
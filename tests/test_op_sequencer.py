@@ -0,0 +1,121 @@
+"""Tests for exactly-once, in-order application of sequenced type requests."""
+import io
+import sys
+import unittest
+from contextlib import redirect_stdout
+from concurrent.futures import Future
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src.injection_worker import QueueFullError
+from src.op_sequencer import MAX_HELD, OpSequencer
+
+
+class FakeJob:
+    def __init__(self, text):
+        self.text = text
+        self.future = Future()
+
+
+class OpSequencerTests(unittest.TestCase):
+    def setUp(self):
+        self.jobs = []
+        self.full = False
+        self.sequencer = OpSequencer(lambda job: {'success': True, 'text': job.text})
+
+    def _submit(self, data):
+        if self.full:
+            raise QueueFullError()
+        if not data.get('text'):
+            return None
+        job = FakeJob(data['text'])
+        self.jobs.append(job)
+        return job
+
+    def _submit_seq(self, client, seq, floor, data):
+        return self.sequencer.submit(client, seq, floor, lambda: self._submit(data))
+
+    def _finish_all(self):
+        for job in self.jobs:
+            if not job.future.done():
+                job.future.set_result(True)
+
+    def _applied(self):
+        return [job.text for job in self.jobs]
+
+    def test_out_of_order_is_held_until_gap_fills(self):
+        f3 = self._submit_seq('c', 3, 1, {'text': 'c'})
+        f2 = self._submit_seq('c', 2, 1, {'text': 'b'})
+        self.assertEqual(self._applied(), [])
+        f1 = self._submit_seq('c', 1, 1, {'text': 'a'})
+        self.assertEqual(self._applied(), ['a', 'b', 'c'])
+        self.assertFalse(f3.done())
+        self._finish_all()
+        self.assertEqual([f.result()['text'] for f in (f1, f2, f3)], ['a', 'b', 'c'])
+        self.assertEqual(self.sequencer.stats()['reordered'], 2)
+
+    def test_retry_is_applied_once(self):
+        first = self._submit_seq('c', 5, 5, {'text': 'x'})
+        retry = self._submit_seq('c', 5, 5, {'text': 'x'})
+        self.assertIs(first, retry)
+        self._finish_all()
+        self.assertEqual(self._submit_seq('c', 5, 5, {'text': 'x'}).result(), {'success': True, 'text': 'x'})
+        self.assertEqual(self._applied(), ['x'])
+        self.assertEqual(self.sequencer.stats()['duplicates'], 2)
+
+    def test_clients_are_independent_and_floor_skips(self):
+        self._submit_seq('a', 1, 1, {'text': 'a1'})
+        self._submit_seq('b', 7, 7, {'text': 'b7'})
+        held = self._submit_seq('a', 3, 2, {'text': 'a3'})
+        self.assertEqual(self._applied(), ['a1', 'b7'])
+        # The client gave up on seq 2
+        self._submit_seq('a', 4, 3, {'text': 'a4'})
+        self.assertEqual(self._applied(), ['a1', 'b7', 'a3', 'a4'])
+        self.assertFalse(held.done())
+
+    def test_interleaved_tabs_each_apply_all(self):
+        # Two tabs of the phone page, each with its own client id and seqs from 1
+        for seq in (1, 2, 3):
+            self._submit_seq('tab1', seq, 1, {'text': f'one{seq}'})
+            self._submit_seq('tab2', seq, 1, {'text': f'two{seq}'})
+        self.assertEqual(self._applied(), ['one1', 'two1', 'one2', 'two2', 'one3', 'two3'])
+        self.assertEqual(self.sequencer.stats()['duplicates'], 0)
+        # Sharing one id and counter, the second tab's seqs look like retries: its text is dropped
+        self._submit_seq('shared', 1, 1, {'text': 'first tab'})
+        self._submit_seq('shared', 1, 1, {'text': 'second tab'})
+        self.assertEqual(self._applied()[-1], 'first tab')
+        self.assertEqual(self.sequencer.stats()['duplicates'], 1)
+
+    def test_failures_are_logged_with_op_kind_and_seq(self):
+        def broken():
+            raise RuntimeError('boom')
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            result = self.sequencer.submit('c', 1, 1, broken, 'ops').result()
+        self.assertEqual(result, {'success': False})
+        self.assertIn('ops op seq 1', out.getvalue())
+        self.assertNotIn('type_text', out.getvalue())
+
+    def test_queue_full_is_not_applied(self):
+        self.full = True
+        rejected = self._submit_seq('c', 1, 1, {'text': 'a'}).result()
+        self.assertTrue(rejected['retry'])
+        self.full = False
+        self._submit_seq('c', 1, 1, {'text': 'a'})
+        self.assertEqual(self._applied(), ['a'])
+
+    def test_empty_payload_and_too_far_ahead(self):
+        self.assertEqual(self._submit_seq('c', 1, 1, {'text': ''}).result(), {'success': False})
+        for seq in range(3, 3 + MAX_HELD):
+            self._submit_seq('c', seq, 2, {'text': str(seq)})
+        self.assertTrue(self._submit_seq('c', 3 + MAX_HELD, 2, {'text': 'x'}).result()['retry'])
+        self._submit_seq('c', 2, 2, {'text': '2'})
+        self.assertEqual(len(self._applied()), MAX_HELD + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Tests for the prebuilt phone page: asset split, minification, compression, ETag / 304."""
+import gzip
+import re
+import sys
+import unittest
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from flask import Flask
+
+from src.page_assets import ASSET_CACHE_CONTROL, minify_css, minify_js
+from src.web_routes import register_routes
+
+_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+    <!-- page -->
+    <style>
+        /* layout */
+        body { margin: 0 ; color : #333; }
+        a:hover, b { padding: 1px 2px; }
+    </style>
+</head>
+<body>
+    <textarea id="t">  keep
+  me</textarea>
+    <p>""" + 'filler ' * 100 + """</p>
+    <script>
+        /**
+         * Entry point
+         */
+        let count = 0;  // counter
+        const re = /[&<>]/g; // regex stays
+        function inc() {
+            // bump
+            count++;
+            return count
+        }
+    </script>
+</body>
+</html>
+"""
+
+
+class MinifyTests(unittest.TestCase):
+    def test_css(self):
+        self.assertEqual(minify_css('/* x */ body { margin: 0 ; color : #333; }\n a:hover, b { padding: 1px 2px; }'),
+                         'body{margin:0;color :#333}a:hover,b{padding:1px 2px}')
+
+    def test_js_keeps_newlines_and_unsafe_comments(self):
+        js = minify_js("/**\n * doc\n */\nlet a = 1;  // one\nconst re = /x/g; // kept\n\n  // gone\nreturn a")
+        self.assertEqual(js, "let a = 1;\nconst re = /x/g; // kept\nreturn a")
+
+
+class PageRouteTests(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        register_routes(app, _TEMPLATE)
+        self.client = app.test_client()
+
+    def _assets(self, html):
+        return re.findall(r'(?:href|src)="(/assets/[^"]+)"', html)
+
+    def test_page_is_split_and_minified(self):
+        resp = self.client.get('/')
+        html = resp.get_data(as_text=True)
+        self.assertNotIn('<style>', html)
+        self.assertNotIn('<!--', html)
+        self.assertIn('<textarea id="t">  keep\n  me</textarea>', html)
+        css, js = self._assets(html)
+        self.assertTrue(css.endswith('.css') and js.endswith('.js'))
+        asset = self.client.get(js)
+        self.assertEqual(asset.headers['Cache-Control'], ASSET_CACHE_CONTROL)
+        self.assertIn('count++;', asset.get_data(as_text=True))
+        self.assertNotIn('Entry point', asset.get_data(as_text=True))
+        self.assertEqual(self.client.get('/assets/nope.js').status_code, 404)
+
+    def test_gzip_and_etag(self):
+        plain = self.client.get('/')
+        self.assertIsNone(plain.headers.get('Content-Encoding'))
+        zipped = self.client.get('/', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(zipped.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(zipped.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(zipped.data), plain.data)
+        self.assertNotEqual(zipped.headers['ETag'], plain.headers['ETag'])
+        refused = self.client.get('/', headers={'Accept-Encoding': 'gzip;q=0'})
+        self.assertIsNone(refused.headers.get('Content-Encoding'))
+
+    def test_conditional_get(self):
+        etag = self.client.get('/', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+        resp = self.client.get('/', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.data, b'')
+        self.assertEqual(resp.headers['Cache-Control'], 'no-cache')
+        self.assertEqual(self.client.get('/', headers={'If-None-Match': 'W/"other"'}).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Tests for direct text commit (typing instead of pasting)."""
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src import keyword_pipeline
+from src.injection_plan import compile_plan
+from src.keyboard import choose_commit, paste_text
+from src.keyword_pipeline import RuleSetCache, _commit_settings, parse_segments, validate_keyword_actions
+from src.utils import KEYEVENTF_KEYUP, KEYEVENTF_UNICODE
+from src.win_input import unicode_inputs, utf16_units
+from src.x11_input import char_to_keysym
+from injection_fixtures import InjectionTestCase
+
+_RULES = validate_keyword_actions([{'keyword': '换行', 'action': 'enter'}])
+
+
+class ChooseCommitTests(unittest.TestCase):
+    def test_modes(self):
+        self.assertFalse(choose_commit('hi', 'paste', 30))
+        self.assertTrue(choose_commit('hi' * 100, 'type', 30))
+        self.assertTrue(choose_commit('你好', 'auto', 2))
+        self.assertFalse(choose_commit('你好吗', 'auto', 2))
+
+    def test_control_characters_are_pasted(self):
+        self.assertFalse(choose_commit('a\nb', 'type', 30))
+        self.assertFalse(choose_commit('', 'type', 30))
+        # ZWJ emoji sequences are format characters, not controls
+        self.assertTrue(choose_commit('👨‍👩‍👧', 'type', 30))
+
+    def test_settings_from_config(self):
+        self.assertEqual(_commit_settings({}), ('paste', 30))
+        self.assertEqual(_commit_settings({'commit_mode': 'auto', 'commit_threshold': '12'}), ('auto', 12))
+        self.assertEqual(_commit_settings({'commit_mode': 'x', 'commit_threshold': None}), ('paste', 30))
+
+
+class UnicodeEncodingTests(unittest.TestCase):
+    def test_surrogate_pairs(self):
+        self.assertEqual(utf16_units('a😀'), [0x61, 0xD83D, 0xDE00])
+        inputs = unicode_inputs('😀')
+        self.assertEqual([i.union.ki.wScan for i in inputs], [0xD83D, 0xD83D, 0xDE00, 0xDE00])
+        self.assertEqual([i.union.ki.dwFlags for i in inputs],
+                         [KEYEVENTF_UNICODE, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP] * 2)
+
+    def test_keysyms(self):
+        self.assertEqual(char_to_keysym('a'), 0x61)
+        self.assertEqual(char_to_keysym('é'), 0xE9)
+        self.assertEqual(char_to_keysym('你'), 0x01004F60)
+        self.assertEqual(char_to_keysym('😀'), 0x0101F600)
+
+
+class CommitExecutionTests(InjectionTestCase):
+    with_restorer = True
+
+    def test_plan_types_literals_without_clipboard(self):
+        plan = compile_plan(parse_segments('你好换行😀', _RULES), commit_mode='auto', commit_threshold=10)
+        self.assertEqual([op['op'] for op in plan.ops], ['commit', 'delay', 'rule', 'delay', 'commit'])
+        self.assertTrue(keyword_pipeline.run_plan(plan))
+        self.assertEqual(self.backend.typed_output(), ['你好', ('enter',), '😀'])
+        self.assertNotIn('clipboard_set', self.backend.kinds())
+
+    def test_long_message_is_pasted_in_auto_mode(self):
+        plan = compile_plan(parse_segments('很长的一段话换行', _RULES), commit_mode='auto', commit_threshold=3)
+        self.assertEqual(plan.ops[0]['op'], 'paste')
+
+    def test_failed_commit_falls_back_to_paste(self):
+        with mock.patch.object(self.backend, '_commit_text', return_value=False):
+            plan = compile_plan(parse_segments('a换行b', _RULES), commit_mode='type')
+            self.assertTrue(keyword_pipeline.run_plan(plan))
+        self.assertEqual(self.backend.typed_output(), ['a', ('enter',), 'b'])
+        self.assertTrue(self.restorer.pending)
+        self.restorer.flush()
+        self.assertEqual(self.backend.events[-1]['text'], 'orig')
+
+    def test_paste_text_commit(self):
+        paste_text('hi 😀', commit_mode='type')
+        self.assertEqual(self.backend.kinds(), ['commit_text'])
+
+    def test_config_snapshot_drives_execute(self):
+        cache = RuleSetCache(loader=lambda: {'commit_mode': 'auto', 'commit_threshold': 5}, version_fn=lambda: 0)
+        with mock.patch.object(keyword_pipeline, '_rule_set_cache', cache):
+            keyword_pipeline.execute_typed_text('短句')
+        self.assertEqual(self.backend.kinds(), ['commit_text'])
+
+
+if __name__ == '__main__':
+    unittest.main()
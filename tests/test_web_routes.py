@@ -0,0 +1,105 @@
+"""Tests for the Flask routes against the recording injection backend (no display needed)."""
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from flask import Flask
+
+from src import state
+from src.injection_worker import QueueFullError
+from src.web_routes import register_routes
+from injection_fixtures import InjectionTestCase
+
+_CONFIG = {
+    'keyword_actions': [{'keyword': '换行', 'action': 'shift_enter'}],
+    'use_ctrl_v': True,
+}
+
+
+class TypeRouteTests(InjectionTestCase):
+    rules_config = _CONFIG
+    with_worker = True
+
+    def setUp(self):
+        super().setUp()
+        app = Flask(__name__)
+        register_routes(app, '<html></html>')
+        self.client = app.test_client()
+
+    def test_control_keys(self):
+        for flag, keys in (
+            ('undo', ('ctrl', 'z')),
+            ('enter', ('enter',)),
+            ('shift_enter', ('shift', 'enter')),
+            ('backspace', ('backspace',)),
+        ):
+            self.backend.clear()
+            resp = self.client.post('/type', json={'text': '', flag: True})
+            self.assertTrue(resp.get_json()['success'])
+            self.assertEqual(self.backend.typed_output(), [keys])
+
+    def test_text_with_keyword(self):
+        resp = self.client.post('/type', json={'text': 'a换行b'})
+        self.assertTrue(resp.get_json()['success'])
+        self.assertEqual(self.backend.typed_output(), ['a', ('shift', 'enter'), 'b'])
+        self.assertEqual(state.last_sent_text, 'a换行b')
+        self.assertEqual(self.client.get('/last_text').get_json(), {'success': True, 'text': 'a换行b'})
+
+    def test_empty_payload_fails(self):
+        resp = self.client.post('/type', json={'text': ''})
+        self.assertFalse(resp.get_json()['success'])
+        self.assertEqual(self.backend.events, [])
+
+    def test_latency_report_in_response(self):
+        latency = self.client.post('/type', json={'text': 'a换行b'}).get_json()['latency']
+        self.assertAlmostEqual(latency['sleep_ms'], self.clock.total_slept * 1000, places=3)
+        self.assertEqual(latency['counts']['clipboard'], 3)  # capture, a, b (restore is deferred)
+        self.assertEqual(latency['counts']['inject'], 3)
+        for key in ('total_ms', 'clipboard_ms', 'inject_ms', 'other_ms'):
+            self.assertGreaterEqual(latency[key], 0.0)
+        self.assertIn('queue_ms', latency)
+
+    def test_stats(self):
+        self.client.post('/type', json={'text': 'a'})
+        body = self.client.get('/stats').get_json()
+        self.assertEqual(body['injection']['completed'], 1)
+        self.assertIn('pastes_saved', body['injection'])
+        self.assertIn('early', body['clipboard_restore'])
+        self.assertIsNone(body['app_profiles']['app'])
+        self.assertEqual(body['rule_cache']['rule_count'], 1)
+
+    def test_queue_full_is_reported(self):
+        with mock.patch.object(self.worker, 'submit_text', side_effect=QueueFullError('full')):
+            resp = self.client.post('/type', json={'text': 'a'})
+        self.assertEqual(resp.get_json(), {'success': False, 'error': 'Injection queue full'})
+
+    def test_ops_batch(self):
+        resp = self.client.post('/ops', json={'ops': [
+            {'op': 'text', 'text': 'a'}, {'op': 'shift_enter'}, {'op': 'text', 'text': 'b'},
+            {'op': 'backspace', 'count': 2}, {'op': 'hotkey', 'keys': ['ctrl', 'a']},
+        ]}).get_json()
+        self.assertTrue(resp['success'])
+        self.assertEqual([r['op'] for r in resp['ops']], ['text', 'shift_enter', 'text', 'backspace', 'hotkey'])
+        self.assertIn('latency', resp)
+        self.assertEqual(self.backend.typed_output(),
+                         ['a', ('shift', 'enter'), 'b', ('backspace',), ('backspace',), ('ctrl', 'a')])
+        bad = self.client.post('/ops', json={'ops': [{'op': 'text', 'text': 'a'}, {'op': 'reboot'}]}).get_json()
+        self.assertEqual(bad, {'success': False, 'error': 'op 1: unknown operation'})
+
+    def test_sequenced_requests_applied_once(self):
+        seq = {'client': 'phone', 'seq': 1, 'floor': 1}
+        self.assertTrue(self.client.post('/type', json=dict(seq, text='a')).get_json()['success'])
+        self.assertTrue(self.client.post('/type', json=dict(seq, text='a')).get_json()['success'])
+        self.assertEqual(self.client.post('/type', json=dict(seq, seq='x', text='a')).get_json(),
+                         {'success': False, 'error': 'Bad sequence'})
+        self.assertEqual(self.backend.typed_output(), ['a'])
+        self.assertEqual(self.client.get('/stats').get_json()['sequencer']['duplicates'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
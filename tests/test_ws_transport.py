@@ -0,0 +1,206 @@
+"""Tests for the WebSocket transport: frame codec and the /ws route on a real werkzeug server."""
+import base64
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from src.web_routes import register_routes
+from src.ws_transport import (
+    OP_CLOSE,
+    OP_PING,
+    OP_PONG,
+    OP_TEXT,
+    WebSocket,
+    accept_key,
+    encode_frame,
+)
+from injection_fixtures import InjectionTestCase
+
+_MASK = b'\x01\x02\x03\x04'
+
+
+def _read_server_frame(rfile):
+    b0, b1 = rfile.read(2)
+    n = b1 & 0x7F
+    if n == 126:
+        n = struct.unpack('!H', rfile.read(2))[0]
+    elif n == 127:
+        n = struct.unpack('!Q', rfile.read(8))[0]
+    return b0 & 0x0F, rfile.read(n)
+
+
+class FrameTests(unittest.TestCase):
+    def setUp(self):
+        self.server_sock, self.client_sock = socket.socketpair()
+        self.ws = WebSocket(self.server_sock, idle_timeout_s=5)
+        self.rfile = self.client_sock.makefile('rb')
+
+    def tearDown(self):
+        self.ws.close()
+        self.rfile.close()
+        self.client_sock.close()
+
+    def test_accept_key_rfc_example(self):
+        self.assertEqual(accept_key('dGhlIHNhbXBsZSBub25jZQ=='), 's3pPLMBiTxaQ9kYGzzhZRbK+xOo=')
+
+    def test_text_lengths_roundtrip(self):
+        for text in ('', 'hi 你好', 'x' * 200, 'y' * 70000):
+            self.client_sock.sendall(encode_frame(OP_TEXT, text.encode('utf-8'), mask=_MASK))
+            self.assertEqual(self.ws.receive(), text)
+            self.ws.send(text)
+            self.assertEqual(_read_server_frame(self.rfile), (OP_TEXT, text.encode('utf-8')))
+
+    def test_fragments_and_ping(self):
+        first = struct.pack('!BB', OP_TEXT, 0x80 | 2) + _MASK + bytes(a ^ b for a, b in zip(b'ab', _MASK))
+        self.client_sock.sendall(first)
+        self.client_sock.sendall(encode_frame(OP_PING, b'p', mask=_MASK))
+        self.client_sock.sendall(encode_frame(0x0, b'c', mask=_MASK))
+        self.assertEqual(self.ws.receive(), 'abc')
+        self.assertEqual(_read_server_frame(self.rfile), (OP_PONG, b'p'))
+
+    def test_unmasked_frame_closes(self):
+        self.client_sock.sendall(encode_frame(OP_TEXT, b'x'))
+        self.assertIsNone(self.ws.receive())
+        self.assertEqual(_read_server_frame(self.rfile), (OP_CLOSE, struct.pack('!H', 1002)))
+        self.assertFalse(self.ws.send('late'))
+
+
+class _Client:
+    """Just enough of a WebSocket client for the route tests."""
+
+    def __init__(self, port):
+        self.sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((f'GET /ws HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nUpgrade: websocket\r\n'
+                           f'Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n'
+                           'Sec-WebSocket-Version: 13\r\n\r\n').encode())
+        self.rfile = self.sock.makefile('rb')
+        status = self.rfile.readline()
+        headers = {}
+        while True:
+            line = self.rfile.readline().strip()
+            if not line:
+                break
+            name, _, value = line.decode().partition(':')
+            headers[name.strip().lower()] = value.strip()
+        self.status = status
+        self.accept = headers.get('sec-websocket-accept')
+        self.expected_accept = accept_key(key)
+
+    def send(self, message):
+        self.sock.sendall(encode_frame(OP_TEXT, json.dumps(message).encode(), mask=_MASK))
+
+    def receive(self):
+        opcode, payload = _read_server_frame(self.rfile)
+        self.last_opcode = opcode
+        return json.loads(payload) if opcode == OP_TEXT else None
+
+    def close(self):
+        self.sock.sendall(encode_frame(OP_CLOSE, struct.pack('!H', 1000), mask=_MASK))
+        opcode, _ = _read_server_frame(self.rfile)
+        self.rfile.close()
+        self.sock.close()
+        return opcode
+
+
+class WebSocketRouteTests(InjectionTestCase):
+    rules_config = {'keyword_actions': [{'keyword': '换行', 'action': 'shift_enter'}], 'use_ctrl_v': True}
+    with_worker = True
+
+    def setUp(self):
+        super().setUp()
+        app = Flask(__name__)
+        register_routes(app, '<html></html>')
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port = self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_ops_are_acked_in_order(self):
+        client = _Client(self.port)
+        self.assertIn(b'101', client.status)
+        self.assertEqual(client.accept, client.expected_accept)
+        client.send({'id': 1, 'op': 'type', 'text': 'a换行b'})
+        client.send({'id': 2, 'op': 'type', 'text': '', 'enter': True})
+        client.send({'id': 3, 'op': 'mute', 'enabled': False})
+        client.send({'id': 4, 'op': 'ops', 'ops': [{'op': 'text', 'text': 'c'}, {'op': 'backspace', 'count': 2}]})
+        replies = {}
+        for _ in range(4):
+            reply = client.receive()
+            replies[reply['id']] = reply
+        self.assertTrue(replies[1]['success'])
+        self.assertEqual(replies[1]['ack'], 'type')
+        self.assertIn('latency', replies[1])
+        self.assertTrue(replies[2]['success'])
+        self.assertEqual(replies[3], {'id': 3, 'ack': 'mute', 'success': True, 'enabled': False})
+        self.assertEqual([r['success'] for r in replies[4]['ops']], [True, True])
+        self.assertEqual(self.backend.typed_output(),
+                         ['a', ('shift', 'enter'), 'b', ('enter',), 'c', ('backspace',), ('backspace',)])
+        self.assertEqual(client.close(), OP_CLOSE)
+
+    def test_sequenced_retry_applied_once(self):
+        client = _Client(self.port)
+        client.send({'id': 1, 'op': 'type', 'client': 'phone', 'seq': 2, 'floor': 1, 'text': 'b'})
+        client.send({'id': 2, 'op': 'type', 'client': 'phone', 'seq': 1, 'floor': 1, 'text': 'a换行'})
+        client.send({'id': 3, 'op': 'type', 'client': 'phone', 'seq': 1, 'floor': 1, 'text': 'a换行'})
+        replies = {}
+        for _ in range(3):
+            reply = client.receive()
+            replies[reply['id']] = reply
+        self.assertTrue(all(r['success'] for r in replies.values()))
+        self.assertEqual(self.backend.typed_output(), ['a', ('shift', 'enter'), 'b'])
+        client.close()
+
+    def test_bad_messages(self):
+        client = _Client(self.port)
+        client.sock.sendall(encode_frame(OP_TEXT, b'not json', mask=_MASK))
+        self.assertEqual(client.receive(), {'id': None, 'success': False, 'error': 'Bad message'})
+        client.send({'id': 'x', 'op': 'launch'})
+        self.assertEqual(client.receive(), {'id': 'x', 'ack': 'launch', 'success': False, 'error': 'Unknown op'})
+        client.send({'id': 5, 'op': 'type', 'text': ''})
+        self.assertEqual(client.receive(), {'id': 5, 'ack': 'type', 'success': False})
+        client.close()
+
+    def test_http_routes_still_served(self):
+        client = _Client(self.port)
+        client.send({'id': 1, 'op': 'ping'})
+        self.assertTrue(client.receive()['success'])
+        conn = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+        body = b'{"enabled": true}'
+        conn.sendall(b'POST /mute HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n'
+                     b'Connection: close\r\nContent-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+        response = b''
+        while True:
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            response += chunk
+        conn.close()
+        self.assertIn(b'200 OK', response)
+        self.assertIn(b'"enabled":true', response.replace(b' ', b''))
+        client.close()
+
+    def test_plain_get_is_rejected(self):
+        conn = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+        conn.sendall(b'GET /ws HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+        self.assertIn(b'400', conn.recv(4096))
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+"""Tests for the XTest input backend (fake X display; no server needed)."""
+import sys
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+_root = Path(__file__).resolve().parents[1]
+if str(_root) not in sys.path:
+    sys.path.insert(0, str(_root))
+
+from src import clipboard, injection_backend
+from src.injection_backend import PyAutoGuiBackend, XTestBackend, create_backend
+from src.keyboard import HOTKEY_KEY_WHITELIST
+from src import x11_input
+from src.x11_input import KEYSYM_NAMES, XTestInput, XTestUnavailable
+
+try:
+    from Xlib import X, XK
+    XLIB_AVAILABLE = True
+except ImportError:
+    XLIB_AVAILABLE = False
+
+
+class FakeDisplay:
+    """Keymap with keycodes 8..15: Return, Control_L, v, F24 unmapped, four spare."""
+
+    def __init__(self, name=None):
+        self.display = SimpleNamespace(info=SimpleNamespace(min_keycode=8, max_keycode=15))
+        self.keymap = {8: XK.XK_Return, 9: XK.XK_Control_L, 10: XK.XK_v}
+        self.events = []
+        self.syncs = 0
+        self.focus = X.PointerRoot
+
+    def has_extension(self, name):
+        return name == 'XTEST'
+
+    def get_keyboard_mapping(self, first, count):
+        return [(self.keymap.get(first + i, 0),) for i in range(count)]
+
+    def keysym_to_keycode(self, keysym):
+        return next((kc for kc, ks in self.keymap.items() if ks == keysym), 0)
+
+    def change_keyboard_mapping(self, keycode, syms):
+        self.keymap[keycode] = syms[0][0]
+
+    def sync(self):
+        self.syncs += 1
+
+    def get_input_focus(self):
+        return SimpleNamespace(focus=self.focus)
+
+    def close(self):
+        pass
+
+
+def _fake_input(display, event_type, keycode):
+    display.events.append(('down' if event_type == X.KeyPress else 'up', keycode))
+
+
+@unittest.skipUnless(XLIB_AVAILABLE, "python-xlib not installed")
+class XTestInputTests(unittest.TestCase):
+    def setUp(self):
+        patches = [mock.patch('Xlib.display.Display', FakeDisplay),
+                   mock.patch('Xlib.ext.xtest.fake_input', _fake_input)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.xinput = XTestInput()
+        self.d = self.xinput._d
+
+    def test_every_hotkey_token_has_a_keysym(self):
+        self.assertEqual(set(HOTKEY_KEY_WHITELIST) - set(KEYSYM_NAMES), set())
+        self.assertTrue(self.xinput.supports(sorted(HOTKEY_KEY_WHITELIST)))
+
+    def test_chord_is_one_sync(self):
+        self.assertTrue(self.xinput.chord(['ctrl', 'v']))
+        self.assertEqual(self.d.events, [('down', 9), ('down', 10), ('up', 10), ('up', 9)])
+        self.assertEqual(self.d.syncs, 1)
+
+    def test_unmapped_key_uses_spare_keycode(self):
+        self.xinput.chord(['f24'])
+        keycode = self.d.events[0][1]
+        self.assertIn(keycode, range(11, 16))
+        self.assertEqual(self.d.keymap[keycode], XK.string_to_keysym('F24'))
+
+    def test_keys_released_when_press_fails(self):
+        calls = []
+
+        def failing(display, event_type, keycode):
+            if len(calls) == 1 and event_type == X.KeyPress:
+                raise OSError('connection lost')
+            calls.append((event_type, keycode))
+
+        with mock.patch('Xlib.ext.xtest.fake_input', failing):
+            with self.assertRaises(OSError):
+                self.xinput.chord(['ctrl', 'v'])
+        self.assertEqual(calls, [(X.KeyPress, 9), (X.KeyRelease, 9)])
+
+    def test_close_restores_original_keysyms(self):
+        before = dict(self.d.keymap)
+        self.xinput.type_text('你好é')
+        self.xinput.chord(['f24'])
+        self.assertNotEqual(self.d.keymap, before)
+        self.xinput.close()
+        self.assertEqual({kc: ks for kc, ks in self.d.keymap.items() if ks}, before)
+        self.xinput.close()
+        with self.assertRaises(XTestUnavailable):
+            self.xinput.chord(['ctrl', 'v'])
+
+    def test_process_wide_instance_closed_at_exit(self):
+        with mock.patch.object(x11_input, '_input', None), \
+                mock.patch.object(x11_input, '_input_unavailable', False), \
+                mock.patch.object(x11_input.atexit, 'register') as register:
+            xinput = x11_input.get_xtest_input()
+            register.assert_called_once_with(x11_input.close_xtest_input)
+            xinput.type_text('ü')
+            x11_input.close_xtest_input()
+            self.assertTrue(all(not ks for kc, ks in xinput._d.keymap.items() if kc >= 11))
+            self.assertIsNone(x11_input.get_xtest_input())
+
+    def test_backend(self):
+        backend = XTestBackend(self.xinput)
+        self.assertTrue(backend.chord(['enter']))
+        self.assertFalse(backend.chord(['hyper']))
+        self.assertTrue(backend.commit_text('你'))
+        self.assertEqual(self.d.events[:2], [('down', 8), ('up', 8)])
+        self.assertEqual(self.d.keymap[self.d.events[-1][1]], 0x01004F60)
+
+
+    def test_paste_reader_is_looked_up_over_the_xtest_connection(self):
+        backend = XTestBackend(self.xinput)
+        owner = mock.Mock(client_of=lambda window: window & ~0x1FFFFF)
+        with mock.patch.object(clipboard, '_x11', owner):
+            self.assertIsNone(backend.clipboard_reader())
+            self.d.focus = SimpleNamespace(id=0x1200009)
+            self.assertEqual(backend.clipboard_reader(), 0x1200000)
+        # No round trip on the clipboard owner's connection
+        owner.focused_client.assert_not_called()
+
+
+class PyAutoGuiBackendTests(unittest.TestCase):
+    def test_calls_skip_the_pause_without_changing_it(self):
+        pg = mock.Mock(PAUSE=0.1)
+        backend = PyAutoGuiBackend()
+        backend._pyautogui = pg
+        self.assertTrue(backend.chord(['enter']))
+        self.assertTrue(backend.chord(['ctrl', 'v']))
+        self.assertTrue(backend.commit_text('abc'))
+        pg.press.assert_called_once_with('enter', _pause=False)
+        pg.hotkey.assert_called_once_with('ctrl', 'v', _pause=False)
+        pg.write.assert_called_once_with('abc', _pause=False)
+        self.assertEqual(pg.PAUSE, 0.1)
+
+
+class CreateBackendTests(unittest.TestCase):
+    def test_linux_falls_back_to_pyautogui(self):
+        with mock.patch.object(injection_backend, 'IS_WINDOWS', False), \
+                mock.patch.object(injection_backend, 'IS_MAC', False), \
+                mock.patch('src.x11_input.get_xtest_input', return_value=None):
+            self.assertIsInstance(create_backend(), PyAutoGuiBackend)
+            with self.assertRaises(XTestUnavailable):
+                create_backend('xtest')
+
+
+if __name__ == '__main__':
+    unittest.main()